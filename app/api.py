@@ -0,0 +1,197 @@
+"""
+HTTP API service exposing research, code generation and chat.
+
+Research and code generation can take minutes, so they run as background
+jobs: POST returns 202 with a job id at once, and the job is polled at
+/api/jobs/<id> or streamed as server-sent events at /api/jobs/<id>/events.
+Identical requests submitted while a job is in flight share that job.
+Chat answers synchronously. Request bodies may set model, depth
+("quick", "standard" or "deep"), max_seconds and max_cost to steer the
+choice of model. /api/health and /api/metrics report on the
+service for load balancers and monitoring, and /metrics serves the latency,
+token and cost metrics in the Prometheus text format.
+
+Run with python -m app serve, or under a WSGI server with threads, e.g.
+gunicorn --threads 16 'app.api:create_app()'.
+"""
+import json
+from collections import OrderedDict
+from threading import Lock
+from flask import Flask, Response, request
+from app.jobs import JobManager
+from app.utils.metrics import Metrics
+from app.utils.model_router import routing_options
+from app.config.settings import API_STREAM_KEEPALIVE_SECONDS, API_MAX_CONVERSATIONS
+
+def _research_job(params, on_delta):
+    from app.web_scraping import WebScraper
+    return WebScraper().scrape_website(
+        params["url"], on_delta=on_delta, use_cache=not params.get("refresh"), routing=routing_options(params)
+    )
+
+def _codegen_job(params, on_delta):
+    from app.code_generation import CodeGenerator, extract_code_block
+    generator = CodeGenerator()
+    generated = generator.generate_code(
+        project_context=params.get("project_context", ""),
+        existing_code=params.get("existing_code", ""),
+        task=params["task"],
+        on_delta=on_delta,
+        use_cache=not params.get("refresh"),
+        retrieve=bool(params.get("retrieve") or params.get("project")),
+        project=params.get("project"),
+        routing=routing_options(params)
+    )
+    if generated.startswith("Error:"):
+        return {"error": generated[len("Error:"):].strip()}
+    return {
+        "generated_code": generated,
+        "code": extract_code_block(generated),
+        "prompt_tokens": generator.last_prompt_report
+    }
+
+def register_handlers(manager):
+    manager.register("research", _research_job)
+    manager.register("codegen", _codegen_job)
+    return manager
+
+def _json(data, status=200):
+    # default=str covers datetimes and ObjectIds in stored results
+    return Response(json.dumps(data, default=str), status=status, mimetype="application/json")
+
+def _sse(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+class ConversationStore:
+    """Conversations in use by the API: kept in memory, restored from the database when evicted."""
+
+    def __init__(self, max_conversations=API_MAX_CONVERSATIONS):
+        self.max_conversations = max_conversations
+        self._memories = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, conversation_id=None):
+        from app.utils.chat_memory import ConversationMemory
+        with self._lock:
+            memory = self._memories.get(conversation_id) if conversation_id else None
+            if memory is not None:
+                self._memories.move_to_end(conversation_id)
+                return memory
+        memory = (ConversationMemory.load(conversation_id) if conversation_id else None) or ConversationMemory(conversation_id)
+        with self._lock:
+            memory = self._memories.setdefault(memory.conversation_id, memory)
+            while len(self._memories) > self.max_conversations:
+                self._memories.popitem(last=False)
+        return memory
+
+def create_app(manager=None):
+    """Build the Flask application; manager defaults to the shared JobManager."""
+    manager = register_handlers(manager or JobManager())
+    conversations = ConversationStore()
+    app = Flask(__name__)
+
+    def submit(kind, required):
+        params = request.get_json(silent=True) or {}
+        if not params.get(required):
+            return _json({"error": f"Missing {required}"}, 400)
+        try:
+            routing_options(params)
+        except ValueError as e:
+            return _json({"error": str(e)}, 400)
+        job, coalesced = manager.submit(kind, params)
+        data = job.to_dict(include_result=False)
+        data["coalesced"] = coalesced
+        return _json(data, 202)
+
+    @app.post("/api/research")
+    def research():
+        return submit("research", "url")
+
+    @app.post("/api/codegen")
+    def codegen():
+        return submit("codegen", "task")
+
+    @app.get("/api/jobs/<job_id>")
+    def get_job(job_id):
+        job = manager.get(job_id)
+        if job is None:
+            return _json({"error": "Job not found"}, 404)
+        wait = request.args.get("wait", type=float)
+        if wait:
+            job.wait(min(wait, 60))
+        return _json(job.to_dict())
+
+    @app.get("/api/jobs/<job_id>/events")
+    def job_events(job_id):
+        job = manager.get(job_id)
+        if job is None:
+            return _json({"error": "Job not found"}, 404)
+        # A reconnecting EventSource resumes after the last event it received
+        start = request.args.get("from", 0, type=int)
+        try:
+            start = int(request.headers.get("Last-Event-ID") or start)
+        except ValueError:
+            return _json({"error": "Invalid Last-Event-ID"}, 400)
+
+        def events():
+            position = start
+            while True:
+                for event, data in job.stream(position, timeout=API_STREAM_KEEPALIVE_SECONDS):
+                    if event == "timeout":
+                        yield ": keep-alive\n\n"
+                    elif event == "delta":
+                        position += 1
+                        yield _sse("delta", {"text": data}, position)
+                    else:
+                        yield _sse("done", job.to_dict())
+                        return
+
+        return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    @app.post("/api/chat")
+    def chat():
+        from app.chat_integration import ChatAssistant
+        params = request.get_json(silent=True) or {}
+        if not params.get("message"):
+            return _json({"error": "Missing message"}, 400)
+        try:
+            routing = routing_options(params)
+        except ValueError as e:
+            return _json({"error": str(e)}, 400)
+        memory = conversations.get(params.get("conversation_id"))
+        assistant = ChatAssistant(memory)
+        response = assistant.process_message(params["message"], params.get("context"), routing=routing)
+        data = {"conversation_id": memory.conversation_id, "prompt_tokens": assistant.last_prompt_report}
+        if response.startswith("Error:"):
+            data["error"] = response[len("Error:"):].strip()
+            return _json(data, 502)
+        data["response"] = response
+        return _json(data)
+
+    @app.get("/api/health")
+    def health():
+        from app.utils.api_client import PerplexityClient
+        from app.utils.db_connection import DatabaseManager
+        checks = {"perplexity": PerplexityClient().get_health(), "database": DatabaseManager().get_health()}
+        healthy = all(check["state"] != "error" for check in checks.values())
+        return _json({"status": "ok" if healthy else "degraded", **checks}, 200 if healthy else 503)
+
+    @app.get("/api/metrics")
+    def metrics():
+        from app.utils.api_client import PerplexityClient
+        from app.utils.db_connection import DatabaseManager
+        return _json({
+            "jobs": manager.get_stats(),
+            "calls": Metrics().snapshot(),
+            "routing": PerplexityClient().get_routing_stats(),
+            "rate_limits": PerplexityClient().get_rate_limit_stats(),
+            "writes": DatabaseManager().get_write_stats()
+        })
+
+    @app.get("/metrics")
+    def prometheus_metrics():
+        return Response(Metrics().render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    return app
@@ -2,21 +2,37 @@
 Main application file for MCLG-WS.
 """
 import streamlit as st
-from streamlit.web import cli as stcli
 import os
 import sys
+from datetime import datetime
 from pathlib import Path
+from dotenv import load_dotenv
 
 # Add the project root to the Python path
 root_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(root_dir))
 
 # Now import the modules
-from app.code_generation import render_code_gen_ui
-from app.web_scraping import render_scraping_ui
-from app.chat_integration import render_chat_ui
-from app.utils.api_client import PerplexityClient
-from app.config.settings import APP_NAME, APP_DESCRIPTION
+from app.ui.code_generation import render_code_gen_ui
+from app.ui.web_scraping import render_scraping_ui
+from app.ui.chat import render_chat_ui
+from app.ui.performance import render_performance_ui
+from app.ui.resources import get_perplexity, get_database
+from app.config.settings import APP_NAME, APP_DESCRIPTION, PERPLEXITY_API_KEY
+
+STATUS_ICONS = {"ok": "✅", "error": "❌", "unknown": "⏳", "disabled": "⚠️"}
+
+def render_status(label, health):
+    """Show a cached health probe result; never waits for the probe."""
+    icon = STATUS_ICONS.get(health["state"], "⏳")
+    if health["state"] == "ok":
+        st.success(f"{icon} {label} Connected ({health['latency_ms']} ms)")
+    elif health["state"] == "unknown":
+        st.info(f"{icon} {label} status is being checked...")
+    elif health["state"] == "disabled":
+        st.warning(f"{icon} {label} Not Connected: {health['detail']}")
+    else:
+        st.error(f"{icon} {label} Error: {health['detail']}")
 
 def main():
     """Main function to run the Streamlit application."""
@@ -39,21 +55,19 @@ def main():
         st.error("⚠️ Perplexity API Key not configured. Please set it in your .env file.")
         st.stop()
     
-    # Initialize Perplexity client to verify connection
-    try:
-        perplexity = PerplexityClient()
-        client = perplexity.get_client()
-        
-        # Display current models in sidebar
-        st.sidebar.subheader("Perplexity Models")
-        st.sidebar.info(f"""
-        Code Generation: `{perplexity.get_model('code')}`
-        Web Research: `{perplexity.get_model('web')}`
-        Chat Assistant: `{perplexity.get_model('chat')}`
-        """)
-    except Exception as e:
-        st.error(f"⚠️ Error connecting to Perplexity API: {str(e)}")
-        st.stop()
+    # Created once per server process; the client connects on first use and
+    # its health is probed in the background
+    perplexity = get_perplexity()
+    api_health = perplexity.get_health()
+
+    # Display current models in sidebar
+    st.sidebar.subheader("Perplexity Models")
+    st.sidebar.info(f"""
+    Code Generation: `{perplexity.get_model('code')}`
+    Web Research: `{perplexity.get_model('web')}`
+    Chat Assistant: `{perplexity.get_model('chat')}`
+    """)
+    st.sidebar.caption(f"API status: {STATUS_ICONS.get(api_health['state'], '⏳')} {api_health['state']}")
 
     # Navigation menu
     nav_option = st.session_state.get("nav_option", None)
@@ -63,7 +77,7 @@ def main():
     else:
         menu = st.sidebar.selectbox(
             "Navigation",
-            ["Home", "Code Generation", "Web Research", "Chat Assistant"]
+            ["Home", "Code Generation", "Web Research", "Chat Assistant", "Performance"]
         )
 
     # Page content based on menu selection
@@ -89,21 +103,10 @@ def main():
         col1, col2 = st.columns(2)
         
         with col1:
-            if PERPLEXITY_API_KEY:
-                st.success("✅ Perplexity API Connected")
-            else:
-                st.error("❌ Perplexity API Not Connected")
+            render_status("Perplexity API", api_health)
                 
         with col2:
-            try:
-                from app.utils.db_connection import DatabaseManager
-                db = DatabaseManager()
-                if db.db:
-                    st.success("✅ MongoDB Connected")
-                else:
-                    st.warning("⚠️ MongoDB Not Connected")
-            except:
-                st.error("❌ MongoDB Error")
+            render_status("MongoDB", get_database().get_health())
         
         # Show current time
         st.caption(f"Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -117,5 +120,8 @@ def main():
     elif menu == "Chat Assistant":
         render_chat_ui()
 
+    elif menu == "Performance":
+        render_performance_ui()
+
 if __name__ == "__main__":
     main()
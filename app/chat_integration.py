@@ -2,55 +2,55 @@
 Chat integration module using Perplexity API.
 """
 import os
-import streamlit as st
-from streamlit.web import cli as stcli
 from datetime import datetime
 from app.utils.api_client import PerplexityClient
 from app.utils.db_connection import DatabaseManager
+from app.utils.prompt_packer import pack_messages, prompt_budget, estimate_message_tokens
+from app.utils.chat_memory import ConversationMemory
 from app.config.settings import COLLECTIONS
 
 class ChatAssistant:
-    def __init__(self):
+    def __init__(self, memory=None):
         # Initialize Perplexity client
         perplexity = PerplexityClient()
         self.client = perplexity.get_client()
         self.model = perplexity.get_model("chat")  # sonar-pro
         
         # Get database collection
-        db_manager = DatabaseManager()
-        self.db = db_manager.get_collection(COLLECTIONS["chat"])
+        self.db_manager = DatabaseManager()
+        self.db = self.db_manager.get_collection(COLLECTIONS["chat"])
+        self.last_prompt_report = None
         
-        # Initialize chat history if none exists
-        if "messages" not in st.session_state:
-            st.session_state.messages = [
-                {"role": "system", "content": "You are a helpful AI assistant for the MCLG-WS system, which helps with code generation and web research."}
-            ]
+        # Recent turns plus a running summary; the UI passes the one kept in its session
+        self.memory = memory if memory is not None else ConversationMemory()
     
-    def process_message(self, user_message, context=None):
-        """Process a user message and return the AI response."""
+    def process_message(self, user_message, context=None, on_delta=None, routing=None):
+        """
+        Process a user message and return the AI response.
+
+        Pass on_delta to receive the response incrementally as it streams, and
+        routing to override the model choice (see ModelRouter.route).
+        """
         try:
             # Add context to the system message if provided
             if context:
-                system_message = {
-                    "role": "system", 
-                    "content": f"You are a helpful AI assistant for the MCLG-WS system. Consider this context information: {context}"
-                }
-                # Update the system message
-                if st.session_state.messages["role"] == "system":
-                    st.session_state.messages = system_message
-                else:
-                    st.session_state.messages.insert(0, system_message)
-                    
-            # Add user message to history
-            st.session_state.messages.append({"role": "user", "content": user_message})
+                self.memory.set_context(context)
             
-            # Get response from Perplexity
+            # Recent turns and the summary of older ones, within the routed model's prompt budget
             perplexity = PerplexityClient()
+            prompt = self.memory.prompt_messages(user_message)
+            route = perplexity.route("chat", prompt_tokens=estimate_message_tokens(prompt), **(routing or {}))
+            messages, self.last_prompt_report = pack_messages(prompt, prompt_budget(route["model"]))
+            
+            # Get response from Perplexity
             response = perplexity.generate_completion(
-                model=self.model,
-                messages=st.session_state.messages,
+                model=route["model"],
+                messages=messages,
                 temperature=0.7,  # Standard temperature for conversational responses
-                max_tokens=2000   # Allow for detailed responses
+                max_tokens=2000,  # Allow for detailed responses
+                on_delta=on_delta,
+                purpose="chat",
+                route=route
             )
             
             if "error" in response:
@@ -58,15 +58,18 @@ class ChatAssistant:
             
             ai_response = response["content"]
             
-            # Add assistant response to history
-            st.session_state.messages.append({"role": "assistant", "content": ai_response})
+            # Record the exchange; older turns are summarized in the background
+            self.memory.add_exchange(user_message, ai_response)
+            self.memory.save()
             
-            # Save to database if connection exists
-            if self.db:
-                self.db.insert_one({
+            # Save to database in the background if connection exists
+            if self.db is not None:
+                self.db_manager.enqueue_insert(COLLECTIONS["chat"], {
+                    "conversation_id": self.memory.conversation_id,
                     "user_message": user_message,
                     "context": context,
                     "ai_response": ai_response,
+                    "prompt_tokens": self.last_prompt_report,
                     "model": response["model"],
                     "token_usage": response["usage"],
                     "timestamp": datetime.utcnow()
@@ -77,55 +80,3 @@ class ChatAssistant:
         except Exception as e:
             print(f"Error processing message: {e}")
             return f"Error: {str(e)}"
-
-def render_chat_ui():
-    """Render the chat UI in Streamlit."""
-    st.title("AI Chat Assistant")
-    
-    # Initialize chat history in session state if it doesn't exist
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
-    
-    # Display chat history
-    for message in st.session_state.chat_history:
-        if message["is_user"]:
-            st.write(f"🧑 **You**: {message['text']}")
-        else:
-            st.write(f"🤖 **AI**: {message['text']}")
-    
-    # Check for context in session state
-    context = st.session_state.get("chat_context", None)
-    if context:
-        st.info(f"Using context: {context[:100]}..." + ("" if len(context) <= 100 else "..."))
-    
-    # Get user input
-    with st.form("chat_form", clear_on_submit=True):
-        user_message = st.text_input("Type your message:", key="chat_input")
-        submitted = st.form_submit_button("Send")
-    
-    if submitted and user_message:
-        # Create chat assistant
-        chat_assistant = ChatAssistant()
-        
-        # Add user message to chat history
-        st.session_state.chat_history.append({
-            "is_user": True,
-            "text": user_message
-        })
-        
-        # Get AI response
-        with st.spinner("AI is thinking..."):
-            response = chat_assistant.process_message(user_message, context)
-        
-        # Add AI response to chat history
-        st.session_state.chat_history.append({
-            "is_user": False,
-            "text": response
-        })
-        
-        # Clear context after use
-        if context:
-            st.session_state.chat_context = None
-        
-        # Force refresh
-        st.experimental_rerun()
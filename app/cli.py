@@ -0,0 +1,240 @@
+"""
+Headless command line interface for batch jobs, cron and worker processes.
+
+    python -m app batch scrape urls.txt --workers 8 --output research.jsonl
+    python -m app batch codegen tasks.jsonl --output code.jsonl
+    python -m app ingest /path/to/checkout
+    python -m app serve --port 8000
+
+Input files hold one job per line: a JSON object, or for scraping a plain
+URL. Results are written as JSON lines (to stdout unless --output is given)
+and stored in the database as in the web app; --no-db skips the database
+and --db-only skips the JSONL output. Progress goes to stderr. The exit
+status is 1 when any job failed.
+
+The application modules are imported only once the arguments are parsed, so
+that --no-db is applied before the storage settings are read.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def read_jobs(path, default_field=None):
+    """
+    Yield (line_number, job) for each line of a JSONL file ("-" for stdin).
+
+    Blank lines and lines starting with # are skipped. A line that is not a
+    JSON object becomes {default_field: line} when default_field is given,
+    otherwise {"error": ...}.
+    """
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                try:
+                    yield number, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield number, {"error": f"Invalid JSON: {e}"}
+            elif default_field:
+                yield number, {default_field: line}
+            else:
+                yield number, {"error": "Expected a JSON object"}
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+class ResultWriter:
+    """Thread-safe JSONL writer that also reports progress on stderr."""
+
+    def __init__(self, output=None, total=0, progress=sys.stderr):
+        self.output = output
+        self.total = total
+        self.progress = progress
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def write(self, result, label=""):
+        with self._lock:
+            self.done += 1
+            if "error" in result:
+                self.failed += 1
+            if self.output is not None:
+                self.output.write(json.dumps(result, default=str) + "\n")
+                self.output.flush()
+            if self.progress is not None:
+                status = f"error: {result['error']}" if "error" in result else "ok"
+                self.progress.write(f"[{self.done}/{self.total}] {label} {status}\n")
+                self.progress.flush()
+
+    def finish(self):
+        if self.progress is not None:
+            self.progress.write(
+                f"{self.done - self.failed} succeeded, {self.failed} failed in {time.monotonic() - self.started:.1f}s\n"
+            )
+        return 1 if self.failed else 0
+
+def run_scrape(jobs, writer, workers, use_cache=True, routing=None):
+    """Research the URLs of jobs, writing each result as it finishes."""
+    from app.web_scraping import WebScraper
+    from app.utils.url_utils import normalize_url
+
+    urls = {}
+    for number, job in jobs:
+        if "error" in job or not job.get("url"):
+            writer.write({"line": number, "error": job.get("error", "Missing url")}, f"line {number}")
+            continue
+        url = job["url"].strip()
+        urls.setdefault(normalize_url(url) or url, url)
+    writer.total += len(urls)
+
+    results = WebScraper().scrape_many(list(urls.values()), concurrency=workers, use_cache=use_cache, routing=routing)
+    for result in results:
+        writer.write(result, result.get("url", ""))
+
+def run_codegen(jobs, writer, workers, use_cache=True, routing=None):
+    """
+    Generate code for each task in parallel, writing each result as it finishes.
+
+    Jobs may override the routing options with their own model, depth,
+    max_seconds and max_cost fields.
+    """
+    from app.code_generation import CodeGenerator, extract_code_block
+    from app.utils.model_router import routing_options
+
+    def generate(number, job):
+        # One generator per job: last_prompt_report is per request
+        generator = CodeGenerator()
+        generated = generator.generate_code(
+            project_context=job.get("project_context", ""),
+            existing_code=job.get("existing_code", ""),
+            task=job["task"],
+            use_cache=use_cache,
+            retrieve=bool(job.get("retrieve") or job.get("project")),
+            project=job.get("project"),
+            routing=routing_options(job, routing)
+        )
+        result = {"line": number, "task": job["task"], "project": job.get("project")}
+        if generated.startswith("Error:"):
+            result["error"] = generated[len("Error:"):].strip()
+        else:
+            result["generated_code"] = generated
+            result["code"] = extract_code_block(generated)
+            result["prompt_tokens"] = generator.last_prompt_report
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="codegen") as executor:
+        futures = {}
+        for number, job in jobs:
+            if "error" in job or not job.get("task"):
+                writer.write({"line": number, "error": job.get("error", "Missing task")}, f"line {number}")
+                continue
+            futures[executor.submit(generate, number, job)] = number
+        writer.total += len(futures)
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"line": futures[future], "error": str(e)}
+            writer.write(result, f"line {futures[future]}")
+
+def run_ingest(args):
+    from app.ingestion import RepositoryIngester
+
+    def progress(done, total):
+        sys.stderr.write(f"\r{done}/{total} files")
+        sys.stderr.flush()
+
+    result = RepositoryIngester(args.source, project=args.project, summarize=args.summarize).ingest(progress=progress)
+    sys.stderr.write("\n")
+    print(json.dumps(result, default=str))
+    return 1 if "error" in result else 0
+
+def run_serve(args):
+    try:
+        from app.api import create_app
+    except ImportError as e:
+        print(f"Error: the API service needs Flask ({e})", file=sys.stderr)
+        return 2
+    from app.config.settings import API_HOST, API_PORT
+    # Threaded so that long event streams do not block other requests
+    create_app().run(host=args.host or API_HOST, port=args.port or API_PORT, threaded=True)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m app", description="Run MCLG-WS jobs without the web interface.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    batch = commands.add_parser("batch", help="Run jobs from a JSONL file")
+    batch.add_argument("kind", choices=["scrape", "codegen"])
+    batch.add_argument("input", help="JSONL file (or a URL list for scrape); - reads stdin")
+    batch.add_argument("-w", "--workers", type=int, default=None,
+                       help="Jobs to run in parallel (default SCRAPER_BATCH_CONCURRENCY)")
+    batch.add_argument("-o", "--output", default="-", help="JSONL results file; - for stdout (default)")
+    batch.add_argument("--refresh", action="store_true", help="Ignore cached results")
+    batch.add_argument("--model", default=None, help="Use this model instead of routing")
+    batch.add_argument("--depth", choices=["quick", "standard", "deep"], default=None,
+                       help="quick favours the fastest model, deep the configured one")
+    batch.add_argument("--max-seconds", type=float, default=None, help="Latency budget per job for routing")
+    batch.add_argument("--max-cost", type=float, default=None, help="Cost budget per job in dollars for routing")
+    storage = batch.add_mutually_exclusive_group()
+    storage.add_argument("--no-db", action="store_true", help="Do not store results in the database")
+    storage.add_argument("--db-only", action="store_true", help="Only store results in the database")
+
+    ingest = commands.add_parser("ingest", help="Index a repository checkout or git URL")
+    ingest.add_argument("source")
+    ingest.add_argument("--project", default=None)
+    ingest.add_argument("--summarize", action="store_true", help="Summarize changed files with AI")
+
+    serve = commands.add_parser("serve", help="Run the HTTP API service")
+    serve.add_argument("--host", default=None, help="Default API_HOST")
+    serve.add_argument("--port", type=int, default=None, help="Default API_PORT")
+    return parser
+
+def run_batch(args):
+    if args.no_db:
+        # Read by the settings module, so it must be set before the app is imported
+        os.environ["STORAGE_BACKEND"] = "none"
+    from app.config.settings import SCRAPER_BATCH_CONCURRENCY
+    from app.utils.db_connection import DatabaseManager
+    from app.utils.model_router import routing_options
+
+    workers = args.workers or SCRAPER_BATCH_CONCURRENCY
+    run = run_scrape if args.kind == "scrape" else run_codegen
+    jobs = read_jobs(args.input, "url" if args.kind == "scrape" else None)
+
+    if args.db_only:
+        output = None
+    elif args.output == "-":
+        output = sys.stdout
+    else:
+        output = open(args.output, "w", encoding="utf-8")
+    writer = ResultWriter(output)
+    try:
+        run(jobs, writer, workers, use_cache=not args.refresh, routing=routing_options(vars(args)))
+    finally:
+        if output not in (None, sys.stdout):
+            output.close()
+        # The process may exit right away, so wait for the background writes
+        DatabaseManager().flush_writes()
+    return writer.finish()
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        if args.command == "batch":
+            return run_batch(args)
+        if args.command == "serve":
+            return run_serve(args)
+        return run_ingest(args)
+    except OSError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
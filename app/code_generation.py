@@ -2,31 +2,14 @@
 Code generation module using Perplexity API.
 """
 import os
-import streamlit as st
-from streamlit.web import cli as stcli
 from datetime import datetime
 from app.utils.api_client import PerplexityClient
 from app.utils.db_connection import DatabaseManager
-from app.config.settings import COLLECTIONS
+from app.utils.code_search import retrieve_context, format_context
+from app.utils.prompt_packer import PromptSection, pack, prompt_budget, estimate_tokens
+from app.config.settings import COLLECTIONS, CODE_SEARCH_TOP_K
 
-class CodeGenerator:
-    def __init__(self):
-        # Initialize Perplexity client
-        perplexity = PerplexityClient()
-        self.client = perplexity.get_client()
-        self.model = perplexity.get_model("code")  # sonar-reasoning-pro
-        
-        # Get database collection
-        db_manager = DatabaseManager()
-        self.db = db_manager.get_collection(COLLECTIONS["code"])
-    
-    def generate_code(self, project_context, existing_code, task):
-        """Generate code using Perplexity API."""
-        try:
-            # Construct prompt for code generation
-            messages = [
-                {"role": "system", "content": "You are an expert software developer who writes clear, well-documented code."},
-                {"role": "user", "content": f"""
+PROMPT_TEMPLATE = """
                 Please generate Python code based on the following information:
                 
                 PROJECT CONTEXT:
@@ -37,21 +20,100 @@ class CodeGenerator:
                 {existing_code}
                 '''
                 
+                RELEVANT PROJECT CODE (retrieved from the indexed repository):
+                '''
+                {retrieved_code}
+                '''
+                
                 TASK:
                 {task}
                 
                 Please write complete, well-documented Python code that implements this task.
                 Include detailed comments explaining how the code works.
-                """}
-            ]
+                """
+
+class CodeGenerator:
+    def __init__(self):
+        # Initialize Perplexity client
+        perplexity = PerplexityClient()
+        self.client = perplexity.get_client()
+        self.model = perplexity.get_model("code")  # sonar-reasoning-pro
+        
+        # Get database collection
+        self.db_manager = DatabaseManager()
+        self.db = self.db_manager.get_collection(COLLECTIONS["code"])
+        self.last_prompt_report = None
+        self.last_record_id = None
+    
+    def build_messages(self, project_context, existing_code, task, snippets=(), model=None):
+        """
+        Assemble the code generation prompt within the token budget of model
+        (by default the configured code model).
+
+        The task and instructions are always kept whole; when the prompt is too
+        long, retrieved snippets are dropped (lowest-ranked first), then the
+        existing code and finally the project context are truncated. Returns
+        (messages, report) with the token count of each section.
+        """
+        system = "You are an expert software developer who writes clear, well-documented code."
+        sections = [
+            PromptSection("instructions", system + PROMPT_TEMPLATE.format(
+                project_context="", existing_code="", retrieved_code="", task=""), required=True),
+            PromptSection("task", task, required=True),
+            PromptSection("project_context", project_context, priority=3),
+            PromptSection("existing_code", existing_code, priority=2)
+        ] + [
+            PromptSection(f"snippet:{rank}", format_context([snippet]), priority=1, shrink="drop")
+            for rank, snippet in enumerate(snippets)
+        ]
+        texts, report = pack(sections, prompt_budget(model or self.model))
+
+        retrieved = [texts[f"snippet:{rank}"] for rank in range(len(snippets)) if f"snippet:{rank}" in texts]
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": PROMPT_TEMPLATE.format(
+                project_context=texts.get("project_context", ""),
+                existing_code=texts.get("existing_code", ""),
+                retrieved_code="\n\n".join(retrieved) or "(none)",
+                task=task
+            )}
+        ]
+        return messages, report
+
+    def generate_code(self, project_context, existing_code, task, on_delta=None, use_cache=True,
+                      retrieve=False, project=None, context_k=CODE_SEARCH_TOP_K, routing=None):
+        """
+        Generate code using Perplexity API.
+
+        Pass on_delta to receive the generated text incrementally as it streams,
+        and use_cache=False to ignore a cached result for the same request.
+        With retrieve=True the context_k ingested code chunks most relevant to
+        the task (from project, or all projects) are added to the prompt.
+        routing holds per-request router options (see ModelRouter.route).
+        """
+        try:
+            snippets = retrieve_context(task, context_k, project) if retrieve else []
             
-            # Get response from Perplexity
+            # The model is chosen on the unpacked prompt size, then the prompt packed for it
             perplexity = PerplexityClient()
+            prompt_tokens = sum(estimate_tokens(text) for text in (project_context, existing_code, task)) + sum(
+                estimate_tokens(snippet.get("content", "")) for snippet in snippets
+            )
+            route = perplexity.route("code", prompt_tokens=prompt_tokens, max_tokens=3000, **(routing or {}))
+            messages, self.last_prompt_report = self.build_messages(
+                project_context, existing_code, task, snippets, route["model"]
+            )
+            
+            # Get response from Perplexity
             response = perplexity.generate_completion(
-                model=self.model,
+                model=route["model"],
                 messages=messages,
                 temperature=0.3,  # Lower temperature for more deterministic code
-                max_tokens=3000   # Allow for longer code generation
+                max_tokens=3000,  # Allow for longer code generation
+                on_delta=on_delta,
+                purpose="code",
+                use_cache=use_cache,
+                route=route
             )
             
             if "error" in response:
@@ -59,17 +121,25 @@ class CodeGenerator:
             
             generated_code = response["content"]
             
-            # Save to database if connection exists
-            if self.db:
-                self.db.insert_one({
+            # Save to database in the background if connection exists
+            self.last_record_id = None
+            if self.db is not None:
+                record = {
                     "project_context": project_context,
                     "existing_code": existing_code,
                     "task": task,
+                    "retrieved_context": [
+                        {field: snippet[field] for field in ("project", "path", "name", "start_line", "end_line")}
+                        for snippet in snippets
+                    ],
                     "generated_code": generated_code,
+                    "prompt_tokens": self.last_prompt_report,
                     "model": response["model"],
                     "token_usage": response["usage"],
                     "timestamp": datetime.utcnow()
-                })
+                }
+                if self.db_manager.enqueue_insert(COLLECTIONS["code"], record):
+                    self.last_record_id = str(record["_id"])
             
             return generated_code
             
@@ -77,67 +147,18 @@ class CodeGenerator:
             print(f"Error generating code: {e}")
             return f"Error: {str(e)}"
 
-def render_code_gen_ui():
-    """Render the code generation UI in Streamlit."""
-    st.title("AI Code Generation")
-    
-    with st.form("code_gen_form"):
-        project_context = st.text_area(
-            "Project Context", 
-            placeholder="Describe your project needs and requirements",
-            height=150
-        )
-        
-        existing_code = st.text_area(
-            "Existing Code (optional)", 
-            placeholder="Paste any existing code here that the AI should build upon",
-            height=200
-        )
-        
-        task = st.text_area(
-            "Development Task", 
-            placeholder="Describe the specific coding task you need help with",
-            height=150
-        )
-        
-        submitted = st.form_submit_button("Generate Code")
-    
-    if submitted:
-        if not project_context or not task:
-            st.error("Please provide both project context and task description")
-            return
-            
-        with st.spinner("Generating code... This may take a moment."):
-            code_gen = CodeGenerator()
-            generated_code = code_gen.generate_code(
-                project_context=project_context,
-                existing_code=existing_code,
-                task=task
-            )
-            
-            if generated_code.startswith("Error:"):
-                st.error(generated_code)
-            else:
-                st.success("Code generation completed!")
-
-                code_parts = generated_code.split("python")
-                # Clean up the code if needed
-                try:
-                    if type(code_parts[0]) == 'str'
-                        # Extract code from markdown code blocks
-                        if len(code_parts) > 1:
-                            code_block = code_parts[1].split("")
-                            generated_code = code_block
-                except:
-                    print("If statement crush")
-                # Display the generated code
-                st.code(generated_code, language="python")
-                
-                # Save to session state for sharing with chat
-                st.session_state.code_context = generated_code
-                
-                # Add button to discuss with AI
-                if st.button("Discuss with AI Assistant"):
-                    st.session_state.chat_context = f"Generated code: {generated_code}"
-                    st.session_state.nav_option = "Chat Assistant"
-                    st.experimental_rerun() 
+def extract_code_block(text, language="python"):
+    """Return the first fenced code block in text, or text itself if there is none."""
+    fence = "```"
+    start = text.find(fence + language)
+    if start == -1:
+        start = text.find(fence)
+        if start == -1:
+            return text
+    body_start = text.find("\n", start)
+    if body_start == -1:
+        return text
+    end = text.find(fence, body_start)
+    if end == -1:
+        return text[body_start + 1:]
+    return text[body_start + 1:end]
@@ -24,18 +24,266 @@ PERPLEXITY_MODELS = {
     "chat": "sonar-pro"             # For chat assistant
 }
 
+# Model routing: each purpose starts at its configured model and falls back along these
+# faster, cheaper models for simple tasks, under load, after timeouts or over budget
+MODEL_FALLBACKS = {
+    "code": ["sonar-pro"],
+    "web": ["sonar-reasoning-pro", "sonar-pro"],
+    "chat": ["sonar"]
+}
+ROUTING_ENABLED = os.getenv("ROUTING_ENABLED", "true").lower() == "true"
+# Pages with less article text than this (characters) are researched without deep research
+ROUTING_DEEP_RESEARCH_MIN_CHARS = int(os.getenv("ROUTING_DEEP_RESEARCH_MIN_CHARS", "12000"))
+# Seconds research waits for a page not fetched yet (duplicate detection off) to route on its
+# length; 0 routes without it so the fetch keeps overlapping the model call
+ROUTING_PAGE_WAIT_SECONDS = float(os.getenv("ROUTING_PAGE_WAIT_SECONDS", "0"))
+# Default budgets per request, overridable per request (0 for none)
+ROUTING_LATENCY_BUDGET = float(os.getenv("ROUTING_LATENCY_BUDGET", "0"))
+ROUTING_COST_BUDGET = float(os.getenv("ROUTING_COST_BUDGET", "0"))
+# Seconds a model that timed out is passed over
+ROUTING_TIMEOUT_COOLDOWN = float(os.getenv("ROUTING_TIMEOUT_COOLDOWN", "120"))
+# Typical completion seconds per model, used until ROUTING_MIN_SAMPLES calls have been timed
+MODEL_EXPECTED_SECONDS = {
+    "sonar-deep-research": 240,
+    "sonar-reasoning-pro": 40,
+    "sonar-pro": 15,
+    "sonar": 8
+}
+MODEL_DEFAULT_EXPECTED_SECONDS = 30
+ROUTING_MIN_SAMPLES = int(os.getenv("ROUTING_MIN_SAMPLES", "5"))
+# Routing decisions and completion times kept per model
+ROUTING_HISTORY = int(os.getenv("ROUTING_HISTORY", "200"))
+
+# HTTP connection pool shared by all Perplexity requests
+PERPLEXITY_MAX_CONNECTIONS = int(os.getenv("PERPLEXITY_MAX_CONNECTIONS", "50"))
+PERPLEXITY_MAX_KEEPALIVE = int(os.getenv("PERPLEXITY_MAX_KEEPALIVE", "20"))
+PERPLEXITY_TIMEOUT = float(os.getenv("PERPLEXITY_TIMEOUT", "600"))
+
+# Maximum number of in-flight async requests per model
+PERPLEXITY_MODEL_CONCURRENCY = {
+    "sonar-deep-research": 5,
+    "sonar-reasoning-pro": 10,
+    "sonar-pro": 20
+}
+PERPLEXITY_DEFAULT_CONCURRENCY = 10
+
+# Provider rate limits per model (requests and tokens per minute)
+PERPLEXITY_RATE_LIMITS = {
+    "sonar-deep-research": {"rpm": 5, "tpm": 200000},
+    "sonar-reasoning-pro": {"rpm": 50, "tpm": 1000000},
+    "sonar-pro": {"rpm": 50, "tpm": 1000000}
+}
+PERPLEXITY_DEFAULT_RATE_LIMIT = {"rpm": 50, "tpm": 1000000}
+
+# Estimated prices for cost metrics: dollars per million input/output tokens and per request
+# (request fees depend on search context size; check the provider's current price list)
+PERPLEXITY_PRICING = {
+    "sonar-deep-research": {"input": 2.0, "output": 8.0, "request": 0.005},
+    "sonar-reasoning-pro": {"input": 2.0, "output": 8.0, "request": 0.006},
+    "sonar-pro": {"input": 3.0, "output": 15.0, "request": 0.006},
+    "sonar": {"input": 1.0, "output": 1.0, "request": 0.005}
+}
+PERPLEXITY_DEFAULT_PRICING = {"input": 3.0, "output": 15.0, "request": 0.006}
+
+# Prompt token budget per model (input only; max_tokens for the answer comes on top)
+PROMPT_TOKEN_BUDGETS = {
+    "sonar-deep-research": int(os.getenv("PROMPT_BUDGET_DEEP_RESEARCH", "32000")),
+    "sonar-reasoning-pro": int(os.getenv("PROMPT_BUDGET_REASONING_PRO", "24000")),
+    "sonar-pro": int(os.getenv("PROMPT_BUDGET_PRO", "16000"))
+}
+PROMPT_DEFAULT_TOKEN_BUDGET = int(os.getenv("PROMPT_DEFAULT_TOKEN_BUDGET", "16000"))
+
+# Retries for rate-limited and transient failures (jittered exponential backoff)
+PERPLEXITY_MAX_RETRIES = int(os.getenv("PERPLEXITY_MAX_RETRIES", "4"))
+PERPLEXITY_BACKOFF_BASE = float(os.getenv("PERPLEXITY_BACKOFF_BASE", "1.0"))
+PERPLEXITY_BACKOFF_MAX = float(os.getenv("PERPLEXITY_BACKOFF_MAX", "60.0"))
+
+# Web scraping concurrency
+SCRAPER_FETCH_WORKERS = int(os.getenv("SCRAPER_FETCH_WORKERS", "8"))
+SCRAPER_BATCH_CONCURRENCY = int(os.getenv("SCRAPER_BATCH_CONCURRENCY", "4"))
+
+# Crawling budgets for discovering relevant articles from seed pages
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "40"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+CRAWL_MAX_PAGES_PER_DOMAIN = int(os.getenv("CRAWL_MAX_PAGES_PER_DOMAIN", "25"))
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+CRAWL_TOP_K = int(os.getenv("CRAWL_TOP_K", "5"))
+
+# Page fetching: pooled session and on-disk page cache
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+FETCH_MAX_PER_HOST = int(os.getenv("FETCH_MAX_PER_HOST", "4"))
+FETCH_POOL_HOSTS = int(os.getenv("FETCH_POOL_HOSTS", "32"))
+FETCH_USER_AGENT = os.getenv(
+    "FETCH_USER_AGENT",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+)
+FETCH_CACHE_MAX_ENTRIES = int(os.getenv("FETCH_CACHE_MAX_ENTRIES", "20000"))
+# Seconds a page without Cache-Control max-age is reused before revalidating
+FETCH_CACHE_FRESH_SECONDS = int(os.getenv("FETCH_CACHE_FRESH_SECONDS", "0"))
+# HTML extraction engine: "auto" (lxml when installed), "lxml", "stdlib" or "bs4"
+HTML_EXTRACT_ENGINE = os.getenv("HTML_EXTRACT_ENGINE", "auto")
+
 # MongoDB Configuration
 MONGODB_URI = os.getenv("MONGODB_URI")
 DB_NAME = "mclg_ws_db"
+MONGODB_TIMEOUT_MS = int(os.getenv("MONGODB_TIMEOUT_MS", "5000"))
+
+# Seconds between background connectivity checks shown in the UI
+HEALTH_CHECK_INTERVAL = int(os.getenv("HEALTH_CHECK_INTERVAL", "60"))
+
+# Write-behind persistence: writes are batched off the request path
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "100"))
+WRITE_FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "1.0"))
+# Maximum queued writes; producers wait WRITE_PUT_TIMEOUT seconds for room before spilling
+WRITE_QUEUE_MAX = int(os.getenv("WRITE_QUEUE_MAX", "10000"))
+WRITE_PUT_TIMEOUT = float(os.getenv("WRITE_PUT_TIMEOUT", "2.0"))
+# Seconds to keep spilling after a failed write before trying MongoDB again
+WRITE_RETRY_INTERVAL = float(os.getenv("WRITE_RETRY_INTERVAL", "30"))
+WRITE_SHUTDOWN_TIMEOUT = float(os.getenv("WRITE_SHUTDOWN_TIMEOUT", "10"))
 
 # Collection names
 COLLECTIONS = {
     "code": "generated_code",
     "scraping": "scraped_data",
     "chat": "chat_history",
-    "projects": "project_descriptions"
+    "projects": "project_descriptions",
+    "cache": "completion_cache"
+}
+
+# Days chat history is kept before MongoDB expires it (0 keeps it forever)
+CHAT_HISTORY_TTL_DAYS = int(os.getenv("CHAT_HISTORY_TTL_DAYS", "0"))
+
+# Chat memory: the last CHAT_MEMORY_RECENT_TURNS exchanges are sent verbatim and
+# older ones are folded into a running summary, CHAT_MEMORY_COMPACT_TURNS at a time
+CHAT_MEMORY_RECENT_TURNS = int(os.getenv("CHAT_MEMORY_RECENT_TURNS", "6"))
+CHAT_MEMORY_COMPACT_TURNS = int(os.getenv("CHAT_MEMORY_COMPACT_TURNS", "4"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "600"))
+
+# Indexes per COLLECTIONS entry, created idempotently when MongoDB connects.
+# Every listed collection gets (timestamp, _id) for newest-first keyset pagination.
+COLLECTION_INDEXES = {
+    "code": [
+        {"keys": [("timestamp", -1), ("_id", -1)], "name": "timestamp_id"},
+        {"keys": [("task", 1), ("timestamp", -1)], "name": "task_timestamp"},
+        {"keys": [("task", "text"), ("generated_code", "text")], "name": "code_text",
+         "weights": {"task": 5, "generated_code": 1}}
+    ],
+    "scraping": [
+        {"keys": [("timestamp", -1), ("_id", -1)], "name": "timestamp_id"},
+        {"keys": [("url", 1), ("timestamp", -1)], "name": "url_timestamp"},
+        {"keys": [("aliases", 1)], "name": "aliases", "sparse": True},
+        {"keys": [("title", "text"), ("ai_research", "text")], "name": "research_text",
+         "weights": {"title": 5, "ai_research": 1}}
+    ],
+    "chat": [
+        {"keys": [("timestamp", -1), ("_id", -1)], "name": "timestamp_id"},
+        {"keys": [("conversation_id", 1), ("kind", 1)], "name": "conversation_kind"},
+        {"keys": [("timestamp", 1)], "name": "timestamp_ttl",
+         **({"expireAfterSeconds": CHAT_HISTORY_TTL_DAYS * 24 * 3600} if CHAT_HISTORY_TTL_DAYS > 0 else {})}
+    ],
+    "projects": [
+        {"keys": [("timestamp", -1), ("_id", -1)], "name": "timestamp_id"},
+        {"keys": [("project", 1), ("kind", 1), ("path", 1)], "name": "project_kind_path"},
+        {"keys": [("project", 1), ("path", 1)], "name": "project_path"},
+        {"keys": [("name", "text"), ("summary", "text"), ("content", "text")], "name": "project_text",
+         "weights": {"name": 5, "summary": 3, "content": 1}}
+    ]
 }
 
+# Local storage for caches and indexes
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATA_DIR = os.getenv("MCLG_DATA_DIR", os.path.join(PROJECT_ROOT, ".mclg_data"))
+
+# Document storage: "mongo" (MONGODB_URI), "sqlite" (embedded file in DATA_DIR),
+# "none", or "auto" to use MongoDB when MONGODB_URI is set and SQLite otherwise
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "auto")
+STORAGE_PATH = os.getenv("STORAGE_PATH", os.path.join(DATA_DIR, "storage.sqlite3"))
+
+# Identical concurrent model calls share one request (single-flight); only calls at or
+# below this temperature are coalesced, since only those give interchangeable answers
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+SINGLE_FLIGHT_MAX_TEMPERATURE = float(os.getenv("SINGLE_FLIGHT_MAX_TEMPERATURE", "0.5"))
+# Lock files coordinating worker processes on one host; empty coalesces within a process only
+SINGLE_FLIGHT_LOCK_DIR = os.getenv("SINGLE_FLIGHT_LOCK_DIR", os.path.join(DATA_DIR, "locks"))
+# Longest a process waits for another process's identical call before making its own
+SINGLE_FLIGHT_WAIT_SECONDS = float(os.getenv("SINGLE_FLIGHT_WAIT_SECONDS", "900"))
+
+# Completion cache: "sqlite" (local file), "mongo" (COLLECTIONS["cache"]) or "none"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+CACHE_PATH = os.path.join(DATA_DIR, "completion_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+FETCH_CACHE_PATH = os.path.join(DATA_DIR, "page_cache.sqlite3")
+# Writes that could not reach MongoDB, replayed when it is reachable again
+WRITE_SPILL_PATH = os.path.join(DATA_DIR, "pending_writes.jsonl")
+
+# Seconds a cached completion stays valid per purpose (0 disables caching)
+CACHE_TTL = {
+    "code": 7 * 24 * 3600,
+    "web": 24 * 3600,
+    "chat": 0
+}
+
+# Duplicate detection before researching a page
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+DEDUP_PATH = os.path.join(DATA_DIR, "dedup_index.sqlite3")
+# Maximum SimHash bit difference for two pages to count as near-duplicates
+DEDUP_MAX_DISTANCE = int(os.getenv("DEDUP_MAX_DISTANCE", "3"))
+# Pages with less normalized text than this are never treated as duplicates
+DEDUP_MIN_CHARS = int(os.getenv("DEDUP_MIN_CHARS", "200"))
+
 # Environment and debug settings
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 DEBUG = ENVIRONMENT == "development"
+
+# Repository ingestion into COLLECTIONS["projects"]
+# Remote repositories given by URL are cloned (shallow) under this directory
+REPO_CHECKOUT_DIR = os.path.join(DATA_DIR, "repos")
+INGEST_EXTENSIONS = tuple(os.getenv(
+    "INGEST_EXTENSIONS",
+    ".py,.pyi,.js,.jsx,.ts,.tsx,.java,.kt,.go,.rs,.c,.h,.cpp,.hpp,.cs,.rb,.php,.swift,.scala,.sh,.sql,"
+    ".html,.css,.md,.rst,.txt,.toml,.yaml,.yml,.json,.cfg,.ini"
+).split(","))
+# Larger files (usually generated or data) are skipped
+INGEST_MAX_FILE_BYTES = int(os.getenv("INGEST_MAX_FILE_BYTES", "200000"))
+# Chunks longer than this many lines are split
+INGEST_CHUNK_LINES = int(os.getenv("INGEST_CHUNK_LINES", "120"))
+# Characters of a file sent to the model when summarizing it
+INGEST_SUMMARY_MAX_CHARS = int(os.getenv("INGEST_SUMMARY_MAX_CHARS", "12000"))
+
+# Code search over ingested repository chunks
+CODE_SEARCH_TOP_K = int(os.getenv("CODE_SEARCH_TOP_K", "5"))
+# Vector index next to BM25: "none", "flat" (brute force), "ivf" (clustered), or "auto" (ivf for large indexes)
+CODE_SEARCH_VECTOR = os.getenv("CODE_SEARCH_VECTOR", "none")
+# Dimensions of the local hashed token embeddings
+CODE_SEARCH_DIMENSIONS = int(os.getenv("CODE_SEARCH_DIMENSIONS", "128"))
+CODE_SEARCH_IVF_MIN_CHUNKS = int(os.getenv("CODE_SEARCH_IVF_MIN_CHUNKS", "20000"))
+CODE_SEARCH_IVF_PROBES = int(os.getenv("CODE_SEARCH_IVF_PROBES", "8"))
+# Seconds between checks for newly ingested chunks
+CODE_SEARCH_REFRESH_SECONDS = float(os.getenv("CODE_SEARCH_REFRESH_SECONDS", "10"))
+
+# HTTP API service (python -m app serve)
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# Seconds an event stream waits for output before sending a keep-alive comment
+API_STREAM_KEEPALIVE_SECONDS = float(os.getenv("API_STREAM_KEEPALIVE_SECONDS", "15"))
+# Background jobs: worker threads, and how long (and how many) finished jobs stay available for polling
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+JOB_MAX_RETAINED = int(os.getenv("JOB_MAX_RETAINED", "1000"))
+# Conversations kept in memory by the API when there is no database to restore them from
+API_MAX_CONVERSATIONS = int(os.getenv("API_MAX_CONVERSATIONS", "500"))
+
+# Latency, token and cost metrics (Performance page, /metrics on the API service)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Recent samples per series used for the p50/p95/p99 latencies
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))
+# Prometheus textfile written every METRICS_EXPORT_INTERVAL seconds; empty disables it
+METRICS_EXPORT_PATH = os.getenv("METRICS_EXPORT_PATH", "")
+METRICS_EXPORT_INTERVAL = float(os.getenv("METRICS_EXPORT_INTERVAL", "15"))
+
+# Streamlit UI: database listings and documents are cached across reruns and sessions
+# for UI_CACHE_TTL seconds (at most UI_CACHE_MAX_ENTRIES per query)
+UI_CACHE_TTL = int(os.getenv("UI_CACHE_TTL", "30"))
+UI_CACHE_MAX_ENTRIES = int(os.getenv("UI_CACHE_MAX_ENTRIES", "256"))
+# Characters of a stored result passed to the chat as context
+UI_CHAT_CONTEXT_CHARS = int(os.getenv("UI_CHAT_CONTEXT_CHARS", "1000"))
@@ -0,0 +1,232 @@
+"""
+Frontier-based crawler that finds the most relevant articles linked from seed pages.
+"""
+import re
+import math
+import heapq
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from urllib.parse import urlsplit
+from app.utils.http_fetcher import PageFetcher
+from app.utils.html_extract import extract_page
+from app.utils.url_utils import normalize_url, url_host, url_fingerprint
+from app.config.settings import (
+    CRAWL_MAX_PAGES,
+    CRAWL_MAX_DEPTH,
+    CRAWL_MAX_PAGES_PER_DOMAIN,
+    CRAWL_WORKERS
+)
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_DATE_IN_URL = re.compile(r'/(20\d{2})(?:[/-](0[1-9]|1[0-2]))?(?:[/-]\d{1,2})?(?:/|$)')
+_ARTICLE_PATH = re.compile(r'/(news|article|articles|story|stories|post|posts|blog|report|reports|analysis)/')
+_SLUG = re.compile(r'/[a-z0-9]+(?:-[a-z0-9]+){3,}/?$')
+_LOW_VALUE_PATH = re.compile(
+    r'/(tag|tags|category|categories|author|login|signin|signup|register|subscribe|account|'
+    r'privacy|terms|cookie|cookies|about|contact|feed|rss|search|share|cart|wp-admin)(/|$|\?)'
+)
+_SKIPPED_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".pdf", ".zip", ".mp3", ".mp4",
+    ".css", ".js", ".ico", ".xml", ".doc", ".docx", ".xls", ".xlsx"
+)
+
+def tokenize(text):
+    return _TOKEN.findall(text.lower())
+
+class SeenSet:
+    """Set of 64-bit URL fingerprints; far smaller than storing the URLs themselves."""
+
+    def __init__(self):
+        self._fingerprints = set()
+        self._lock = threading.Lock()
+
+    def add(self, url):
+        """Add url and return True if it had not been seen before."""
+        fingerprint = url_fingerprint(url)
+        with self._lock:
+            if fingerprint in self._fingerprints:
+                return False
+            self._fingerprints.add(fingerprint)
+            return True
+
+    def __contains__(self, url):
+        return url_fingerprint(url) in self._fingerprints
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+class LinkScorer:
+    """
+    Scores links from cheap local signals before anything is fetched.
+
+    Anchor and URL tokens are weighted by TF-IDF against the keywords, with
+    the IDF taken from every link discovered so far. URL shape (article-like
+    paths and slugs versus tag, login or legal pages) and dates in the URL
+    adjust the score, and deeper links are discounted.
+    """
+
+    def __init__(self, keywords, now=None):
+        self.keywords = set(tokenize(" ".join(keywords))) if keywords else set()
+        self.document_count = 0
+        self.document_frequency = Counter()
+        self.current_year = (now or datetime.utcnow()).year
+
+    def observe(self, anchor_text, url):
+        """Add a discovered link to the IDF statistics."""
+        self.document_count += 1
+        self.document_frequency.update(set(tokenize(anchor_text) + tokenize(urlsplit(url).path)))
+
+    def _idf(self, term):
+        return math.log((1 + self.document_count) / (1 + self.document_frequency[term])) + 1
+
+    def keyword_score(self, text):
+        """TF-IDF weight of the keywords in text."""
+        if not self.keywords:
+            return 0.0
+        counts = Counter(tokenize(text))
+        if not counts:
+            return 0.0
+        length = sum(counts.values())
+        return sum(
+            (counts[term] / length) * self._idf(term)
+            for term in self.keywords if term in counts
+        )
+
+    def url_score(self, url):
+        path = urlsplit(url).path.lower()
+        score = 0.0
+        if _ARTICLE_PATH.search(path):
+            score += 0.5
+        if _SLUG.search(path):
+            score += 0.5
+        if _LOW_VALUE_PATH.search(path):
+            score -= 1.5
+        match = _DATE_IN_URL.search(path)
+        if match:
+            # Recent years rank higher; anything older than five years earns nothing
+            age = self.current_year - int(match.group(1))
+            score += max(0.0, 1.0 - age / 5)
+        return score
+
+    def score(self, anchor_text, url, depth):
+        text = f"{anchor_text} {' '.join(tokenize(urlsplit(url).path))}"
+        relevance = 2.0 * self.keyword_score(text) + self.url_score(url)
+        if len(anchor_text.split()) >= 4:
+            # Headlines are longer than navigation labels
+            relevance += 0.25
+        return relevance / (1 + 0.5 * depth)
+
+class Frontier:
+    """Priority queue of URLs to visit with depth and per-domain budgets."""
+
+    def __init__(self, max_depth=CRAWL_MAX_DEPTH, max_pages_per_domain=CRAWL_MAX_PAGES_PER_DOMAIN):
+        self.max_depth = max_depth
+        self.max_pages_per_domain = max_pages_per_domain
+        self.seen = SeenSet()
+        self._heap = []
+        self._sequence = 0
+        self._scheduled_per_domain = Counter()
+
+    def push(self, url, score, depth, anchor_text="", parent=None):
+        """Queue url unless it was already seen or exceeds the depth budget."""
+        if depth > self.max_depth or not self.seen.add(url):
+            return False
+        self._sequence += 1
+        heapq.heappush(self._heap, (-score, self._sequence, url, depth, anchor_text, parent))
+        return True
+
+    def pop(self):
+        """Return the best URL whose domain still has budget, or None."""
+        while self._heap:
+            negative_score, _, url, depth, anchor_text, parent = heapq.heappop(self._heap)
+            domain = url_host(url)
+            if self._scheduled_per_domain[domain] >= self.max_pages_per_domain:
+                continue
+            self._scheduled_per_domain[domain] += 1
+            return {"url": url, "score": -negative_score, "depth": depth, "anchor_text": anchor_text, "parent": parent}
+        return None
+
+    def __len__(self):
+        return len(self._heap)
+
+def extract_links(html, base_url):
+    """Return the title and (anchor text, absolute URL) pairs of a page."""
+    page = extract_page(html, fields=("title", "links"))
+    return page["title"], [(text, normalize_url(href, base=base_url)) for href, text in page["links"]]
+
+class Crawler:
+    """Crawl outward from seed pages, fetching the most promising links first."""
+
+    def __init__(self, seeds, keywords=None, max_pages=CRAWL_MAX_PAGES, max_depth=CRAWL_MAX_DEPTH,
+                 max_pages_per_domain=CRAWL_MAX_PAGES_PER_DOMAIN, workers=CRAWL_WORKERS,
+                 same_domain=True, fetcher=None):
+        self.seeds = [url for url in (normalize_url(seed) for seed in seeds) if url]
+        self.scorer = LinkScorer(keywords or [])
+        self.frontier = Frontier(max_depth, max_pages_per_domain)
+        self.max_pages = max_pages
+        self.workers = max(1, workers)
+        self.allowed_domains = {url_host(seed) for seed in self.seeds} if same_domain else None
+        self.fetcher = fetcher or PageFetcher()
+        self.pages = []
+
+    def _allowed(self, url):
+        if url.lower().endswith(_SKIPPED_EXTENSIONS):
+            return False
+        return self.allowed_domains is None or url_host(url) in self.allowed_domains
+
+    def _visit(self, item):
+        """Fetch one frontier item and extract its links (runs on a worker thread)."""
+        page = self.fetcher.fetch(item["url"])
+        if page["status"] != 200 or "html" not in (page["content_type"] or "html"):
+            return item, None, []
+        title, links = extract_links(page["text"], page["url"])
+        return item, title, links
+
+    def _record(self, item, title, links):
+        """Store a fetched page and queue its outgoing links (runs on the crawl thread)."""
+        if title is not None:
+            item["title"] = title
+            # A matching page title confirms what the anchor text promised
+            item["score"] += self.scorer.keyword_score(title)
+            self.pages.append(item)
+
+        candidates = [(text, url) for text, url in links if url and self._allowed(url)]
+        for text, url in candidates:
+            self.scorer.observe(text, url)
+        for text, url in candidates:
+            depth = item["depth"] + 1
+            self.frontier.push(url, self.scorer.score(text, url, depth), depth, text, item["url"])
+
+    def crawl(self):
+        """Run the crawl and return fetched pages, most relevant first."""
+        for seed in self.seeds:
+            self.frontier.push(seed, float("inf"), 0)
+
+        scheduled = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="crawl") as executor:
+            pending = set()
+            while True:
+                while len(pending) < self.workers and scheduled < self.max_pages:
+                    item = self.frontier.pop()
+                    if item is None:
+                        break
+                    pending.add(executor.submit(self._visit, item))
+                    scheduled += 1
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        self._record(*future.result())
+                    except Exception as e:
+                        print(f"Error crawling page: {e}")
+
+        return sorted(self.pages, key=lambda page: page["score"], reverse=True)
+
+    def top_articles(self, k):
+        """The k most relevant pages found beyond the seed pages."""
+        pages = self.pages or self.crawl()
+        return [page for page in sorted(pages, key=lambda page: page["score"], reverse=True)
+                if page["depth"] > 0][:k]
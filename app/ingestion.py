@@ -0,0 +1,387 @@
+"""
+Repository ingestion: chunk a git checkout into the project descriptions collection.
+
+Files are listed with their git blob hashes, so re-indexing after a commit
+only reads, chunks and (optionally) summarizes the files whose hash changed;
+unchanged files cost neither disk reads nor tokens. Python files are split
+along their syntax tree into functions, classes and methods, other text
+files into blank-line delimited blocks.
+
+Each file is stored as one "file" document (path, blob hash, optional
+summary) plus one document per chunk, and the project as a whole as one
+"project" document. The file document is written last, so a file whose
+ingestion was interrupted has no file document and is processed again.
+"""
+import os
+import re
+import ast
+import time
+import hashlib
+import subprocess
+from datetime import datetime
+from app.utils.api_client import PerplexityClient
+from app.utils.db_connection import DatabaseManager
+from app.utils.metrics import Metrics
+from app.config.settings import (
+    COLLECTIONS,
+    REPO_CHECKOUT_DIR,
+    INGEST_EXTENSIONS,
+    INGEST_MAX_FILE_BYTES,
+    INGEST_CHUNK_LINES,
+    INGEST_SUMMARY_MAX_CHARS
+)
+
+_REMOTE = re.compile(r'^(https?://|git@|ssh://)')
+_UNSAFE_PATH = re.compile(r'[^A-Za-z0-9._-]+')
+
+# git file modes that are not regular files (symlinks and submodules)
+_SKIPPED_MODES = ("120000", "160000")
+
+LANGUAGES = {
+    ".py": "python", ".pyi": "python", ".js": "javascript", ".jsx": "javascript", ".ts": "typescript",
+    ".tsx": "typescript", ".java": "java", ".kt": "kotlin", ".go": "go", ".rs": "rust", ".c": "c", ".h": "c",
+    ".cpp": "cpp", ".hpp": "cpp", ".cs": "csharp", ".rb": "ruby", ".php": "php", ".swift": "swift",
+    ".scala": "scala", ".sh": "bash", ".sql": "sql", ".html": "html", ".css": "css", ".md": "markdown"
+}
+
+# Ingested documents are written in batches of this many
+WRITE_BATCH = 500
+
+def hash_blob(data):
+    """The git blob hash of data, identical to `git hash-object`."""
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def _git(root, *args):
+    return subprocess.run(["git", "-C", root, *args], capture_output=True, check=True).stdout
+
+def is_git_repository(root):
+    try:
+        return _git(root, "rev-parse", "--is-inside-work-tree").strip() == b"true"
+    except (OSError, subprocess.CalledProcessError):
+        return False
+
+def head_commit(root):
+    try:
+        return _git(root, "rev-parse", "HEAD").decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def resolve_source(source):
+    """
+    Local path of the repository to ingest.
+
+    A URL is cloned shallowly under REPO_CHECKOUT_DIR the first time and
+    fast-forwarded to the remote HEAD afterwards.
+    """
+    if not _REMOTE.match(source):
+        return os.path.abspath(os.path.expanduser(source))
+    name = _UNSAFE_PATH.sub("_", re.sub(r'^[a-z+]+://|^git@', "", source).rstrip("/").removesuffix(".git"))
+    target = os.path.join(REPO_CHECKOUT_DIR, name)
+    if os.path.isdir(os.path.join(target, ".git")):
+        _git(target, "fetch", "--depth", "1", "origin")
+        _git(target, "reset", "--hard", "FETCH_HEAD")
+    else:
+        os.makedirs(REPO_CHECKOUT_DIR, exist_ok=True)
+        subprocess.run(["git", "clone", "--depth", "1", source, target], capture_output=True, check=True)
+    return target
+
+def _wanted(path):
+    return path.lower().endswith(INGEST_EXTENSIONS)
+
+def list_files(root):
+    """
+    {path: blob hash} for the ingestible files of a checkout.
+
+    Tracked files take their hash from the git index without being read;
+    only files modified in the working tree or untracked are hashed here.
+    Outside git every file is hashed.
+    """
+    if not is_git_repository(root):
+        files = {}
+        for directory, subdirectories, names in os.walk(root):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith(".")]
+            for name in names:
+                path = os.path.relpath(os.path.join(directory, name), root).replace(os.sep, "/")
+                if _wanted(path):
+                    blob = _hash_file(root, path)
+                    if blob is not None:
+                        files[path] = blob
+        return files
+
+    files = {}
+    for entry in _git(root, "ls-files", "-s", "-z").split(b"\0"):
+        if not entry:
+            continue
+        info, path = entry.split(b"\t", 1)
+        mode, blob, _ = info.split()
+        path = path.decode("utf-8", "surrogateescape")
+        if mode.decode() not in _SKIPPED_MODES and _wanted(path):
+            files[path] = blob.decode()
+
+    dirty = _git(root, "ls-files", "-m", "-o", "--exclude-standard", "-z").split(b"\0")
+    for path in (entry.decode("utf-8", "surrogateescape") for entry in dirty if entry):
+        if not _wanted(path):
+            continue
+        blob = _hash_file(root, path)
+        if blob is None:
+            files.pop(path, None)
+        else:
+            files[path] = blob
+    return files
+
+def _hash_file(root, path):
+    try:
+        with open(os.path.join(root, path), "rb") as f:
+            return hash_blob(f.read())
+    except OSError:
+        return None
+
+def _line_chunks(lines, first_line=1, max_lines=INGEST_CHUNK_LINES):
+    """Split lines into blocks of at most max_lines, preferring to cut at blank lines."""
+    chunks = []
+    start = 0
+    while start < len(lines):
+        end = min(start + max_lines, len(lines))
+        if end < len(lines):
+            for cut in range(end, start + max_lines // 2, -1):
+                if not lines[cut - 1].strip():
+                    end = cut
+                    break
+        chunks.append((first_line + start, first_line + end - 1))
+        start = end
+    return chunks
+
+def _python_chunks(text, max_lines):
+    """(kind, name, start_line, end_line) spans along the module's syntax tree."""
+    tree = ast.parse(text)
+    spans = []
+    pending_start = None
+
+    def flush(end_line):
+        nonlocal pending_start
+        if pending_start is not None and end_line >= pending_start:
+            spans.append(("module", "", pending_start, end_line))
+        pending_start = None
+
+    for node in tree.body:
+        start = min([node.lineno] + [decorator.lineno for decorator in getattr(node, "decorator_list", [])])
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            flush(start - 1)
+            kind = "class" if isinstance(node, ast.ClassDef) else "function"
+            if kind == "class" and node.end_lineno - start + 1 > max_lines:
+                spans.extend(_class_chunks(node, start))
+            else:
+                spans.append((kind, node.name, start, node.end_lineno))
+        elif pending_start is None:
+            pending_start = start
+    flush(len(text.splitlines()))
+    return spans
+
+def _class_chunks(node, start):
+    """A large class as its header plus one span per method."""
+    spans = []
+    header_end = node.end_lineno
+    for child in node.body:
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            child_start = min([child.lineno] + [decorator.lineno for decorator in child.decorator_list])
+            header_end = min(header_end, child_start - 1)
+            spans.append(("method", f"{node.name}.{child.name}", child_start, child.end_lineno))
+    spans.insert(0, ("class", node.name, start, header_end))
+    return spans
+
+def chunk_file(path, text, max_lines=INGEST_CHUNK_LINES):
+    """
+    Split a file into chunks of {"kind", "name", "start_line", "end_line", "content", "content_hash"}.
+
+    Spans longer than max_lines are cut into parts; Python files that do not
+    parse fall back to line blocks like any other file.
+    """
+    lines = text.splitlines()
+    spans = None
+    if LANGUAGES.get(os.path.splitext(path)[1].lower()) == "python":
+        try:
+            spans = _python_chunks(text, max_lines)
+        except (SyntaxError, ValueError):
+            spans = None
+    if spans is None:
+        spans = [("block", "", start, end) for start, end in _line_chunks(lines, 1, max_lines)]
+
+    chunks = []
+    for kind, name, start, end in spans:
+        parts = _line_chunks(lines[start - 1:end], start, max_lines) if end - start + 1 > max_lines else [(start, end)]
+        for index, (part_start, part_end) in enumerate(parts):
+            content = "\n".join(lines[part_start - 1:part_end])
+            if not content.strip():
+                continue
+            chunks.append({
+                "kind": kind,
+                "name": f"{name} (part {index + 1})" if name and len(parts) > 1 else name,
+                "start_line": part_start,
+                "end_line": part_end,
+                "content": content,
+                "content_hash": hashlib.sha256(content.encode("utf-8")).hexdigest()
+            })
+    return chunks
+
+class RepositoryIngester:
+    """Incrementally indexes one repository into COLLECTIONS["projects"]."""
+
+    def __init__(self, source, project=None, summarize=False):
+        self.source = source
+        self.project = project or os.path.basename(source.rstrip("/")).removesuffix(".git")
+        self.summarize = summarize
+        self.collection = DatabaseManager().get_collection(COLLECTIONS["projects"])
+        if summarize:
+            perplexity = PerplexityClient()
+            self.perplexity = perplexity
+            self.model = perplexity.get_model("code")
+
+    def _indexed_files(self):
+        return {
+            document["path"]: document.get("blob")
+            for document in self.collection.find({"project": self.project, "kind": "file"}, {"path": 1, "blob": 1})
+        }
+
+    def _summarize(self, request, text):
+        response = self.perplexity.generate_completion(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You summarize source code for developers. Be brief and factual."},
+                {"role": "user", "content": f"{request}\n\n{text[:INGEST_SUMMARY_MAX_CHARS]}"}
+            ],
+            temperature=0.2,
+            max_tokens=400,
+            purpose="code"
+        )
+        if "error" in response:
+            print(f"Error summarizing {self.project}: {response['error']}")
+            return None
+        return response["content"]
+
+    def _summarize_file(self, path, text):
+        return self._summarize(f"Summarize the purpose and main contents of {path} in at most five sentences.", text)
+
+    def _summarize_project(self, summaries):
+        listing = "\n".join(f"- {path}: {summary}" for path, summary in sorted(summaries.items()) if summary)
+        if not listing:
+            return None
+        return self._summarize(
+            f"These are summaries of the files of the project {self.project}. "
+            "Give a short overview of the project and describe its subsystems and the files in each.",
+            listing
+        )
+
+    def _file_documents(self, root, path, blob, now):
+        """Chunk and file documents for one file, or None if it is not text."""
+        full_path = os.path.join(root, path)
+        try:
+            if os.path.getsize(full_path) > INGEST_MAX_FILE_BYTES:
+                return None
+            with open(full_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if b"\0" in data[:8192]:
+            return None
+        text = data.decode("utf-8", "replace")
+        language = LANGUAGES.get(os.path.splitext(path)[1].lower(), "text")
+        base = {"project": self.project, "path": path, "blob": blob, "language": language, "timestamp": now}
+        chunks = [dict(base, **chunk) for chunk in chunk_file(path, text)]
+        file_document = dict(base, kind="file", name=path, lines=len(text.splitlines()), chunks=len(chunks))
+        if self.summarize:
+            file_document["summary"] = self._summarize_file(path, text)
+        return chunks, file_document
+
+    def _write(self, documents):
+        metrics = Metrics()
+        for start in range(0, len(documents), WRITE_BATCH):
+            batch = documents[start:start + WRITE_BATCH]
+            with metrics.timer("mclg_db_write_seconds", collection=self.collection.name, status="error") as labels:
+                self.collection.insert_many(batch, ordered=False)
+                labels["status"] = "ok"
+            metrics.increment("mclg_db_documents_total", len(batch), collection=self.collection.name)
+
+    def ingest(self, progress=None):
+        """
+        Bring the stored index of the repository up to date.
+
+        progress, if given, is called as progress(done, total) while changed
+        files are processed. Returns counts of indexed, changed, deleted,
+        unchanged and skipped files, or {"error": ...}.
+        """
+        if self.collection is None:
+            return {"error": "Database not connected"}
+        started = time.monotonic()
+        try:
+            root = resolve_source(self.source)
+            current = list_files(root)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print(f"Error reading repository {self.source}: {e}")
+            return {"error": f"Could not read repository: {e}"}
+
+        try:
+            indexed = self._indexed_files()
+            changed = sorted(path for path, blob in current.items() if indexed.get(path) != blob)
+            deleted = sorted(path for path in indexed if path not in current)
+            now = datetime.utcnow()
+
+            if deleted:
+                self.collection.delete_many({"project": self.project, "path": {"$in": deleted}})
+
+            skipped = chunk_count = 0
+            for done, path in enumerate(changed, start=1):
+                self.collection.delete_many({"project": self.project, "path": path})
+                documents = self._file_documents(root, path, current[path], now)
+                if documents is None:
+                    # Recorded anyway so the file is not read again until it changes
+                    skipped += 1
+                    documents = [], {"project": self.project, "path": path, "blob": current[path],
+                                     "kind": "file", "name": path, "skipped": True, "timestamp": now}
+                chunks, file_document = documents
+                # The file document goes last: it marks the file as fully indexed
+                self._write(chunks + [file_document])
+                chunk_count += len(chunks)
+                if progress is not None:
+                    progress(done, len(changed))
+
+            project = {
+                "project": self.project,
+                "kind": "project",
+                "name": self.project,
+                "source": self.source,
+                "commit": head_commit(root),
+                "files": len(current),
+                "timestamp": now
+            }
+            if self.summarize and (changed or deleted):
+                file_summaries = {
+                    document["path"]: document.get("summary")
+                    for document in self.collection.find(
+                        {"project": self.project, "kind": "file"}, {"path": 1, "summary": 1}
+                    )
+                }
+                project["summary"] = self._summarize_project(file_summaries)
+            # Without new summaries the previous project summary is left in place
+            self.collection.update_one({"project": self.project, "kind": "project"}, {"$set": project}, upsert=True)
+        except Exception as e:
+            print(f"Error ingesting repository {self.source}: {e}")
+            return {"error": str(e)}
+
+        return {
+            "project": self.project,
+            "commit": project["commit"],
+            "files": len(current),
+            "changed": len(changed) - skipped,
+            "deleted": len(deleted),
+            "unchanged": len(current) - len(changed),
+            "skipped": skipped,
+            "chunks": chunk_count,
+            "seconds": round(time.monotonic() - started, 3)
+        }
+
+def list_projects():
+    """The ingested projects, newest first."""
+    collection = DatabaseManager().get_collection(COLLECTIONS["projects"])
+    if collection is None:
+        return []
+    return list(collection.find({"kind": "project"}, {"_id": 0}).sort([("timestamp", -1)]))
@@ -0,0 +1,194 @@
+"""
+In-process job manager for long-running research and code generation.
+
+Jobs are submitted to a bounded worker pool and tracked by id, so a caller
+can return immediately and poll or stream the result. Submitting a job that
+is identical (same kind and parameters) to one still queued or running
+returns the existing job instead of starting a second model call. Text
+produced while a job runs is kept as events for streaming (SSE) clients.
+
+Jobs live in memory: finished jobs are kept for JOB_RETENTION_SECONDS (and
+at most JOB_MAX_RETAINED of them) for polling; results are stored in the
+database by the job handlers as usual.
+"""
+import json
+import time
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from app.config.settings import JOB_WORKERS, JOB_RETENTION_SECONDS, JOB_MAX_RETAINED
+
+class Job:
+    """One submitted job; events hold the streamed text deltas."""
+
+    def __init__(self, kind, params, key):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.events = []
+        self.subscribers = 1
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._changed = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ("succeeded", "failed")
+
+    def _update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self._changed.notify_all()
+
+    def add_event(self, text):
+        with self._changed:
+            self.events.append(text)
+            self._changed.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns whether it did."""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.done, timeout)
+
+    def stream(self, start=0, timeout=None):
+        """
+        Yield ("delta", text) for each event from position start, then ("done", status).
+
+        Stops with ("timeout", None) when nothing happens for timeout seconds.
+        """
+        position = start
+        while True:
+            with self._changed:
+                if not self._changed.wait_for(lambda: len(self.events) > position or self.done, timeout):
+                    yield "timeout", None
+                    return
+                events = self.events[position:]
+                done = self.done
+            for text in events:
+                yield "delta", text
+            position += len(events)
+            if done and position >= len(self.events):
+                yield "done", self.status
+                return
+
+    def to_dict(self, include_result=True):
+        data = {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "subscribers": self.subscribers,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+        if self.error is not None:
+            data["error"] = self.error
+        if include_result and self.result is not None:
+            data["result"] = self.result
+        return data
+
+def job_key(kind, params):
+    """Identity of a job for coalescing: its kind and canonical parameters."""
+    canonical = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()
+
+class JobManager:
+    """Worker pool with job tracking and coalescing of identical in-flight jobs."""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(JobManager, cls).__new__(cls)
+            cls._instance.initialize_manager()
+        return cls._instance
+
+    def initialize_manager(self, workers=JOB_WORKERS, retention=JOB_RETENTION_SECONDS, max_retained=JOB_MAX_RETAINED):
+        self.handlers = {}
+        self.retention = retention
+        self.max_retained = max_retained
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.workers = workers
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "coalesced": 0, "succeeded": 0, "failed": 0, "seconds": 0.0}
+
+    def register(self, kind, handler):
+        """
+        Register the function that runs jobs of a kind.
+
+        handler(params, on_delta) returns a result dict; a result with an
+        "error" key (or an exception) fails the job.
+        """
+        self.handlers[kind] = handler
+
+    def submit(self, kind, params):
+        """Queue a job, or return the identical job already in flight. Returns (job, coalesced)."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        key = job_key(kind, params)
+        with self._lock:
+            self.stats["submitted"] += 1
+            job = self._in_flight.get(key)
+            if job is not None:
+                job.subscribers += 1
+                self.stats["coalesced"] += 1
+                return job, True
+            self._purge()
+            job = Job(kind, params, key)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+        self.executor.submit(self._run, job)
+        return job, False
+
+    def _run(self, job):
+        job._update(status="running", started_at=time.time())
+        try:
+            result = self.handlers[job.kind](job.params, job.add_event)
+            error = result.get("error") if isinstance(result, dict) else None
+        except Exception as e:
+            print(f"Error running {job.kind} job {job.id}: {e}")
+            result, error = None, str(e)
+        with self._lock:
+            # New submissions start a fresh job from here on
+            self._in_flight.pop(job.key, None)
+            self.stats["failed" if error else "succeeded"] += 1
+            self.stats["seconds"] += time.time() - job.started_at
+        job._update(status="failed" if error else "succeeded", result=result, error=error, finished_at=time.time())
+
+    def _purge(self):
+        """Forget finished jobs past their retention; called with the lock held."""
+        cutoff = time.time() - self.retention
+        finished = [job for job in self._jobs.values() if job.done]
+        excess = len(finished) - self.max_retained
+        for job in finished:
+            if job.finished_at < cutoff or excess > 0:
+                del self._jobs[job.id]
+                excess -= 1
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            statuses = [job.status for job in self._jobs.values()]
+        finished = stats["succeeded"] + stats["failed"]
+        stats["average_seconds"] = round(stats.pop("seconds") / finished, 3) if finished else None
+        stats["queued"] = statuses.count("queued")
+        stats["running"] = statuses.count("running")
+        stats["retained"] = len(statuses)
+        stats["workers"] = self.workers
+        return stats
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,3 @@
+"""
+Streamlit pages. The core modules do not import Streamlit; only these do.
+"""
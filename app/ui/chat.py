@@ -0,0 +1,126 @@
+"""
+Streamlit page for the chat assistant.
+"""
+import streamlit as st
+from app.chat_integration import ChatAssistant
+from app.utils.chat_memory import ConversationMemory
+from app.utils.prompt_packer import describe_report
+from app.utils.ui_stream import StreamRenderer
+from app.ui.resources import list_conversations, list_chat_history, resolve_context
+from app.config.settings import UI_CACHE_TTL
+
+def _show_conversation(memory):
+    """Switch the page to the conversation of memory."""
+    st.session_state.chat_memory = memory
+    st.session_state.chat_prompt_report = None
+    st.session_state.chat_history_cursors = [None]
+
+def render_conversations_ui():
+    """Start a new conversation or restore a saved one."""
+    with st.expander("Conversations"):
+        if st.button("New Conversation"):
+            _show_conversation(ConversationMemory())
+            st.rerun()
+        conversations = list_conversations()
+        if not conversations:
+            return
+        labels = {
+            conversation["conversation_id"]: f"{conversation.get('title', 'Conversation')} "
+                                             f"({conversation.get('message_count', 0)} messages)"
+            for conversation in conversations
+        }
+        selected = st.selectbox("Saved conversations", list(labels), format_func=labels.get)
+        if st.button("Restore Conversation"):
+            memory = ConversationMemory.load(selected)
+            if memory is None:
+                st.error("Conversation not found")
+                return
+            _show_conversation(memory)
+            st.rerun()
+
+def render_history_ui(memory):
+    """The stored exchanges of the conversation, newest first, one page at a time."""
+    with st.expander("Full history"):
+        if not st.toggle("Load stored messages", key="chat_history_load"):
+            return
+        st.caption(f"Stored messages, refreshed every {UI_CACHE_TTL} seconds.")
+        cursors = st.session_state.chat_history_cursors
+        page = list_chat_history(memory.conversation_id, cursors[-1])
+        if not page["items"]:
+            st.info("No stored messages yet")
+            return
+        for item in page["items"]:
+            if item.get("timestamp"):
+                st.caption(f"{item['timestamp']:%Y-%m-%d %H:%M}")
+            st.write(f"🧑 **You**: {item.get('user_message', '')}")
+            st.write(f"🤖 **AI**: {item.get('ai_response', '')}")
+        col1, col2 = st.columns(2)
+        if len(cursors) > 1 and col1.button("Newer messages"):
+            cursors.pop()
+            st.rerun()
+        if page["next_cursor"] and col2.button("Older messages"):
+            cursors.append(page["next_cursor"])
+            st.rerun()
+
+def render_chat_ui():
+    """Render the chat UI in Streamlit."""
+    st.title("AI Chat Assistant")
+
+    # The conversation memory is the only chat state kept in the session; it holds
+    # the recent turns verbatim and a summary of older ones, so it stays small
+    if "chat_memory" not in st.session_state:
+        _show_conversation(ConversationMemory())
+    memory = st.session_state.chat_memory
+
+    render_conversations_ui()
+    render_history_ui(memory)
+
+    if memory.summary:
+        with st.expander("Earlier in this conversation (summarized)"):
+            st.write(memory.summary)
+
+    # Display the recent turns
+    for message in list(memory.messages):
+        if message["role"] == "user":
+            st.write(f"🧑 **You**: {message['content']}")
+        else:
+            st.write(f"🤖 **AI**: {message['content']}")
+
+    if st.session_state.get("chat_prompt_report"):
+        st.caption(st.session_state.chat_prompt_report)
+    if st.session_state.get("chat_error"):
+        st.error(st.session_state.pop("chat_error"))
+
+    # Context is a reference to a stored result, read when it is used
+    context = resolve_context(st.session_state.get("chat_context"))
+    if context:
+        st.info(f"Using context: {context[:100]}" + ("..." if len(context) > 100 else ""))
+
+    # Get user input
+    with st.form("chat_form", clear_on_submit=True):
+        user_message = st.text_input("Type your message:", key="chat_input")
+        submitted = st.form_submit_button("Send")
+
+    if submitted and user_message:
+        chat_assistant = ChatAssistant(memory)
+
+        # Show the pending exchange while the response streams in
+        st.write(f"🧑 **You**: {user_message}")
+        stream = StreamRenderer(st.empty())
+        stream("🤖 **AI**: ")
+
+        # Get AI response; on success the memory records the exchange
+        with st.spinner("AI is thinking..."):
+            response = chat_assistant.process_message(user_message, context, on_delta=stream)
+
+        if response.startswith("Error:"):
+            st.session_state.chat_error = response
+        if chat_assistant.last_prompt_report:
+            st.session_state.chat_prompt_report = describe_report(chat_assistant.last_prompt_report)
+
+        # Clear context after use
+        if context:
+            st.session_state.chat_context = None
+
+        # Force refresh
+        st.rerun()
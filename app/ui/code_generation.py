@@ -0,0 +1,130 @@
+"""
+Streamlit pages for code generation and project code search.
+"""
+import streamlit as st
+from app.code_generation import CodeGenerator, extract_code_block
+from app.ingestion import RepositoryIngester
+from app.utils.prompt_packer import describe_report
+from app.utils.ui_stream import StreamRenderer
+from app.ui.resources import get_code_search, list_project_names, result_reference
+
+def render_repository_ui():
+    """Index a local checkout or git URL into the project descriptions collection."""
+    with st.expander("Project Repository"):
+        source = st.text_input("Repository path or git URL", placeholder="/path/to/checkout or https://github.com/user/repo")
+        summarize = st.checkbox("Summarize changed files with AI", value=False)
+        if st.button("Index Repository"):
+            if not source:
+                st.error("Please provide a repository path or URL")
+                return
+            progress = st.progress(0.0)
+            result = RepositoryIngester(source, summarize=summarize).ingest(
+                progress=lambda done, total: progress.progress(done / total)
+            )
+            progress.empty()
+            list_project_names.clear()
+            if "error" in result:
+                st.error(result["error"])
+                return
+            st.success(
+                f"Indexed {result['project']}: {result['changed']} changed, {result['deleted']} deleted, "
+                f"{result['unchanged']} unchanged files ({result['chunks']} chunks) in {result['seconds']}s"
+            )
+
+def render_code_search_ui():
+    """Search the indexed repositories and browse the matching chunks."""
+    with st.expander("Search Project Code"):
+        projects = list_project_names()
+        if not projects:
+            st.info("Index a repository to search its code")
+            return
+        project = st.selectbox("Project", ["All projects"] + projects, key="code_search_project")
+        query = st.text_input("Search code", placeholder="Function names, identifiers or a description")
+        if not query:
+            return
+        results = get_code_search().search(query, k=10, project=None if project == "All projects" else project)
+        if not results:
+            st.info("No matching code found")
+        for result in results:
+            label = f"{result['project']}: {result['path']}:{result['start_line']}-{result['end_line']}"
+            if result.get("name"):
+                label += f" ({result['name']})"
+            st.markdown(f"**{label}** · score {result['score']}")
+            st.code(result["content"], language="python" if result["path"].endswith(".py") else None)
+
+def render_code_gen_ui():
+    """Render the code generation UI in Streamlit."""
+    st.title("AI Code Generation")
+
+    render_repository_ui()
+    render_code_search_ui()
+    
+    with st.form("code_gen_form"):
+        project_context = st.text_area(
+            "Project Context", 
+            placeholder="Describe your project needs and requirements",
+            height=150
+        )
+        
+        existing_code = st.text_area(
+            "Existing Code (optional)", 
+            placeholder="Paste any existing code here that the AI should build upon",
+            height=200
+        )
+        
+        task = st.text_area(
+            "Development Task", 
+            placeholder="Describe the specific coding task you need help with",
+            height=150
+        )
+        
+        retrieval_options = ["None", "All projects"] + list_project_names()
+        retrieval = st.selectbox("Include relevant code from", retrieval_options)
+        
+        refresh = st.checkbox("Ignore cached results", value=False)
+        
+        submitted = st.form_submit_button("Generate Code")
+    
+    if submitted:
+        if not project_context or not task:
+            st.error("Please provide both project context and task description")
+            return
+            
+        with st.spinner("Generating code... This may take a moment."):
+            # One generator per request: it holds the request's prompt report and record id
+            code_gen = CodeGenerator()
+            stream = StreamRenderer(st.empty())
+            generated_code = code_gen.generate_code(
+                project_context=project_context,
+                existing_code=existing_code,
+                task=task,
+                on_delta=stream,
+                use_cache=not refresh,
+                retrieve=retrieval != "None",
+                project=None if retrieval in ("None", "All projects") else retrieval
+            )
+            stream.clear()
+            
+            if generated_code.startswith("Error:"):
+                st.error(generated_code)
+            else:
+                st.success("Code generation completed!")
+                if code_gen.last_prompt_report:
+                    st.caption(describe_report(code_gen.last_prompt_report))
+
+                # Extract code from markdown code blocks
+                generated_code = extract_code_block(generated_code)
+
+                # Display the generated code
+                st.code(generated_code, language="python")
+                
+                # The session keeps a reference to the stored code for the chat, not the code
+                st.session_state.code_reference = result_reference(
+                    "code", code_gen.last_record_id, "generated_code", "Generated code", generated_code, limit=None
+                )
+    
+    # Outside the form handling, so the button still works on the rerun its click causes
+    if st.session_state.get("code_reference") and st.button("Discuss with AI Assistant"):
+        st.session_state.chat_context = st.session_state.code_reference
+        st.session_state.nav_option = "Chat Assistant"
+        st.rerun()
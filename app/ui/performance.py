@@ -0,0 +1,76 @@
+"""
+Streamlit page showing where time and money go in this process.
+"""
+import streamlit as st
+from app.utils.metrics import Metrics, completion_rows
+from app.utils.http_fetcher import PageFetcher
+from app.ui.resources import get_perplexity, get_database
+
+def _milliseconds(value):
+    return None if value is None else round(value * 1000, 1)
+
+def _timing_rows(snapshot, name, label):
+    return [
+        {label: "/".join(item["labels"].values()) or "all", "count": item["count"],
+         "p50_ms": _milliseconds(item["p50"]), "p95_ms": _milliseconds(item["p95"]),
+         "p99_ms": _milliseconds(item["p99"]), "total_s": round(item["sum"], 2)}
+        for item in snapshot["series"] if item["name"] == name
+    ]
+
+def render_performance_ui():
+    """Render latency, token and cost metrics collected since the server started."""
+    st.title("Performance")
+    st.caption("Metrics of this server process since it started; latency percentiles cover the most recent calls.")
+    if st.button("Refresh"):
+        st.rerun()
+
+    metrics = Metrics()
+    if not metrics.enabled:
+        st.warning("Metrics are disabled (METRICS_ENABLED=false)")
+        return
+    snapshot = metrics.snapshot()
+
+    st.subheader("AI completions")
+    completions = completion_rows(snapshot)
+    if completions:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Calls", sum(row["calls"] for row in completions))
+        col2.metric("Tokens", sum(row["prompt_tokens"] + row["completion_tokens"] for row in completions))
+        col3.metric("Estimated cost", f"${sum(row['cost_usd'] for row in completions):.4f}")
+        for row in completions:
+            for field in ("p50_s", "p95_s", "p99_s", "ttft_p50_s"):
+                if row[field] is not None:
+                    row[field] = round(row[field], 2)
+            row["cost_usd"] = round(row["cost_usd"], 4)
+        st.dataframe(completions, use_container_width=True)
+    else:
+        st.info("No completions yet")
+
+    for title, name, label in (("Page fetches", "mclg_fetch_seconds", "outcome"),
+                               ("HTML extraction", "mclg_parse_seconds", "engine"),
+                               ("Database writes", "mclg_db_write_seconds", "collection/status")):
+        rows = _timing_rows(snapshot, name, label)
+        if rows:
+            st.subheader(title)
+            st.dataframe(rows, use_container_width=True)
+
+    routing = get_perplexity().get_routing_stats()
+    if routing["decisions"]:
+        st.subheader("Model routing")
+        st.dataframe([
+            {"model": model, **stats} for model, stats in routing["models"].items()
+        ], use_container_width=True)
+        st.dataframe([
+            {"purpose": item["purpose"], "model": item["model"], "reason": item["reason"],
+             "skipped": "; ".join(f"{model}: {why}" for model, why in item["skipped"].items())}
+            for item in routing["decisions"]
+        ], use_container_width=True)
+
+    with st.expander("Rate limits, fetch cache and write queue"):
+        st.json({
+            "rate_limits": get_perplexity().get_rate_limit_stats(),
+            "fetcher": PageFetcher().get_stats(),
+            "writes": get_database().get_write_stats()
+        })
+    with st.expander("Prometheus export"):
+        st.code(metrics.render_prometheus(), language="text")
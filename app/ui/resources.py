@@ -0,0 +1,98 @@
+"""
+Shared objects and cached database reads for the Streamlit pages.
+
+Streamlit reruns the script on every interaction. Clients and long-lived
+helpers are created once per server process (st.cache_resource), and
+listings and documents are read through st.cache_data for UI_CACHE_TTL
+seconds, so a rerun neither reconnects nor repeats queries. Session state
+keeps ids and cursors only; documents are fetched through these caches.
+"""
+import streamlit as st
+from app.utils import queries
+from app.config.settings import UI_CACHE_TTL, UI_CACHE_MAX_ENTRIES, UI_CHAT_CONTEXT_CHARS
+
+_cache_data = st.cache_data(ttl=UI_CACHE_TTL, max_entries=UI_CACHE_MAX_ENTRIES, show_spinner=False)
+
+@st.cache_resource
+def get_perplexity():
+    from app.utils.api_client import PerplexityClient
+    return PerplexityClient()
+
+@st.cache_resource
+def get_database():
+    from app.utils.db_connection import DatabaseManager
+    return DatabaseManager()
+
+@st.cache_resource
+def get_web_scraper():
+    """The scraper shared by all sessions (it is thread-safe; its dedup index is opened once)."""
+    from app.web_scraping import WebScraper
+    return WebScraper()
+
+@st.cache_resource
+def get_code_search():
+    from app.utils.code_search import CodeSearch
+    return CodeSearch()
+
+@_cache_data
+def list_research(cursor=None):
+    return queries.list_research(cursor=cursor)
+
+@_cache_data
+def search_research(text):
+    return queries.search_research(text)
+
+@_cache_data
+def list_conversations(limit=20):
+    return queries.list_conversations(limit=limit)["items"]
+
+@_cache_data
+def list_chat_history(conversation_id, cursor=None):
+    return queries.list_chat_history(
+        cursor=cursor, conversation_id=conversation_id, fields=["user_message", "ai_response", "timestamp"]
+    )
+
+@_cache_data
+def list_project_names():
+    from app.ingestion import list_projects
+    return [project["project"] for project in list_projects()]
+
+@_cache_data
+def _cached_document(collection_key, document_id, fields):
+    return queries.get_document(collection_key, document_id, fields=list(fields) if fields else None)
+
+def get_document(collection_key, document_id, fields=None):
+    """
+    A stored document by id through the cache.
+
+    Results are written in the background, so a document asked for right
+    after it was produced may not be stored yet; misses are read again
+    instead of being served from the cache.
+    """
+    fields = tuple(fields) if fields else None
+    document = _cached_document(collection_key, document_id, fields)
+    if document is None:
+        document = queries.get_document(collection_key, document_id, fields=list(fields) if fields else None)
+    return document
+
+def result_reference(collection_key, document_id, field, label, text=None, limit=UI_CHAT_CONTEXT_CHARS):
+    """
+    What the session keeps to point at a result for the chat: its id, or
+    without a database (no id) the text itself. limit caps the characters
+    used as context (None for all).
+    """
+    if document_id:
+        return {"collection": collection_key, "id": str(document_id), "field": field, "label": label, "limit": limit}
+    return {"label": label, "text": (text or "")[:limit], "limit": limit}
+
+def resolve_context(reference):
+    """The chat context text for a result reference, or None if it cannot be found."""
+    if not reference:
+        return None
+    text = reference.get("text")
+    if text is None:
+        document = get_document(reference["collection"], reference["id"], [reference["field"]])
+        text = (document or {}).get(reference["field"])
+        if text is None:
+            return None
+    return f"{reference['label']}: {text[:reference['limit']]}"
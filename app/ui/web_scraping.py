@@ -0,0 +1,185 @@
+"""
+Streamlit pages for web research.
+"""
+import streamlit as st
+from app.utils.ui_stream import StreamRenderer
+from app.ui.resources import get_web_scraper, list_research, search_research, get_document, result_reference
+from app.config.settings import SCRAPER_BATCH_CONCURRENCY, CRAWL_TOP_K
+
+def render_batch_scraping_ui():
+    """Render the multi-URL research form, showing results as they complete."""
+    urls_text = st.text_area(
+        "URLs to research (one per line)",
+        placeholder="https://www.iraqoilreport.com/?s=\nhttps://socialistchina.org/",
+        height=150
+    )
+    concurrency = st.slider("Parallel research jobs", 1, 16, SCRAPER_BATCH_CONCURRENCY)
+    refresh = st.checkbox("Ignore cached research", value=False, key="batch_refresh")
+    
+    if st.button("Research All"):
+        urls = list(dict.fromkeys(line.strip() for line in urls_text.splitlines() if line.strip()))
+        if not urls:
+            st.error("Please enter at least one URL")
+            return
+        
+        scraper = get_web_scraper()
+        progress = st.progress(0.0, text=f"Researching {len(urls)} websites...")
+        for done, result in enumerate(scraper.scrape_many(urls, concurrency, use_cache=not refresh), start=1):
+            progress.progress(done / len(urls), text=f"{done} of {len(urls)} websites researched")
+            if "error" in result:
+                st.error(f"{result['url']}: {result['error']}")
+                continue
+            with st.expander(f"{result['title']} ({result['url']})"):
+                st.markdown(result['ai_research'])
+        list_research.clear()
+        st.success("Batch research completed!")
+
+def render_crawl_ui():
+    """Render the article discovery form: crawl seed pages, then research the best links."""
+    seeds_text = st.text_area(
+        "Seed pages (one per line)",
+        placeholder="https://www.iraqoilreport.com/?s=\nhttps://socialistchina.org/",
+        height=100
+    )
+    keywords = st.text_input("Keywords", placeholder="oil exports kurdistan")
+    top_k = st.slider("Articles to research", 1, 20, CRAWL_TOP_K)
+    
+    if st.button("Find and Research Articles"):
+        seeds = [line.strip() for line in seeds_text.splitlines() if line.strip()]
+        if not seeds:
+            st.error("Please enter at least one seed page")
+            return
+        
+        scraper = get_web_scraper()
+        with st.spinner("Crawling seed pages for relevant articles..."):
+            articles, results = scraper.crawl_and_research(seeds, keywords.split(), top_k=top_k)
+        
+        if not articles:
+            st.warning("No candidate articles found on the seed pages")
+            return
+        
+        with st.expander("Selected articles", expanded=True):
+            for article in articles:
+                st.write(f"{article['score']:.2f} · [{article.get('title') or article['url']}]({article['url']})")
+        
+        with st.spinner(f"Researching the top {len(articles)} articles..."):
+            for result in results:
+                if "error" in result:
+                    st.error(f"{result['url']}: {result['error']}")
+                    continue
+                with st.expander(f"{result['title']} ({result['url']})"):
+                    st.markdown(result['ai_research'])
+
+def render_history_ui():
+    """Browse stored research: one page of summaries at a time, full reports only when opened."""
+    query = st.text_input("Search stored research", placeholder="pipeline exports")
+    
+    # The session keeps only the cursors of the pages visited; the pages come from the cache
+    cursors = st.session_state.setdefault("research_cursors", [None])
+    if query.strip():
+        items, next_cursor = search_research(query), None
+    else:
+        page = list_research(cursors[-1])
+        items, next_cursor = page["items"], page["next_cursor"]
+    
+    if not items:
+        st.info("No stored research found")
+        return
+    
+    for item in items:
+        label = f"{item.get('title') or item['url']} · {item['timestamp']:%Y-%m-%d %H:%M}" if item.get('timestamp') else item['url']
+        with st.expander(label):
+            st.write(item['url'])
+            if item.get('meta_description'):
+                st.caption(item['meta_description'])
+            if st.button("Show report", key=f"report_{item['id']}"):
+                document = get_document("scraping", item['id'], fields=["ai_research", "citations"])
+                if document:
+                    st.markdown(document.get('ai_research', ''))
+    
+    col1, col2 = st.columns(2)
+    if len(cursors) > 1 and col1.button("Newer"):
+        cursors.pop()
+        st.rerun()
+    if next_cursor and col2.button("Older"):
+        cursors.append(next_cursor)
+        st.rerun()
+
+def render_scraping_ui():
+    """Render the web scraping UI in Streamlit."""
+    st.title("AI Web Research")
+    
+    mode = st.radio("Mode", ["Single URL", "Batch", "Discover Articles", "History"], horizontal=True)
+    if mode == "Batch":
+        render_batch_scraping_ui()
+        return
+    if mode == "Discover Articles":
+        render_crawl_ui()
+        return
+    if mode == "History":
+        render_history_ui()
+        return
+    
+    url = st.text_input("Enter URL to research", placeholder="https://example.com")
+    refresh = st.checkbox("Ignore cached research", value=False)
+    depth = st.radio(
+        "Research depth", ["Automatic", "quick", "deep"], horizontal=True,
+        help="Automatic skips deep research for short pages and busy models"
+    )
+    
+    if st.button("Research Website"):
+        if not url:
+            st.error("Please enter a URL")
+            return
+            
+        with st.spinner("Researching website content... This may take a minute."):
+            scraper = get_web_scraper()
+            stream = StreamRenderer(st.empty())
+            routing = {"depth": depth} if depth != "Automatic" else None
+            result = scraper.scrape_website(url, on_delta=stream, use_cache=not refresh, routing=routing)
+            stream.clear()
+            
+            if "error" in result:
+                st.error(f"Error: {result['error']}")
+            else:
+                st.success("Research completed!")
+                if "duplicate_of" in result:
+                    st.info(f"This page duplicates {result['duplicate_of']}; its stored research was reused.")
+                
+                # Display basic metadata
+                st.subheader(f"Research Results: {result['title']}")
+                if result.get('route_reason'):
+                    st.caption(f"Model: {result['model']} ({result['route_reason']})")
+                
+                # Display AI research
+                st.markdown(result['ai_research'])
+                
+                # Display citations if available
+                if result['citations']:
+                    with st.expander("Citations"):
+                        for citation in result['citations']:
+                            st.write(f"[{citation['number']}] {citation['details']}")
+                
+                # Display extracted links
+                with st.expander("Extracted Links"):
+                    for link in result['links']:
+                        st.write(f"[{link['text']}]({link['url']})")
+                
+                # Token usage information
+                with st.expander("API Usage Information"):
+                    st.write(f"Model used: {result['model']}")
+                    st.write(f"Token usage: {result['token_usage']}")
+                    if result['cached']:
+                        st.write("Served from the completion cache")
+                
+                # The session keeps a reference to the report for the chat, not the report
+                st.session_state.research_reference = result_reference(
+                    "scraping", result.get('_id'), "ai_research", "Web research content", result['ai_research']
+                )
+                list_research.clear()
+    
+    # Outside the research block, so the button still works on the rerun its click causes
+    if st.session_state.get("research_reference") and st.button("Discuss with AI Assistant"):
+        st.session_state.chat_context = st.session_state.research_reference
+        st.session_state.nav_option = "Chat Assistant"
+        st.rerun()
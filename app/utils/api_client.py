@@ -1,72 +1,491 @@
 """
 Perplexity API client utility for MCLG-WS project.
 """
-import os
-from openai import OpenAI
-from app.config.settings import PERPLEXITY_API_KEY, PERPLEXITY_BASE_URL, PERPLEXITY_MODELS
+import time
+import asyncio
+import weakref
+import threading
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+from app.utils.completion_cache import build_completion_cache, make_cache_key
+from app.utils.health import HealthProbe
+from app.utils.metrics import CompletionTimer
+from app.utils.single_flight import SingleFlight
+from app.utils.model_router import ModelRouter
+from app.utils.rate_limiter import (
+    RateLimiter,
+    backoff_delay,
+    estimate_request_tokens,
+    is_retryable,
+    is_timeout,
+    retry_after_from
+)
+from app.config.settings import (
+    PERPLEXITY_API_KEY,
+    PERPLEXITY_BASE_URL,
+    PERPLEXITY_MODELS,
+    PERPLEXITY_MAX_CONNECTIONS,
+    PERPLEXITY_MAX_KEEPALIVE,
+    PERPLEXITY_TIMEOUT,
+    PERPLEXITY_MODEL_CONCURRENCY,
+    PERPLEXITY_DEFAULT_CONCURRENCY,
+    PERPLEXITY_MAX_RETRIES,
+    HEALTH_CHECK_INTERVAL,
+    SINGLE_FLIGHT_ENABLED,
+    SINGLE_FLIGHT_MAX_TEMPERATURE
+)
 
 class PerplexityClient:
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(PerplexityClient, cls).__new__(cls)
             cls._instance.initialize_client()
         return cls._instance
-    
+
     def initialize_client(self):
         """Initialize the Perplexity API client using OpenAI's compatible client."""
-        try:
-            if not PERPLEXITY_API_KEY:
-                raise ValueError("Perplexity API key is not set in environment variables")
-            
-            # Create OpenAI client configured for Perplexity
-            self.client = OpenAI(
-                api_key=PERPLEXITY_API_KEY,
-                base_url=PERPLEXITY_BASE_URL
-            )
-            
-            # Test connection by listing models
-            self.client.models.list()
-            print("Successfully connected to Perplexity API")
-            
-            # Store model configurations
-            self.models = PERPLEXITY_MODELS
-            
-        except Exception as e:
-            print(f"Error initializing Perplexity API client: {e}")
-            self.client = None
-    
+        # Async clients and semaphores are bound to the event loop they were created on
+        self._async_states = weakref.WeakKeyDictionary()
+
+        # Store model configurations
+        self.models = PERPLEXITY_MODELS
+
+        # Completion cache shared by all callers (None when disabled)
+        self.cache = build_completion_cache()
+
+        # Client-side throttling shared by sync and async calls
+        self.rate_limiter = RateLimiter()
+
+        # Chooses a model per request from each purpose's route
+        self.router = ModelRouter(rate_limiter=self.rate_limiter)
+
+        # Identical concurrent requests share one call (None when disabled)
+        self.single_flight = SingleFlight() if SINGLE_FLIGHT_ENABLED else None
+
+        # The HTTP client is created on first use and checked in the background,
+        # so building the singleton never waits on the network
+        self.client = None
+        self._client_lock = threading.Lock()
+        self.health = HealthProbe("perplexity", self._probe, HEALTH_CHECK_INTERVAL)
+
+    def _probe(self):
+        """Health check run by the background probe."""
+        self.get_client().models.list()
+        return "Connected"
+
+    def get_health(self):
+        """Return the last known API status without blocking."""
+        return self.health.status()
+
+    def _connection_limits(self):
+        """Connection pool limits shared by the sync and async transports."""
+        return httpx.Limits(
+            max_connections=PERPLEXITY_MAX_CONNECTIONS,
+            max_keepalive_connections=PERPLEXITY_MAX_KEEPALIVE
+        )
+
     def get_client(self):
-        """Return the OpenAI client configured for Perplexity API."""
-        if not self.client:
-            raise ConnectionError("Perplexity API client not initialized")
+        """Return the OpenAI client configured for Perplexity API, creating it on first use."""
+        if self.client is None:
+            if not PERPLEXITY_API_KEY:
+                raise ConnectionError("Perplexity API key is not set in environment variables")
+            with self._client_lock:
+                if self.client is None:
+                    # Create OpenAI client configured for Perplexity on a pooled HTTP transport
+                    self.client = OpenAI(
+                        api_key=PERPLEXITY_API_KEY,
+                        base_url=PERPLEXITY_BASE_URL,
+                        timeout=PERPLEXITY_TIMEOUT,
+                        max_retries=0,  # Retries are scheduled by _create
+                        http_client=DefaultHttpxClient(limits=self._connection_limits())
+                    )
         return self.client
-    
-    def get_model(self, purpose):
-        """Get the appropriate model name for the given purpose."""
+
+    def get_model(self, purpose, **features):
+        """
+        Get the appropriate model name for the given purpose.
+
+        Without task features this is the configured model; with them (see
+        ModelRouter.route) the router picks the model for one request.
+        """
         if purpose not in self.models:
             raise ValueError(f"Unknown purpose: {purpose}")
-        return self.models[purpose]
-    
-    def generate_completion(self, model, messages, temperature=0.7, max_tokens=2000):
-        """Generate a chat completion using Perplexity API."""
+        if not features:
+            return self.models[purpose]
+        return self.route(purpose, **features)["model"]
+
+    def route(self, purpose, **features):
+        """The routing decision for one request; pass it to generate_completion as route."""
+        return self.router.route(purpose, **features)
+
+    def get_routing_stats(self):
+        """Model load, latency estimates and recent routing decisions."""
+        return self.router.get_stats()
+
+    def _fallback(self, route, model):
+        """The decision to retry a request on after model timed out, or None."""
+        if route["reason"] == "override":
+            return None
+        features = dict(route["features"], exclude=tuple(route["features"]["exclude"]) + (model,))
+        fallback = self.router.route(route["purpose"], **features)
+        return None if fallback["model"] in features["exclude"] else fallback
+
+    def _format_response(self, response):
+        """Convert a chat completion into the dictionary returned to callers."""
+        result = {
+            "content": response.choices[0].message.content,
+            "model": response.model,
+            "usage": self._format_usage(response.usage)
+        }
+        result.update(self._format_sources(response))
+        return result
+
+    def _format_sources(self, response):
+        """Structured citations and search_results Perplexity returns alongside the text."""
+        sources = {}
+        for field in ("citations", "search_results"):
+            value = getattr(response, field, None)
+            if isinstance(value, list) and value:
+                sources[field] = list(value)
+        return sources
+
+    def _format_usage(self, usage):
+        """Convert a usage object into a plain dictionary."""
+        if usage is None:
+            return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        return {
+            "prompt_tokens": usage.prompt_tokens,
+            "completion_tokens": usage.completion_tokens,
+            "total_tokens": usage.total_tokens
+        }
+
+    def _purpose_for(self, model, purpose=None):
+        """Resolve the purpose a request belongs to, defaulting to the model's."""
+        if purpose:
+            return purpose
+        for name, configured_model in self.models.items():
+            if configured_model == model:
+                return name
+        return None
+
+    def generate_completion(self, model, messages, temperature=0.7, max_tokens=2000,
+                            on_delta=None, purpose=None, use_cache=True, route=None):
+        """
+        Generate a chat completion using Perplexity API.
+
+        If on_delta is given the response is streamed and on_delta is called
+        with each text fragment as it arrives; the return value is the same.
+        Results are served from and stored in the completion cache according to
+        the TTL of the request's purpose; use_cache=False forces a fresh call.
+        Latency, time to first token, tokens and cost are recorded in Metrics.
+
+        Identical low-temperature requests made while one is in flight wait
+        for it and share its result (marked coalesced=True), within this
+        process and, through the completion cache, across processes.
+
+        route is the routing decision model came from: if the call times out
+        before streaming anything, it is retried on the next model the router
+        picks (not on the same model), and the result's model field names the
+        model that answered.
+        """
+        purpose = self._purpose_for(model, purpose)
+        timer = CompletionTimer(model, purpose)
+        callback = on_delta
+        on_delta = timer.wrap(on_delta)
+        key = make_cache_key(model, messages, temperature, max_tokens)
+        if self.cache is not None:
+            cached = self.cache.get(key, purpose, bypass=not use_cache)
+            if cached is not None:
+                if on_delta is not None:
+                    on_delta(cached["content"])
+                return timer.finish(dict(cached, cached=True), cached=True)
+
+        # A routed request moves on to a fallback model rather than waiting out more timeouts
+        retry_timeouts = route is None or route["reason"] == "override"
+
+        def call(on_delta):
+            with self.router.track(model) as outcome:
+                result = outcome["result"] = self._complete(
+                    model, messages, temperature, max_tokens, on_delta, retry_timeouts=retry_timeouts
+                )
+            # Stored before the single-flight lock is released, so waiting processes find it
+            if self.cache is not None:
+                self.cache.set(key, result, purpose)
+            return result
+
+        def recheck():
+            # A forced refresh must not pick up an older cached answer
+            return self.cache.get(key, purpose) if self.cache is not None and use_cache else None
+
+        if self.single_flight is None or temperature > SINGLE_FLIGHT_MAX_TEMPERATURE:
+            result, shared = call(on_delta), False
+        else:
+            result, shared = self.single_flight.run(key, call, on_delta, recheck)
+        if shared:
+            # Another caller paid for this call: recorded like a cache hit
+            return timer.finish(dict(result, coalesced=True), cached=True)
+
+        if route is not None and result.get("timed_out") and timer.first_token is None:
+            fallback = self._fallback(route, model)
+            if fallback is not None:
+                timer.finish(result)
+                print(f"{model} timed out; retrying with {fallback['model']}")
+                return self.generate_completion(fallback["model"], messages, temperature, max_tokens,
+                                                callback, purpose, use_cache, fallback)
+        return timer.finish(result)
+
+    def _complete(self, model, messages, temperature, max_tokens, on_delta=None, retry_timeouts=True):
+        """Call the API for a completion, streaming it when on_delta is given."""
+        if on_delta is not None:
+            final = {}
+            for event in self.stream_completion(model, messages, temperature, max_tokens, retry_timeouts):
+                if "delta" in event:
+                    on_delta(event["delta"])
+                else:
+                    final = event
+            return final
+
         try:
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=max_tokens
+            response, headers, reserved = self._create(
+                model, messages, temperature, max_tokens, retry_timeouts=retry_timeouts
             )
-            return {
-                "content": response.choices[0].message.content,
-                "model": response.model,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
+            result = self._format_response(response)
+            self.rate_limiter.record_success(model, reserved, result["usage"]["total_tokens"], headers)
+            return result
+        except Exception as e:
+            print(f"Error generating completion: {e}")
+            return self._error(e)
+
+    def _error(self, error):
+        """The error result for a failed call, flagging timeouts for routing fallbacks."""
+        result = {"error": str(error)}
+        if is_timeout(error):
+            result["timed_out"] = True
+        return result
+
+    def _create(self, model, messages, temperature, max_tokens, stream=False, retry_timeouts=True):
+        """
+        Send a completion request through the rate limiter.
+
+        Rate-limited, timed out and 5xx requests are retried with jittered
+        exponential backoff; the tokens reserved for a failed attempt are
+        returned to the limiter before the next one. With
+        retry_timeouts=False a timeout is raised at once, so routed requests
+        can fall back to another model. Returns the parsed response, the response headers
+        and the number of tokens reserved for the request.
+        """
+        reserved = estimate_request_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire(model, reserved)
+            try:
+                raw = self.get_client().chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=stream
+                )
+                return raw.parse(), raw.headers, reserved
+            except Exception as e:
+                self.rate_limiter.record_failure(model, reserved)
+                if not is_retryable(e) or attempt >= PERPLEXITY_MAX_RETRIES or (is_timeout(e) and not retry_timeouts):
+                    raise
+                delay = self._schedule_retry(model, e, attempt)
+            time.sleep(delay)
+            attempt += 1
+
+    def _schedule_retry(self, model, error, attempt):
+        """Record a failed attempt with the rate limiter and return the backoff delay."""
+        retry_after = retry_after_from(error)
+        if getattr(error, "status_code", None) == 429:
+            headers = getattr(getattr(error, "response", None), "headers", None)
+            self.rate_limiter.record_throttle(model, retry_after, headers)
+        self.rate_limiter.record_retry(model)
+        delay = backoff_delay(attempt, retry_after)
+        print(f"Retrying {model} request in {delay:.1f}s after error: {error}")
+        return delay
+
+    def get_rate_limit_stats(self):
+        """Queue depth, wait-time and throttling metrics per model."""
+        return self.rate_limiter.get_stats()
+
+    def stream_completion(self, model, messages, temperature=0.7, max_tokens=2000, retry_timeouts=True):
+        """
+        Stream a chat completion using Perplexity API.
+
+        Yields {"delta": text} for each fragment, then one final record shaped
+        like the generate_completion result ({"content", "model", "usage"} or
+        {"error"}). retry_timeouts is passed to _create.
+        """
+        parts = []
+        response_model = model
+        usage = None
+        sources = {}
+        try:
+            stream, headers, reserved = self._create(
+                model, messages, temperature, max_tokens, stream=True, retry_timeouts=retry_timeouts
+            )
+            for chunk in stream:
+                response_model = chunk.model or response_model
+                # Perplexity reports cumulative usage and sources on the chunks; keep the latest
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                sources.update(self._format_sources(chunk))
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield {"delta": delta}
+        except Exception as e:
+            print(f"Error streaming completion: {e}")
+            yield self._error(e)
+            return
+
+        usage = self._format_usage(usage)
+        self.rate_limiter.record_success(model, reserved, usage["total_tokens"] or None, headers)
+        yield dict({
+            "content": "".join(parts),
+            "model": response_model,
+            "usage": usage
+        }, **sources)
+
+    def _async_state(self):
+        """Return the async client and per-model semaphores for the running event loop."""
+        loop = asyncio.get_running_loop()
+        state = self._async_states.get(loop)
+        if state is None:
+            if not PERPLEXITY_API_KEY:
+                raise ConnectionError("Perplexity API client not initialized")
+            state = {
+                "client": AsyncOpenAI(
+                    api_key=PERPLEXITY_API_KEY,
+                    base_url=PERPLEXITY_BASE_URL,
+                    timeout=PERPLEXITY_TIMEOUT,
+                    max_retries=0,
+                    http_client=DefaultAsyncHttpxClient(limits=self._connection_limits())
+                ),
+                "semaphores": {}
             }
+            self._async_states[loop] = state
+        return state
+
+    def _model_semaphore(self, state, model):
+        """Get the semaphore limiting concurrent requests to a model."""
+        semaphore = state["semaphores"].get(model)
+        if semaphore is None:
+            limit = PERPLEXITY_MODEL_CONCURRENCY.get(model, PERPLEXITY_DEFAULT_CONCURRENCY)
+            semaphore = asyncio.Semaphore(limit)
+            state["semaphores"][model] = semaphore
+        return semaphore
+
+    async def agenerate_completion(self, model, messages, temperature=0.7, max_tokens=2000,
+                                   purpose=None, use_cache=True):
+        """Generate a chat completion without blocking the event loop."""
+        purpose = self._purpose_for(model, purpose)
+        timer = CompletionTimer(model, purpose)
+        if self.cache is None:
+            return timer.finish(await self._acomplete(model, messages, temperature, max_tokens))
+
+        key = make_cache_key(model, messages, temperature, max_tokens)
+        cached = await asyncio.to_thread(self.cache.get, key, purpose, not use_cache)
+        if cached is not None:
+            return timer.finish(dict(cached, cached=True), cached=True)
+
+        result = await self._acomplete(model, messages, temperature, max_tokens)
+        await asyncio.to_thread(self.cache.set, key, result, purpose)
+        return timer.finish(result)
+
+    async def _acomplete(self, model, messages, temperature, max_tokens):
+        """Call the API for a completion on the running event loop."""
+        try:
+            state = self._async_state()
+            async with self._model_semaphore(state, model):
+                response, headers, reserved = await self._acreate(
+                    state, model, messages, temperature, max_tokens
+                )
+            result = self._format_response(response)
+            self.rate_limiter.record_success(model, reserved, result["usage"]["total_tokens"], headers)
+            return result
         except Exception as e:
             print(f"Error generating completion: {e}")
             return {"error": str(e)}
+
+    async def _acreate(self, state, model, messages, temperature, max_tokens, stream=False):
+        """Async counterpart of _create."""
+        reserved = estimate_request_tokens(messages, max_tokens)
+        attempt = 0
+        while True:
+            await self.rate_limiter.aacquire(model, reserved)
+            try:
+                raw = await state["client"].chat.completions.with_raw_response.create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=stream
+                )
+                return raw.parse(), raw.headers, reserved
+            except Exception as e:
+                self.rate_limiter.record_failure(model, reserved)
+                if not is_retryable(e) or attempt >= PERPLEXITY_MAX_RETRIES:
+                    raise
+                delay = self._schedule_retry(model, e, attempt)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def astream_completion(self, model, messages, temperature=0.7, max_tokens=2000):
+        """Async counterpart of stream_completion yielding the same events."""
+        parts = []
+        response_model = model
+        usage = None
+        sources = {}
+        try:
+            state = self._async_state()
+            async with self._model_semaphore(state, model):
+                stream, headers, reserved = await self._acreate(
+                    state, model, messages, temperature, max_tokens, stream=True
+                )
+                async for chunk in stream:
+                    response_model = chunk.model or response_model
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk.usage
+                    sources.update(self._format_sources(chunk))
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield {"delta": delta}
+        except Exception as e:
+            print(f"Error streaming completion: {e}")
+            yield {"error": str(e)}
+            return
+
+        usage = self._format_usage(usage)
+        self.rate_limiter.record_success(model, reserved, usage["total_tokens"] or None, headers)
+        yield dict({
+            "content": "".join(parts),
+            "model": response_model,
+            "usage": usage
+        }, **sources)
+
+    async def gather_completions(self, batch):
+        """
+        Run many completions concurrently.
+
+        Each item in batch is a dict of agenerate_completion keyword arguments.
+        Results are returned in the same order as the batch.
+        """
+        return await asyncio.gather(
+            *(self.agenerate_completion(**request) for request in batch)
+        )
+
+    async def aclose(self):
+        """Close the async transport bound to the running event loop."""
+        state = self._async_states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state["client"].close()
@@ -0,0 +1,166 @@
+"""
+Conversation memory with a running summary for the chat assistant.
+
+The most recent exchanges are kept verbatim; once enough older exchanges
+pile up they are folded into a running summary on a background thread,
+after the response has been delivered, so summarizing never delays an
+answer. The prompt is the system message (with the summary) plus the recent
+exchanges, which keeps its size constant however long the conversation runs.
+
+A conversation is saved as one "conversation" document in the chat history
+collection and can be restored from it by its conversation_id.
+"""
+import uuid
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from app.utils.api_client import PerplexityClient
+from app.utils.db_connection import DatabaseManager
+from app.config.settings import (
+    COLLECTIONS,
+    CHAT_MEMORY_RECENT_TURNS,
+    CHAT_MEMORY_COMPACT_TURNS,
+    CHAT_SUMMARY_MAX_TOKENS
+)
+
+DEFAULT_SYSTEM_PROMPT = "You are a helpful AI assistant for the MCLG-WS system, which helps with code generation and web research."
+
+SUMMARY_PROMPT = (
+    "You maintain the memory of a conversation between a user and an AI assistant. "
+    "Merge the new messages into the existing summary. Keep facts, decisions, names, code "
+    "identifiers and open questions; drop pleasantries. Answer with the updated summary only."
+)
+
+# Summaries run off the request path; one worker keeps them in order
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-memory")
+
+def summarize_messages(summary, messages, model=None):
+    """New running summary from the previous summary and the messages to fold in, or None on error."""
+    perplexity = PerplexityClient()
+    transcript = "\n\n".join(f"{message['role'].upper()}: {message['content']}" for message in messages)
+    response = perplexity.generate_completion(
+        model=model or perplexity.get_model("chat"),
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": f"EXISTING SUMMARY:\n{summary or '(none)'}\n\nNEW MESSAGES:\n{transcript}"}
+        ],
+        temperature=0.2,
+        max_tokens=CHAT_SUMMARY_MAX_TOKENS,
+        purpose="chat"
+    )
+    if "error" in response:
+        print(f"Error summarizing conversation: {response['error']}")
+        return None
+    return response["content"]
+
+class ConversationMemory:
+    """Recent messages verbatim plus a summary of everything before them."""
+
+    def __init__(self, conversation_id=None, system_prompt=DEFAULT_SYSTEM_PROMPT, recent_turns=CHAT_MEMORY_RECENT_TURNS,
+                 compact_turns=CHAT_MEMORY_COMPACT_TURNS, summarizer=summarize_messages, executor=_executor):
+        self.conversation_id = conversation_id or uuid.uuid4().hex
+        self.system_prompt = system_prompt
+        self.context = None
+        self.summary = ""
+        self.messages = []
+        self.summarized_count = 0
+        self.recent_turns = recent_turns
+        self.compact_turns = compact_turns
+        self.summarizer = summarizer
+        self.executor = executor
+        self._lock = threading.Lock()
+        self._compaction = None
+
+    def set_context(self, context):
+        self.context = context
+
+    def prompt_messages(self, user_message=None):
+        """The messages to send: system (with context and summary), recent messages, then user_message."""
+        system = self.system_prompt
+        if self.context:
+            system += f" Consider this context information: {self.context}"
+        with self._lock:
+            if self.summary:
+                system += f"\n\nSummary of the earlier conversation:\n{self.summary}"
+            messages = [{"role": "system", "content": system}] + list(self.messages)
+        if user_message is not None:
+            messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def add_exchange(self, user_message, ai_response):
+        """Record a completed exchange and fold old messages into the summary in the background."""
+        with self._lock:
+            self.messages.append({"role": "user", "content": user_message})
+            self.messages.append({"role": "assistant", "content": ai_response})
+        self._schedule_compaction()
+
+    def _schedule_compaction(self):
+        with self._lock:
+            if self._compaction is not None and not self._compaction.done():
+                return
+            # Wait until a whole batch of turns is old, so the summary is not rewritten every turn
+            excess = len(self.messages) - 2 * self.recent_turns
+            if excess < 2 * self.compact_turns:
+                return
+            folded = self.messages[:excess]
+            summary = self.summary
+            self._compaction = self.executor.submit(self._compact, summary, folded)
+
+    def _compact(self, summary, folded):
+        new_summary = self.summarizer(summary, folded)
+        if new_summary is None:
+            return False
+        with self._lock:
+            # The folded messages are still the oldest ones: nothing else removes messages
+            self.summary = new_summary
+            self.messages = self.messages[len(folded):]
+            self.summarized_count += len(folded)
+        self.save()
+        return True
+
+    def wait(self, timeout=None):
+        """Block until a running compaction finishes (for tests and shutdown)."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.result(timeout)
+
+    def to_document(self):
+        with self._lock:
+            return {
+                "kind": "conversation",
+                "conversation_id": self.conversation_id,
+                "title": next((m["content"] for m in self.messages if m["role"] == "user"), "Conversation")[:80],
+                "system_prompt": self.system_prompt,
+                "context": self.context,
+                "summary": self.summary,
+                "messages": list(self.messages),
+                "summarized_count": self.summarized_count,
+                "message_count": self.summarized_count + len(self.messages),
+                "timestamp": datetime.utcnow()
+            }
+
+    def save(self):
+        """Persist the conversation state in the background; returns False without a database."""
+        document = self.to_document()
+        return DatabaseManager().enqueue_update(
+            COLLECTIONS["chat"],
+            {"conversation_id": self.conversation_id, "kind": "conversation"},
+            {"$set": document, "$setOnInsert": {"created_at": document["timestamp"]}},
+            upsert=True
+        )
+
+    @classmethod
+    def load(cls, conversation_id, **options):
+        """Restore a saved conversation, or None if it does not exist."""
+        collection = DatabaseManager().get_collection(COLLECTIONS["chat"])
+        if collection is None:
+            return None
+        document = collection.find_one({"conversation_id": conversation_id, "kind": "conversation"})
+        if document is None:
+            return None
+        memory = cls(conversation_id, document.get("system_prompt") or DEFAULT_SYSTEM_PROMPT, **options)
+        memory.context = document.get("context")
+        memory.summary = document.get("summary") or ""
+        memory.messages = list(document.get("messages") or [])
+        memory.summarized_count = document.get("summarized_count", 0)
+        return memory
@@ -0,0 +1,91 @@
+"""
+Single-pass citation parser for research reports.
+"""
+import re
+
+# Reference-section headings, other headings (which end a reference
+# section) and reference definitions ("[3] ..." or "3. ..." lines); only
+# tried on lines that start like one of them.
+_REFERENCE_LINE = re.compile(
+    r'[ \t]*(?:(?P<heading>(?:#{1,6}[ \t]*(?:\*\*)?(?:sources|references|citations|bibliography|works cited)\b[^\n]{0,40}'
+    r'|(?:\*\*)?(?:sources|references|citations|bibliography|works cited)[ \t]*:?[ \t]*(?:\*\*)?[ \t]*:?)[ \t]*$)'
+    r'|(?P<other_heading>#{1,6}[ \t].*)'
+    r'|(?:[-*][ \t]+)?\[(?P<def_number>\d{1,3})\][ \t]*:?[ \t]*(?P<def_details>\S.*)'
+    r'|(?P<list_number>\d{1,3})[.)][ \t]+(?P<list_details>\S.*))',
+    re.IGNORECASE
+)
+_REFERENCE_LINE_STARTS = tuple("#*-[0123456789") + ("sources", "references", "citations", "bibliography", "works cited")
+# Inline markers: "[3]", "[3, 4]" or "[3](https://...)"
+_INLINE_CITATION = re.compile(r'\[(?P<numbers>\d{1,3}(?:[ \t]*,[ \t]*\d{1,3})*)\](?:\((?P<url>[^)\s]+)\))?')
+_URL = re.compile(r'https?://[^\s)\]>"]+')
+_NUMBER_SPLIT = re.compile(r'[ \t]*,[ \t]*')
+
+MISSING_DETAILS = "Citation details not found"
+
+def _source_details(source):
+    """Describe one structured source from the API (a URL string or a search result)."""
+    if isinstance(source, str):
+        return source, source
+    title = source.get("title") or ""
+    url = source.get("url") or ""
+    date = source.get("date") or ""
+    details = " - ".join(part for part in (title, url) if part)
+    if date:
+        details = f"{details} ({date})"
+    return details, url
+
+def parse_citations(text, citations=None, search_results=None):
+    """
+    Build the citation list of a report in one pass over its lines.
+
+    Returns [{"number", "details", "url"}] ordered by citation number for
+    every number cited inline or defined in a reference section. Definitions
+    found in the text win; otherwise the API's structured search_results or
+    citations (1-based, in the order the API returned them) fill in details.
+    """
+    cited = set()
+    definitions = {}
+    inline_urls = {}
+    in_references = False
+
+    for line in (text or "").splitlines():
+        stripped = line.lstrip().lower()
+        match = _REFERENCE_LINE.match(line) if stripped.startswith(_REFERENCE_LINE_STARTS) else None
+        if match is not None:
+            if match.group("heading") is not None:
+                in_references = True
+                continue
+            if match.group("other_heading") is not None:
+                in_references = False
+            elif match.group("def_number") is not None:
+                definitions.setdefault(int(match.group("def_number")), match.group("def_details").strip())
+                continue
+            elif in_references:
+                # Plain numbered lists are only references inside a Sources section
+                definitions.setdefault(int(match.group("list_number")), match.group("list_details").strip())
+                continue
+
+        for inline in _INLINE_CITATION.finditer(line):
+            numbers = [int(number) for number in _NUMBER_SPLIT.split(inline.group("numbers"))]
+            cited.update(numbers)
+            if inline.group("url") and len(numbers) == 1:
+                inline_urls.setdefault(numbers[0], inline.group("url"))
+
+    structured = {}
+    for index, source in enumerate(search_results or citations or [], start=1):
+        structured[index] = _source_details(source)
+
+    result = []
+    for number in sorted(cited | set(definitions)):
+        if number in definitions:
+            details = definitions[number]
+            url_match = _URL.search(details)
+            url = url_match.group(0) if url_match else structured.get(number, ("", ""))[1]
+        elif number in structured:
+            details, url = structured[number]
+        elif number in inline_urls:
+            details = url = inline_urls[number]
+        else:
+            details, url = MISSING_DETAILS, ""
+        result.append({"number": str(number), "details": details, "url": url})
+    return result
@@ -0,0 +1,348 @@
+"""
+Local search over ingested repository chunks.
+
+BM25 runs over an inverted index whose postings hold precomputed per-chunk
+term weights, so a query only sums the postings of its terms and selects
+the top k. With NumPy installed postings are arrays and scoring is
+vectorized; without it the same index is scored in pure Python.
+
+An optional vector index over local hashed token embeddings (no model or
+network needed) catches chunks that share vocabulary only partially; it is
+searched by brute force, or through k-means clusters (IVF) for large
+indexes, and fused with BM25 by reciprocal rank.
+
+Only chunk ids and locations are kept in memory; the text of the top
+results is loaded from the database per query.
+"""
+import re
+import math
+import time
+import heapq
+import zlib
+import threading
+from collections import Counter, defaultdict
+from functools import lru_cache
+from itertools import chain
+from app.utils.db_connection import DatabaseManager
+from app.config.settings import (
+    COLLECTIONS,
+    CODE_SEARCH_TOP_K,
+    CODE_SEARCH_VECTOR,
+    CODE_SEARCH_DIMENSIONS,
+    CODE_SEARCH_IVF_MIN_CHUNKS,
+    CODE_SEARCH_IVF_PROBES,
+    CODE_SEARCH_REFRESH_SECONDS
+)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+_CAMEL = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Reciprocal rank fusion constant
+RRF_K = 60
+# Chunk metadata kept in memory and returned with results
+LOCATION_FIELDS = ("project", "path", "kind", "name", "start_line", "end_line")
+# Document kinds that describe files and projects rather than code
+_NON_CHUNK_KINDS = ["file", "project"]
+
+@lru_cache(maxsize=200000)
+def _identifier_terms(identifier):
+    """An identifier lowercased, followed by its snake_case and camelCase parts."""
+    lowered = identifier.lower()
+    parts = [part.lower() for piece in identifier.split("_") for part in _CAMEL.findall(piece)]
+    return (lowered, *parts) if len(parts) > 1 else (lowered,)
+
+def tokenize_code(text):
+    """
+    Lowercase search terms of source text.
+
+    Identifiers are kept whole and also split into their snake_case and
+    camelCase parts, so "parse_citations" matches a query for "citations".
+    """
+    return [term for identifier in _IDENTIFIER.findall(text) for term in _identifier_terms(identifier)]
+
+def term_counts(text):
+    """Counter of tokenize_code(text)."""
+    return Counter(chain.from_iterable(map(_identifier_terms, _IDENTIFIER.findall(text))))
+
+def _bm25_weights(idf, frequencies, lengths, average_length):
+    return idf * frequencies * (K1 + 1) / (frequencies + K1 * (1 - B + B * lengths / average_length))
+
+class BM25Index:
+    """Inverted index with BM25 term weights computed at build time."""
+
+    def __init__(self, token_counts):
+        """token_counts holds one term Counter per chunk; postings map term -> (positions, weights, frequencies)."""
+        self.size = len(token_counts)
+        self.postings = {}
+        if self.size:
+            if np is not None:
+                self._build_arrays(token_counts)
+            else:
+                self._build_lists(token_counts)
+
+    def _idf(self, document_frequency):
+        return math.log(1 + (self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def _build_arrays(self, token_counts):
+        """All postings as flat arrays grouped by term with one stable sort."""
+        vocabulary = defaultdict()
+        vocabulary.default_factory = vocabulary.__len__
+        term_ids, frequencies, sizes = [], [], []
+        for counts in token_counts:
+            term_ids.extend(map(vocabulary.__getitem__, counts))
+            frequencies.extend(counts.values())
+            sizes.append(len(counts))
+        term_ids = np.array(term_ids, dtype=np.int32)
+        frequencies = np.array(frequencies, dtype=np.float32)
+        positions = np.repeat(np.arange(self.size, dtype=np.int32), sizes)
+        lengths = np.bincount(positions, weights=frequencies, minlength=self.size).astype(np.float32)
+
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, frequencies, positions = term_ids[order], frequencies[order], positions[order]
+        document_frequencies = np.bincount(term_ids, minlength=len(vocabulary))
+        idf = np.log(1 + (self.size - document_frequencies + 0.5) / (document_frequencies + 0.5))
+        weights = _bm25_weights(idf[term_ids], frequencies, lengths[positions], lengths.mean()).astype(np.float32)
+
+        bounds = np.concatenate(([0], np.cumsum(document_frequencies)))
+        for term, term_id in vocabulary.items():
+            start, end = bounds[term_id], bounds[term_id + 1]
+            self.postings[term] = (positions[start:end], weights[start:end], frequencies[start:end])
+
+    def _build_lists(self, token_counts):
+        lengths = [sum(counts.values()) for counts in token_counts]
+        average_length = sum(lengths) / self.size
+        entries = defaultdict(list)
+        for position, counts in enumerate(token_counts):
+            for term, frequency in counts.items():
+                entries[term].append((position, frequency))
+        for term, term_entries in entries.items():
+            idf = self._idf(len(term_entries))
+            self.postings[term] = (
+                [position for position, _ in term_entries],
+                [_bm25_weights(idf, frequency, lengths[position], average_length) for position, frequency in term_entries],
+                [frequency for _, frequency in term_entries]
+            )
+
+    def search(self, terms, k):
+        """[(position, score)] of the k best chunks for the query terms."""
+        terms = [term for term in set(terms) if term in self.postings]
+        if not terms or not self.size:
+            return []
+        if np is None:
+            scores = defaultdict(float)
+            for term in terms:
+                positions, weights, _ = self.postings[term]
+                for position, weight in zip(positions, weights):
+                    scores[position] += weight
+            return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in terms:
+            positions, weights, _ = self.postings[term]
+            # Positions are unique within a posting list
+            scores[positions] += weights
+        return _top_k(scores, k)
+
+def _top_k(scores, k):
+    candidates = np.flatnonzero(scores > 0)
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(scores[candidates], -k)[-k:]]
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return [(int(position), float(scores[position])) for position in order]
+
+def _term_slot(term, dimensions):
+    """Hashed embedding dimension and sign of a term."""
+    digest = zlib.crc32(term.encode("utf-8"))
+    return (digest >> 1) % dimensions, 1.0 if digest & 1 else -1.0
+
+def _normalized(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1)
+
+def embed_postings(postings, size, dimensions=CODE_SEARCH_DIMENSIONS):
+    """
+    Unit-length hashed embeddings of every chunk, built from BM25 postings.
+
+    Each term adds sign * idf * (1 + log tf) to its hashed dimension, so the
+    matrix is filled with one vectorized update per term. Returns the
+    matrix and the idf table used to embed queries the same way.
+    """
+    matrix = np.zeros((size, dimensions), dtype=np.float32)
+    idf = {}
+    for term, (positions, _, frequencies) in postings.items():
+        slot, sign = _term_slot(term, dimensions)
+        idf[term] = math.log(1 + size / len(positions))
+        matrix[positions, slot] += sign * idf[term] * (1 + np.log(frequencies))
+    return _normalized(matrix), idf
+
+def embed_counts(counts, idf, dimensions=CODE_SEARCH_DIMENSIONS):
+    """Unit-length hashed embedding of a query's term Counter."""
+    vector = np.zeros(dimensions, dtype=np.float32)
+    for term, frequency in counts.items():
+        slot, sign = _term_slot(term, dimensions)
+        vector[slot] += sign * (1 + math.log(frequency)) * idf.get(term, 1.0)
+    return _normalized(vector)
+
+class VectorIndex:
+    """Cosine search over embeddings, brute force or through IVF clusters."""
+
+    def __init__(self, vectors, clustered=False, probes=CODE_SEARCH_IVF_PROBES, iterations=8, seed=0):
+        self.vectors = vectors
+        self.probes = probes
+        self.lists = None
+        if clustered and len(vectors) > probes:
+            self._cluster(int(math.sqrt(len(vectors))), iterations, np.random.default_rng(seed))
+
+    def _cluster(self, count, iterations, rng):
+        """Spherical k-means on a sample, then every vector goes to its nearest centroid."""
+        sample = self.vectors[rng.choice(len(self.vectors), min(len(self.vectors), count * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), count, replace=False)]
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(count):
+                members = sample[assignment == cluster]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    if norm:
+                        centroids[cluster] = centroid / norm
+        assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == cluster) for cluster in range(count)]
+
+    def search(self, query, k):
+        if self.lists is None:
+            return _top_k(np.maximum(self.vectors @ query, 0), k)
+        nearest = np.argsort(-(self.centroids @ query))[:self.probes]
+        candidates = np.concatenate([self.lists[cluster] for cluster in nearest])
+        scores = np.maximum(self.vectors[candidates] @ query, 0)
+        return [(int(candidates[position]), score) for position, score in _top_k(scores, k)]
+
+class ChunkIndex:
+    """BM25 (and optionally vector) index over a list of chunks."""
+
+    def __init__(self, chunks, vector=CODE_SEARCH_VECTOR):
+        """chunks is an iterable of dicts with "_id", "content" and LOCATION_FIELDS."""
+        self.ids = []
+        self.locations = []
+        token_counts = []
+        for chunk in chunks:
+            self.ids.append(chunk["_id"])
+            self.locations.append({field: chunk.get(field) for field in LOCATION_FIELDS})
+            token_counts.append(term_counts(chunk.get("content") or ""))
+        self.bm25 = BM25Index(token_counts)
+
+        self.vectors = None
+        if vector != "none" and np is not None and token_counts:
+            matrix, self.idf = embed_postings(self.bm25.postings, len(token_counts))
+            clustered = vector == "ivf" or (vector == "auto" and len(matrix) >= CODE_SEARCH_IVF_MIN_CHUNKS)
+            self.vectors = VectorIndex(matrix, clustered=clustered)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, k=CODE_SEARCH_TOP_K):
+        """[(position, score)] of the k most relevant chunks."""
+        terms = tokenize_code(query)
+        lexical = self.bm25.search(terms, k if self.vectors is None else k * 4)
+        if self.vectors is None:
+            return lexical
+        semantic = self.vectors.search(embed_counts(Counter(terms), self.idf), k * 4)
+        fused = defaultdict(float)
+        for results in (lexical, semantic):
+            for rank, (position, _) in enumerate(results):
+                fused[position] += 1.0 / (RRF_K + rank + 1)
+        return heapq.nlargest(k, fused.items(), key=lambda item: item[1])
+
+class CodeSearch:
+    """Chunk indexes per project, rebuilt when a project is re-ingested."""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CodeSearch, cls).__new__(cls)
+            cls._instance.initialize()
+        return cls._instance
+
+    def initialize(self):
+        self.collection = DatabaseManager().get_collection(COLLECTIONS["projects"])
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _signature(self, project):
+        """When each indexed project was last ingested."""
+        query = {"kind": "project"}
+        if project:
+            query["project"] = project
+        return tuple(sorted(
+            (document.get("project"), str(document.get("timestamp")))
+            for document in self.collection.find(query, {"project": 1, "timestamp": 1})
+        ))
+
+    def _build(self, project):
+        query = {"kind": {"$nin": _NON_CHUNK_KINDS}}
+        if project:
+            query["project"] = project
+        fields = {field: 1 for field in LOCATION_FIELDS + ("content",)}
+        return ChunkIndex(self.collection.find(query, fields))
+
+    def get_index(self, project=None):
+        """The index for one project (or all when None), checked for changes at most every few seconds."""
+        if self.collection is None:
+            return None
+        with self._lock:
+            entry = self._indexes.get(project)
+            now = time.monotonic()
+            if entry is not None and now - entry["checked_at"] < CODE_SEARCH_REFRESH_SECONDS:
+                return entry["index"]
+            signature = self._signature(project)
+            if entry is None or entry["signature"] != signature:
+                entry = {"index": self._build(project), "signature": signature}
+                self._indexes[project] = entry
+            entry["checked_at"] = now
+            return entry["index"]
+
+    def search(self, query, k=CODE_SEARCH_TOP_K, project=None):
+        """
+        The k chunks most relevant to query, best first.
+
+        Each result has LOCATION_FIELDS plus "content" and "score".
+        """
+        index = self.get_index(project)
+        if index is None or not len(index) or not query.strip():
+            return []
+        hits = index.search(query, k)
+        ids = [index.ids[position] for position, _ in hits]
+        contents = {
+            document["_id"]: document.get("content", "")
+            for document in self.collection.find({"_id": {"$in": ids}}, {"content": 1})
+        }
+        return [
+            dict(index.locations[position], content=contents.get(index.ids[position], ""), score=round(score, 4))
+            for position, score in hits
+            if index.ids[position] in contents
+        ]
+
+def retrieve_context(task, k=CODE_SEARCH_TOP_K, project=None):
+    """The k ingested code chunks most relevant to a task description."""
+    try:
+        return CodeSearch().search(task, k, project)
+    except Exception as e:
+        print(f"Error retrieving code context: {e}")
+        return []
+
+def format_context(snippets):
+    """Render retrieved chunks as prompt text with their locations."""
+    return "\n\n".join(
+        f"# {snippet['path']}:{snippet['start_line']}-{snippet['end_line']}"
+        f"{' (' + snippet['name'] + ')' if snippet.get('name') else ''}\n{snippet['content']}"
+        for snippet in snippets
+    )
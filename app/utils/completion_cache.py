@@ -0,0 +1,214 @@
+"""
+Content-addressed cache for Perplexity chat completions.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from datetime import datetime, timedelta
+from app.config.settings import (
+    CACHE_BACKEND,
+    CACHE_PATH,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL,
+    COLLECTIONS
+)
+
+def make_cache_key(model, messages, temperature, max_tokens):
+    """Hash the parts of a request that determine its completion."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class SQLiteCacheBackend:
+    """Local on-disk cache store with least-recently-used eviction."""
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY, purpose TEXT, value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_accessed ON completions (accessed_at)"
+        )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                return None
+            self._conn.execute(
+                "UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(row[0])
+
+    def set(self, key, value, purpose, ttl):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?, ?, ?)",
+                (key, purpose, json.dumps(value), now + ttl, now)
+            )
+            self._evict()
+
+    def _evict(self):
+        """Drop expired rows, then the least recently used rows over the size bound."""
+        self._conn.execute("DELETE FROM completions WHERE expires_at <= ?", (time.time(),))
+        excess = self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                " SELECT key FROM completions ORDER BY accessed_at ASC LIMIT ?)",
+                (excess,)
+            )
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+class MongoCacheBackend:
+    """Cache store shared between hosts through a MongoDB collection."""
+
+    def __init__(self, collection, max_entries):
+        self.collection = collection
+        self.max_entries = max_entries
+        self._indexed = False
+
+    def _ensure_indexes(self):
+        """Create the cache indexes on first write rather than at startup."""
+        if self._indexed:
+            return
+        # MongoDB removes expired entries itself through a TTL index
+        self.collection.create_index("expires_at", expireAfterSeconds=0)
+        self.collection.create_index("accessed_at")
+        self._indexed = True
+
+    def get(self, key):
+        now = datetime.utcnow()
+        document = self.collection.find_one_and_update(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"$set": {"accessed_at": now}}
+        )
+        return document["value"] if document else None
+
+    def set(self, key, value, purpose, ttl):
+        self._ensure_indexes()
+        now = datetime.utcnow()
+        self.collection.replace_one(
+            {"_id": key},
+            {
+                "purpose": purpose,
+                "value": value,
+                "expires_at": now + timedelta(seconds=ttl),
+                "accessed_at": now
+            },
+            upsert=True
+        )
+        excess = self.collection.estimated_document_count() - self.max_entries
+        if excess > 0:
+            stale = self.collection.find({}, {"_id": 1}).sort("accessed_at", 1).limit(excess)
+            self.collection.delete_many({"_id": {"$in": [doc["_id"] for doc in stale]}})
+
+    def clear(self):
+        self.collection.delete_many({})
+
+    def __len__(self):
+        return self.collection.estimated_document_count()
+
+class CompletionCache:
+    """Completion cache with per-purpose TTLs and hit/miss counters."""
+
+    def __init__(self, backend, ttls=None):
+        self.backend = backend
+        self.ttls = dict(CACHE_TTL if ttls is None else ttls)
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def ttl_for(self, purpose):
+        """Seconds a completion for this purpose stays valid; 0 disables caching."""
+        return self.ttls.get(purpose, 0)
+
+    def enabled_for(self, purpose):
+        return self.ttl_for(purpose) > 0
+
+    def get(self, key, purpose, bypass=False):
+        """Return the cached completion for key, or None on a miss or bypass."""
+        if bypass or not self.enabled_for(purpose):
+            self._count("bypassed")
+            return None
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            print(f"Error reading completion cache: {e}")
+            self._count("errors")
+            return None
+        self._count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key, value, purpose):
+        """Store a successful completion under key."""
+        if not self.enabled_for(purpose) or "error" in value:
+            return
+        try:
+            self.backend.set(key, value, purpose, self.ttl_for(purpose))
+            self._count("stores")
+        except Exception as e:
+            print(f"Error writing completion cache: {e}")
+            self._count("errors")
+
+    def get_stats(self):
+        """Return a copy of the counters together with the hit ratio."""
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+def build_completion_cache():
+    """Create the completion cache selected by CACHE_BACKEND, or None if disabled."""
+    try:
+        if CACHE_BACKEND == "sqlite":
+            return CompletionCache(SQLiteCacheBackend(CACHE_PATH, CACHE_MAX_ENTRIES))
+        if CACHE_BACKEND == "mongo":
+            from app.utils.db_connection import DatabaseManager
+            collection = DatabaseManager().get_collection(COLLECTIONS["cache"])
+            if collection is None:
+                print("Warning: MongoDB not connected, completion cache disabled")
+                return None
+            return CompletionCache(MongoCacheBackend(collection, CACHE_MAX_ENTRIES))
+    except Exception as e:
+        print(f"Error initializing completion cache: {e}")
+    return None
@@ -1,53 +1,385 @@
 """
 Database connection utility for MongoDB.
 """
+import os
+import time
+import queue
+import atexit
+import threading
 import pymongo
-from pymongo import MongoClient
-from app.config.settings import MONGODB_URI, DB_NAME
+from bson import ObjectId, json_util
+from pymongo import MongoClient, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, OperationFailure
+from app.utils.health import HealthProbe
+from app.utils.local_storage import LocalClient
+from app.utils.metrics import Metrics
+from app.config.settings import (
+    MONGODB_URI,
+    DB_NAME,
+    COLLECTIONS,
+    COLLECTION_INDEXES,
+    MONGODB_TIMEOUT_MS,
+    HEALTH_CHECK_INTERVAL,
+    WRITE_BATCH_SIZE,
+    WRITE_FLUSH_INTERVAL,
+    WRITE_QUEUE_MAX,
+    WRITE_PUT_TIMEOUT,
+    WRITE_RETRY_INTERVAL,
+    WRITE_SHUTDOWN_TIMEOUT,
+    WRITE_SPILL_PATH,
+    STORAGE_BACKEND,
+    STORAGE_PATH
+)
+
+DUPLICATE_KEY_ERROR = 11000
+# An index with the same name or keys exists with different options
+INDEX_CONFLICT_ERRORS = (85, 86)
+
+class WriteBehindQueue:
+    """
+    Buffers writes and applies them to MongoDB in batches on a background thread.
+
+    Operations are ("insert", document) or ("update", filter, update, upsert)
+    tuples. A batch is flushed with one bulk_write per collection once it
+    holds batch_size operations or flush_interval seconds have passed. When
+    the buffer is full, put blocks for up to put_timeout seconds before the
+    write is spilled to a local JSONL file instead. Batches that fail are
+    spilled too and replayed once MongoDB accepts writes again; inserts carry
+    a client-side _id so a replay never duplicates a document.
+    """
+
+    def __init__(self, get_db, batch_size=WRITE_BATCH_SIZE, flush_interval=WRITE_FLUSH_INTERVAL,
+                 max_pending=WRITE_QUEUE_MAX, put_timeout=WRITE_PUT_TIMEOUT,
+                 retry_interval=WRITE_RETRY_INTERVAL, spill_path=WRITE_SPILL_PATH):
+        self.get_db = get_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retry_interval = retry_interval
+        self.spill_path = spill_path
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._spill_lock = threading.Lock()
+        self._unavailable_until = 0.0
+        self._closed = False
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "spilled": 0, "replayed": 0, "failed_batches": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="mongo-writer", daemon=True)
+        self._thread.start()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def put(self, collection_name, operation):
+        """Queue one operation, waiting briefly for room before spilling it to disk."""
+        if operation[0] == "insert":
+            # A fixed _id makes retries and replays idempotent
+            document = dict(operation[1])
+            document.setdefault("_id", ObjectId())
+            operation = ("insert", document)
+        if self._closed:
+            self._spill([(collection_name, operation)])
+            return
+        try:
+            self._queue.put((collection_name, operation), timeout=self.put_timeout)
+            self._count("queued")
+        except queue.Full:
+            self._spill([(collection_name, operation)])
+
+    def flush(self, timeout=None):
+        """Block until every operation queued so far has been written or spilled."""
+        done = threading.Event()
+        try:
+            self._queue.put(("__flush__", done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=WRITE_SHUTDOWN_TIMEOUT):
+        """Flush at shutdown; whatever cannot be written in time is spilled."""
+        if self._closed:
+            return
+        flushed = self.flush(timeout)
+        self._closed = True
+        if not flushed:
+            pending = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[0] != "__flush__":
+                    pending.append(item)
+            self._spill(pending)
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["pending"] = self._queue.qsize()
+        stats["spill_file"] = os.path.exists(self.spill_path)
+        return stats
+
+    def _run(self):
+        batch = []
+        waiters = []
+        deadline = time.monotonic() + self.flush_interval
+        self._replay()
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item[0] == "__flush__":
+                    waiters.append(item[1])
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            if len(batch) >= self.batch_size or waiters or time.monotonic() >= deadline:
+                if batch:
+                    self._write(batch)
+                    batch = []
+                elif time.monotonic() >= self._unavailable_until:
+                    self._replay()
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def _bulk_write(self, items):
+        """Apply (collection, operation) pairs with one unordered bulk_write per collection."""
+        db = self.get_db()
+        if db is None:
+            raise ConnectionError("MongoDB not connected")
+        grouped = {}
+        for collection_name, operation in items:
+            if operation[0] == "insert":
+                request = InsertOne(operation[1])
+            else:
+                _, filter_, update, upsert = operation
+                request = UpdateOne(filter_, update, upsert=upsert)
+            grouped.setdefault(collection_name, []).append(request)
+        metrics = Metrics()
+        for collection_name, requests in grouped.items():
+            with metrics.timer("mclg_db_write_seconds", collection=collection_name, status="error") as labels:
+                try:
+                    db[collection_name].bulk_write(requests, ordered=False)
+                except BulkWriteError as e:
+                    # Documents already written by an earlier attempt are fine
+                    if any(error.get("code") != DUPLICATE_KEY_ERROR for error in e.details.get("writeErrors", [])):
+                        raise
+                    if e.details.get("writeConcernErrors"):
+                        raise
+                labels["status"] = "ok"
+            metrics.increment("mclg_db_documents_total", len(requests), collection=collection_name)
+
+    def _write(self, batch):
+        if time.monotonic() < self._unavailable_until:
+            self._spill(batch)
+            return
+        try:
+            self._bulk_write(batch)
+            self._count("written", len(batch))
+            self._count("batches")
+        except Exception as e:
+            print(f"Error writing batch to MongoDB, spilling to disk: {e}")
+            self._count("failed_batches")
+            self._unavailable_until = time.monotonic() + self.retry_interval
+            self._spill(batch)
+            return
+        self._replay()
+
+    def _spill(self, items):
+        if not items:
+            return
+        with self._spill_lock:
+            try:
+                os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    for collection_name, operation in items:
+                        f.write(json_util.dumps({"collection": collection_name, "operation": list(operation)}) + "\n")
+                self._count("spilled", len(items))
+            except Exception as e:
+                print(f"Error spilling {len(items)} database writes: {e}")
+
+    def _replay(self):
+        """Write spilled operations back to MongoDB, keeping the file if that fails."""
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                return
+            try:
+                with open(self.spill_path, encoding="utf-8") as f:
+                    items = []
+                    for line in f:
+                        if line.strip():
+                            record = json_util.loads(line)
+                            items.append((record["collection"], tuple(record["operation"])))
+                self._bulk_write(items)
+                os.remove(self.spill_path)
+                self._count("replayed", len(items))
+            except Exception as e:
+                print(f"Error replaying spilled database writes: {e}")
+                self._unavailable_until = time.monotonic() + self.retry_interval
 
 class DatabaseManager:
     _instance = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DatabaseManager, cls).__new__(cls)
             cls._instance.initialize_connection()
         return cls._instance
-    
+
     def initialize_connection(self):
-        """Initialize connection to MongoDB."""
-        try:
-            # Check if MongoDB URI is set
-            if not MONGODB_URI:
-                print("Warning: MongoDB URI is not set in environment variables")
-                self.client = None
-                self.db = None
+        """Prepare the database connection; the client is created on first use."""
+        self._client = None
+        self._db = None
+        self._connect_error = None
+        self._lock = threading.Lock()
+        self.storage_backend = self._resolve_backend()
+
+        # Check if MongoDB URI is set
+        if self.storage_backend == "mongo" and not MONGODB_URI:
+            print("Warning: MongoDB URI is not set in environment variables")
+
+        # Connectivity is verified in the background instead of at construction
+        self.health = HealthProbe("mongodb", self._probe, HEALTH_CHECK_INTERVAL)
+        self._writer = None
+
+    @staticmethod
+    def _resolve_backend():
+        """The configured storage backend, with "auto" picking MongoDB only when a URI is set."""
+        if STORAGE_BACKEND == "auto":
+            return "mongo" if MONGODB_URI else "sqlite"
+        if STORAGE_BACKEND not in ("mongo", "sqlite", "none"):
+            print(f"Warning: unknown STORAGE_BACKEND {STORAGE_BACKEND!r}, storage disabled")
+            return "none"
+        return STORAGE_BACKEND
+
+    def _connect(self):
+        """Create the database client the first time it is needed."""
+        if self._client is not None or self._connect_error is not None or not self._configured():
+            return
+        with self._lock:
+            if self._client is not None or self._connect_error is not None:
                 return
-            
-            # Create MongoDB client
-            self.client = MongoClient(MONGODB_URI)
-            
-            # Ping database to test connection
-            self.client.admin.command('ping')
-            print("Successfully connected to MongoDB")
-            
-            # Set database
-            self.db = self.client[DB_NAME]
-            
+            try:
+                if self.storage_backend == "sqlite":
+                    client = LocalClient(STORAGE_PATH)
+                else:
+                    # Create MongoDB client; it connects lazily in its own background threads
+                    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=MONGODB_TIMEOUT_MS)
+                self._db = client[DB_NAME]
+                self._client = client
+                threading.Thread(target=self._ensure_indexes_in_background, name="storage-indexes", daemon=True).start()
+            except Exception as e:
+                print(f"Error connecting to {self.storage_backend} storage: {e}")
+                self._connect_error = str(e)
+
+    def _configured(self):
+        if self.storage_backend == "mongo":
+            return bool(MONGODB_URI)
+        return self.storage_backend == "sqlite"
+
+    @property
+    def client(self):
+        self._connect()
+        return self._client
+
+    @property
+    def db(self):
+        self._connect()
+        return self._db
+
+    def _probe(self):
+        """Health check run by the background probe."""
+        if self.client is None:
+            raise ConnectionError(self._connect_error or "MongoDB client not available")
+        # Ping database to test connection
+        self.client.admin.command('ping')
+        return "Connected"
+
+    def get_health(self):
+        """Return the last known database status without blocking."""
+        if not self._configured():
+            detail = "MongoDB URI is not set" if self.storage_backend == "mongo" else "Storage is disabled"
+            return {"state": "disabled", "detail": detail, "latency_ms": None, "checked_at": None}
+        return self.health.status()
+
+    def ensure_indexes(self):
+        """Create the indexes declared in COLLECTION_INDEXES; safe to run repeatedly."""
+        db = self.db
+        if db is None:
+            return False
+        for key, specs in COLLECTION_INDEXES.items():
+            collection = db[COLLECTIONS[key]]
+            for spec in specs:
+                options = {name: value for name, value in spec.items() if name != "keys"}
+                try:
+                    collection.create_index(spec["keys"], **options)
+                except OperationFailure as e:
+                    if e.code not in INDEX_CONFLICT_ERRORS:
+                        raise
+                    # The spec changed (for example the chat TTL): rebuild the index
+                    for name, info in collection.index_information().items():
+                        if name == options["name"] or info["key"] == spec["keys"]:
+                            collection.drop_index(name)
+                    collection.create_index(spec["keys"], **options)
+        return True
+
+    def _ensure_indexes_in_background(self):
+        try:
+            self.ensure_indexes()
         except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
-            self.client = None
-            self.db = None
-    
+            print(f"Error creating database indexes: {e}")
+
     def get_collection(self, collection_name):
-        """Get a MongoDB collection by name."""
-        if self.db:
+        """Get a collection by name from MongoDB or the embedded SQLite store."""
+        if self.db is not None:
             return self.db[collection_name]
         print("Warning: Database not connected, returning None")
         return None
-    
+
+    @property
+    def writer(self):
+        """The write-behind queue, started on first use and flushed at exit."""
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = WriteBehindQueue(lambda: self.db)
+                    atexit.register(self._writer.close)
+        return self._writer
+
+    def enqueue_insert(self, collection_name, document):
+        """
+        Insert a document in the background; returns False if no database is configured.
+
+        The document's _id is assigned here, so callers can refer to it before it is written.
+        """
+        if not self._configured():
+            return False
+        document.setdefault("_id", ObjectId())
+        self.writer.put(collection_name, ("insert", document))
+        return True
+
+    def enqueue_update(self, collection_name, filter_, update, upsert=False):
+        """Apply an update in the background; returns False if no database is configured."""
+        if not self._configured():
+            return False
+        self.writer.put(collection_name, ("update", filter_, update, upsert))
+        return True
+
+    def flush_writes(self, timeout=None):
+        """Wait until queued writes have been applied or spilled."""
+        if self._writer is None:
+            return True
+        return self._writer.flush(timeout)
+
+    def get_write_stats(self):
+        return self._writer.get_stats() if self._writer is not None else None
+
     def close_connection(self):
         """Close the MongoDB connection."""
-        if self.client:
-            self.client.close()
-            print("MongoDB connection closed")
+        if self._writer is not None:
+            self._writer.close()
+        if self._client is not None:
+            self._client.close()
+            print(f"{'MongoDB' if self.storage_backend == 'mongo' else 'Local storage'} connection closed")
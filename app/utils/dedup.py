@@ -0,0 +1,217 @@
+"""
+Exact and near-duplicate detection for scraped pages.
+
+Pages are compared on their normalized article text: an exact SHA-256 hash
+catches identical copies, and a 64-bit SimHash over word shingles catches
+syndicated or lightly edited copies. SimHashes are split into bands stored in
+an indexed table, so candidates are found with a few lookups rather than a
+scan (two hashes within DEDUP_MAX_DISTANCE bits always share a band when
+there are more bands than allowed differing bits).
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from app.utils.url_utils import normalize_url
+from app.config.settings import (
+    DEDUP_ENABLED,
+    DEDUP_PATH,
+    DEDUP_MAX_DISTANCE,
+    DEDUP_MIN_CHARS
+)
+
+_WORD = re.compile(r'\w+')
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+
+def normalize_text(text):
+    """Lowercase words only, so markup, punctuation and spacing differences vanish."""
+    return " ".join(_WORD.findall((text or "").lower()))
+
+def content_hash(normalized_text):
+    return hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+
+def _hash64(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+def simhash(normalized_text, shingle_size=SHINGLE_SIZE):
+    """64-bit SimHash of the word shingles of normalized_text."""
+    words = normalized_text.split()
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = _hash64(shingle)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(SIMHASH_BITS) if weights[bit] > 0)
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+def _to_signed(value):
+    """SQLite integers are signed 64-bit."""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def _from_signed(value):
+    return value + (1 << 64) if value < 0 else value
+
+class DedupIndex:
+    """Persistent index of researched pages by URL, content hash and SimHash bands."""
+
+    def __init__(self, path, max_distance=DEDUP_MAX_DISTANCE, min_chars=DEDUP_MIN_CHARS):
+        self.max_distance = max_distance
+        self.min_chars = min_chars
+        # More bands than allowed differing bits guarantees a shared band
+        self.bands = max_distance + 1
+        self.band_bits = SIMHASH_BITS // self.bands
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id INTEGER PRIMARY KEY, url TEXT NOT NULL, content_hash TEXT, simhash INTEGER, added_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS documents_hash ON documents (content_hash)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS urls (normalized_url TEXT PRIMARY KEY, document_id INTEGER NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            " band INTEGER NOT NULL, value INTEGER NOT NULL, document_id INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS bands_lookup ON bands (band, value)")
+
+    def _band_values(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(band, fingerprint >> (band * self.band_bits) & mask) for band in range(self.bands)]
+
+    def _match(self, document_id, kind, distance=0):
+        url = self._conn.execute("SELECT url FROM documents WHERE id = ?", (document_id,)).fetchone()[0]
+        return {"url": url, "kind": kind, "distance": distance}
+
+    def find_url(self, url):
+        """The indexed page a URL (or one of its variants) was already researched as."""
+        normalized = normalize_url(url)
+        if normalized is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT document_id FROM urls WHERE normalized_url = ?", (normalized,)
+            ).fetchone()
+            return self._match(row[0], "url") if row else None
+
+    def find_content(self, text):
+        """
+        The indexed page whose text matches text exactly or within max_distance bits.
+
+        Texts shorter than min_chars are never matched: empty or stub pages
+        would otherwise all look alike.
+        """
+        normalized = normalize_text(text)
+        if len(normalized) < self.min_chars:
+            return None
+        digest = content_hash(normalized)
+        fingerprint = simhash(normalized)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id FROM documents WHERE content_hash = ? LIMIT 1", (digest,)
+            ).fetchone()
+            if row:
+                return self._match(row[0], "exact")
+
+            best = None
+            for band, value in self._band_values(fingerprint):
+                for document_id, candidate in self._conn.execute(
+                    "SELECT d.id, d.simhash FROM bands b JOIN documents d ON d.id = b.document_id"
+                    " WHERE b.band = ? AND b.value = ?", (band, value)
+                ):
+                    distance = hamming_distance(fingerprint, _from_signed(candidate))
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (document_id, distance)
+            return self._match(best[0], "near", best[1]) if best else None
+
+    def add(self, url, text):
+        """
+        Index a researched page under its URL and content.
+
+        A page indexed before under the same URL has its entry replaced (its
+        aliases keep pointing at it); a URL that was an alias of another page
+        gets an entry of its own.
+        """
+        normalized = normalize_text(text)
+        indexable = len(normalized) >= self.min_chars
+        digest = content_hash(normalized) if indexable else None
+        fingerprint = simhash(normalized) if indexable else None
+        values = (url, digest, _to_signed(fingerprint) if indexable else None, time.time())
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                document_id = self._own_document(url)
+                if document_id is None:
+                    document_id = self._conn.execute(
+                        "INSERT INTO documents (url, content_hash, simhash, added_at) VALUES (?, ?, ?, ?)", values
+                    ).lastrowid
+                else:
+                    self._conn.execute(
+                        "UPDATE documents SET url = ?, content_hash = ?, simhash = ?, added_at = ? WHERE id = ?",
+                        values + (document_id,)
+                    )
+                    self._conn.execute("DELETE FROM bands WHERE document_id = ?", (document_id,))
+                if indexable:
+                    self._conn.executemany(
+                        "INSERT INTO bands (band, value, document_id) VALUES (?, ?, ?)",
+                        [(band, value, document_id) for band, value in self._band_values(fingerprint)]
+                    )
+                self._add_url(url, document_id)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def add_alias(self, url, canonical_url):
+        """Record that url is another address of the already indexed canonical_url."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT document_id FROM urls WHERE normalized_url = ?", (normalize_url(canonical_url),)
+            ).fetchone()
+            if row:
+                self._add_url(url, row[0])
+
+    def _own_document(self, url):
+        """Id of the entry indexed under url itself (not as an alias of another page), or None."""
+        normalized = normalize_url(url)
+        if normalized is None:
+            return None
+        row = self._conn.execute(
+            "SELECT d.id, d.url FROM urls u JOIN documents d ON d.id = u.document_id WHERE u.normalized_url = ?",
+            (normalized,)
+        ).fetchone()
+        return row[0] if row and normalize_url(row[1]) == normalized else None
+
+    def _add_url(self, url, document_id):
+        normalized = normalize_url(url)
+        if normalized is not None:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO urls (normalized_url, document_id) VALUES (?, ?)",
+                (normalized, document_id)
+            )
+
+def build_dedup_index():
+    """Open the dedup index, or None if deduplication is disabled."""
+    if not DEDUP_ENABLED:
+        return None
+    try:
+        return DedupIndex(DEDUP_PATH)
+    except Exception as e:
+        print(f"Error opening dedup index: {e}")
+        return None
@@ -0,0 +1,68 @@
+"""
+Background connectivity checks whose last result can be read without blocking.
+"""
+import time
+import threading
+from datetime import datetime
+
+class HealthProbe:
+    """Runs a check function in a background thread and caches its outcome."""
+
+    def __init__(self, name, check, interval):
+        self.name = name
+        self.check = check
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = False
+        self._last_run = None
+        self._status = {
+            "state": "unknown",
+            "detail": "Not checked yet",
+            "latency_ms": None,
+            "checked_at": None
+        }
+
+    def status(self):
+        """Return the cached status, scheduling a refresh when it is stale."""
+        self.refresh()
+        with self._lock:
+            return dict(self._status)
+
+    def refresh(self, force=False):
+        """Start a background check unless one is running or the result is fresh."""
+        with self._lock:
+            if self._running:
+                return
+            if not force and self._last_run is not None and time.monotonic() - self._last_run < self.interval:
+                return
+            self._running = True
+        threading.Thread(target=self._run, name=f"{self.name}-health", daemon=True).start()
+
+    def wait(self, timeout=None):
+        """Block until the running check finishes (used by tests and scripts)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                if not self._running:
+                    return dict(self._status)
+            if deadline is not None and time.monotonic() >= deadline:
+                return self.status()
+            time.sleep(0.01)
+
+    def _run(self):
+        started = time.monotonic()
+        try:
+            detail = self.check()
+            state = "ok"
+        except Exception as e:
+            detail = str(e)
+            state = "error"
+        with self._lock:
+            self._status = {
+                "state": state,
+                "detail": detail or "",
+                "latency_ms": round((time.monotonic() - started) * 1000, 1),
+                "checked_at": datetime.utcnow()
+            }
+            self._last_run = time.monotonic()
+            self._running = False
@@ -0,0 +1,269 @@
+"""
+HTML extraction engines for page titles, meta descriptions, links and article text.
+
+Every engine drives the same streaming collector, which is told which fields
+the caller needs and stops the parse as soon as they are complete: a title
+and description lookup ends at </head> instead of walking the whole page.
+"""
+from html.parser import HTMLParser
+from app.utils.metrics import Metrics
+from app.config.settings import HTML_EXTRACT_ENGINE
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+FIELDS = ("title", "meta_description", "links", "text")
+
+# Elements whose text is never article content
+_SKIPPED = {"script", "style", "noscript", "template", "svg", "iframe", "nav", "header", "footer", "aside", "form", "button", "select"}
+_BLOCKS = {"p", "div", "section", "article", "main", "li", "ul", "ol", "blockquote", "pre", "table", "tr", "td", "th",
+           "h1", "h2", "h3", "h4", "h5", "h6", "figcaption", "dd", "dt", "br", "hr"}
+_HEADINGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+_VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+# Blocks shorter than this (and not headings) are usually bylines, buttons or captions
+MIN_BLOCK_CHARS = 40
+# Blocks where most of the text is inside links are menus and related-article lists
+MAX_LINK_DENSITY = 0.5
+
+class _Done(Exception):
+    """Raised by the collector once every requested field is complete."""
+
+class ExtractionCollector:
+    """
+    Event sink shared by all engines: start/end/data calls in document order.
+
+    The method names follow the lxml parser target interface so the same
+    object can be handed to lxml directly.
+    """
+
+    def __init__(self, fields=FIELDS, max_links=None):
+        self.fields = set(fields)
+        self.max_links = max_links
+        self.title = None
+        self.meta_description = None
+        self.links = []
+        self.blocks = []
+        self._title_parts = None
+        self._anchor = None
+        self._skip_depth = 0
+        self._main_depth = 0
+        self._block = []
+        self._block_link_chars = 0
+        self._block_tag = None
+        self._head_done = False
+
+    def _complete(self):
+        if "title" in self.fields and self.title is None:
+            return False
+        if "meta_description" in self.fields and self.meta_description is None:
+            return False
+        if "links" in self.fields and (self.max_links is None or len(self.links) < self.max_links):
+            return False
+        return "text" not in self.fields
+
+    def _check_done(self):
+        if self._complete():
+            raise _Done()
+
+    def _flush_block(self):
+        text = " ".join("".join(self._block).split())
+        if text:
+            self.blocks.append((text, self._block_link_chars, self._block_tag, self._main_depth > 0))
+        self._block = []
+        self._block_link_chars = 0
+        self._block_tag = None
+
+    def start(self, tag, attrib):
+        tag = tag.lower()
+        if tag == "title" and self.title is None:
+            self._title_parts = []
+        elif tag == "meta" and self.meta_description is None:
+            if (attrib.get("name") or attrib.get("property") or "").lower() in ("description", "og:description"):
+                self.meta_description = attrib.get("content") or ""
+                self._check_done()
+        elif tag == "body":
+            self._end_head()
+        elif tag == "a" and attrib.get("href"):
+            self._anchor = (attrib["href"], [])
+
+        if "text" not in self.fields:
+            return
+        if tag in _SKIPPED:
+            if tag not in _VOID:
+                self._skip_depth += 1
+        elif tag in ("article", "main"):
+            self._flush_block()
+            self._main_depth += 1
+        elif tag in _BLOCKS:
+            self._flush_block()
+            self._block_tag = tag
+
+    def end(self, tag):
+        tag = tag.lower()
+        if tag == "title" and self._title_parts is not None:
+            self.title = " ".join("".join(self._title_parts).split())
+            self._title_parts = None
+            self._check_done()
+        elif tag == "head":
+            self._end_head()
+        elif tag == "a" and self._anchor is not None:
+            href, parts = self._anchor
+            self._anchor = None
+            if "links" in self.fields:
+                self.links.append((href, " ".join("".join(parts).split())))
+                self._check_done()
+
+        if "text" not in self.fields:
+            return
+        if tag in _SKIPPED:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in ("article", "main"):
+            self._flush_block()
+            self._main_depth = max(0, self._main_depth - 1)
+        elif tag in _BLOCKS:
+            self._flush_block()
+
+    def _end_head(self):
+        if self._head_done:
+            return
+        self._head_done = True
+        # A page without a description will not grow one in the body
+        if self.meta_description is None:
+            self.meta_description = ""
+        self._check_done()
+
+    def data(self, text):
+        if self._title_parts is not None:
+            self._title_parts.append(text)
+            return
+        if self._anchor is not None:
+            self._anchor[1].append(text)
+        if "text" in self.fields and self._skip_depth == 0:
+            self._block.append(text)
+            if self._anchor is not None:
+                self._block_link_chars += len(text.strip())
+
+    def close(self):
+        self._flush_block()
+        if self.title is None and self._title_parts is not None:
+            self.title = " ".join("".join(self._title_parts).split())
+
+    def article_text(self):
+        """Join the content blocks, dropping short fragments and link-heavy navigation."""
+        blocks = self.blocks
+        main_blocks = [block for block in blocks if block[3]]
+        if sum(len(block[0]) for block in main_blocks) >= MIN_BLOCK_CHARS * 3:
+            blocks = main_blocks
+        kept = []
+        for text, link_chars, tag, _ in blocks:
+            if link_chars > MAX_LINK_DENSITY * len(text):
+                continue
+            if len(text) < MIN_BLOCK_CHARS and tag not in _HEADINGS:
+                continue
+            kept.append(text)
+        return "\n\n".join(kept)
+
+    def result(self):
+        result = {}
+        if "title" in self.fields:
+            result["title"] = self.title or ""
+        if "meta_description" in self.fields:
+            result["meta_description"] = self.meta_description or ""
+        if "links" in self.fields:
+            result["links"] = self.links[:self.max_links] if self.max_links else self.links
+        if "text" in self.fields:
+            result["text"] = self.article_text()
+        return result
+
+class _StdlibParser(HTMLParser):
+    """Adapts html.parser callbacks to the collector."""
+
+    def __init__(self, collector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+
+    def handle_starttag(self, tag, attrs):
+        self.collector.start(tag, {name: value or "" for name, value in attrs})
+        if tag in _VOID:
+            self.collector.end(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.collector.start(tag, {name: value or "" for name, value in attrs})
+        self.collector.end(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in _VOID:
+            self.collector.end(tag)
+
+    def handle_data(self, data):
+        self.collector.data(data)
+
+def _run_stdlib(html, collector):
+    parser = _StdlibParser(collector)
+    try:
+        parser.feed(html)
+        parser.close()
+    except _Done:
+        return
+    collector.close()
+
+# lxml reports target exceptions only after a feed() call returns, so the
+# document is fed in chunks to let an early stop skip the rest of the page
+_LXML_CHUNK = 8192
+
+def _run_lxml(html, collector):
+    parser = etree.HTMLParser(target=collector, recover=True, no_network=True)
+    try:
+        for offset in range(0, len(html), _LXML_CHUNK):
+            parser.feed(html[offset:offset + _LXML_CHUNK])
+        parser.close()
+    except _Done:
+        return
+
+def _run_bs4(html, collector):
+    """Reference engine: full BeautifulSoup tree, replayed into the collector."""
+    from bs4 import BeautifulSoup
+    from bs4.element import Tag, NavigableString, Comment
+
+    def walk(node):
+        for child in node.children:
+            if isinstance(child, Tag):
+                collector.start(child.name, {key: " ".join(value) if isinstance(value, list) else value
+                                             for key, value in child.attrs.items()})
+                walk(child)
+                collector.end(child.name)
+            elif isinstance(child, NavigableString) and not isinstance(child, Comment):
+                collector.data(str(child))
+
+    try:
+        walk(BeautifulSoup(html, "html.parser"))
+    except _Done:
+        return
+    collector.close()
+
+ENGINES = {"stdlib": _run_stdlib, "bs4": _run_bs4}
+if etree is not None:
+    ENGINES["lxml"] = _run_lxml
+
+def default_engine():
+    """The configured engine, or the fastest installed one for "auto"."""
+    if HTML_EXTRACT_ENGINE in ENGINES:
+        return HTML_EXTRACT_ENGINE
+    return "lxml" if "lxml" in ENGINES else "stdlib"
+
+def extract_page(html, fields=FIELDS, max_links=None, engine=None):
+    """
+    Extract the requested fields from an HTML document.
+
+    fields is any subset of "title", "meta_description", "links" and "text".
+    links are (href, anchor text) pairs in document order, capped at max_links.
+    text is the article body with scripts, navigation and link lists removed.
+    """
+    collector = ExtractionCollector(fields, max_links)
+    engine = engine or default_engine()
+    with Metrics().timer("mclg_parse_seconds", engine=engine):
+        ENGINES[engine](html, collector)
+    return collector.result()
@@ -0,0 +1,209 @@
+"""
+Shared HTTP fetcher for web scraping with connection pooling and a revalidating page cache.
+"""
+import os
+import re
+import time
+import zlib
+import sqlite3
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.utils.metrics import Metrics
+from app.config.settings import (
+    FETCH_CACHE_PATH,
+    FETCH_CACHE_MAX_ENTRIES,
+    FETCH_CACHE_FRESH_SECONDS,
+    FETCH_MAX_PER_HOST,
+    FETCH_POOL_HOSTS,
+    FETCH_TIMEOUT,
+    FETCH_USER_AGENT
+)
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+
+def freshness_lifetime(headers):
+    """Seconds a response may be reused without revalidation."""
+    cache_control = headers.get("Cache-Control", "").lower()
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return 0
+    match = _MAX_AGE.search(cache_control)
+    if match:
+        return int(match.group(1))
+    return FETCH_CACHE_FRESH_SECONDS
+
+class PageCache:
+    """On-disk store of fetched pages with zlib-compressed bodies."""
+
+    def __init__(self, path, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY, final_url TEXT, status INTEGER, etag TEXT,"
+            " last_modified TEXT, content_type TEXT, encoding TEXT, body BLOB,"
+            " fresh_until REAL, stored_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS pages_stored ON pages (stored_at)")
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT final_url, status, etag, last_modified, content_type, encoding, body, fresh_until"
+                " FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "final_url": row[0],
+            "status": row[1],
+            "etag": row[2],
+            "last_modified": row[3],
+            "content_type": row[4],
+            "encoding": row[5],
+            "body": zlib.decompress(row[6]),
+            "fresh_until": row[7]
+        }
+
+    def put(self, url, entry):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url, entry["final_url"], entry["status"], entry["etag"],
+                    entry["last_modified"], entry["content_type"], entry["encoding"],
+                    zlib.compress(entry["body"], 6), entry["fresh_until"], now
+                )
+            )
+            excess = self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM pages WHERE url IN ("
+                    " SELECT url FROM pages ORDER BY stored_at ASC LIMIT ?)",
+                    (excess,)
+                )
+
+    def touch(self, url, fresh_until):
+        """Mark a cached page as revalidated."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET fresh_until = ?, stored_at = ? WHERE url = ?",
+                (fresh_until, time.time(), url)
+            )
+
+class PageFetcher:
+    """Pooled HTTP session shared by all scraping code."""
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(PageFetcher, cls).__new__(cls)
+            cls._instance.initialize_fetcher()
+        return cls._instance
+
+    def initialize_fetcher(self):
+        """Create the pooled session and open the page cache."""
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": FETCH_USER_AGENT,
+            "Accept-Encoding": "gzip, deflate"
+        })
+        # pool_block caps concurrent connections per host instead of opening extras
+        adapter = HTTPAdapter(
+            pool_connections=FETCH_POOL_HOSTS,
+            pool_maxsize=FETCH_MAX_PER_HOST,
+            pool_block=True,
+            max_retries=Retry(
+                total=2,
+                backoff_factor=0.5,
+                status_forcelist=[502, 503, 504],
+                allowed_methods=["GET", "HEAD"]
+            )
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        try:
+            self.cache = PageCache(FETCH_CACHE_PATH, FETCH_CACHE_MAX_ENTRIES)
+        except Exception as e:
+            print(f"Error opening page cache: {e}")
+            self.cache = None
+
+        self.stats = {"requests": 0, "cache_fresh": 0, "not_modified": 0, "downloads": 0, "bytes_downloaded": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _page(self, url, entry, from_cache):
+        """Build the page dictionary returned to callers from a cache entry."""
+        return {
+            "url": entry["final_url"] or url,
+            "status": entry["status"],
+            "content_type": entry["content_type"],
+            "content": entry["body"],
+            "text": entry["body"].decode(entry["encoding"] or "utf-8", errors="replace"),
+            "from_cache": from_cache
+        }
+
+    def fetch(self, url, timeout=FETCH_TIMEOUT, use_cache=True):
+        """
+        Fetch a page, reusing the cached copy when it is fresh or unchanged.
+
+        Stale cached pages are revalidated with If-None-Match/If-Modified-Since,
+        so an unchanged page costs one round trip without a body.
+        """
+        with Metrics().timer("mclg_fetch_seconds", outcome="error") as labels:
+            page = self._fetch(url, timeout, use_cache)
+            labels["outcome"] = "cache" if page["from_cache"] else "download"
+            return page
+
+    def _fetch(self, url, timeout, use_cache):
+        entry = self.cache.get(url) if use_cache and self.cache is not None else None
+        if entry is not None and entry["fresh_until"] > time.time():
+            self._count("cache_fresh")
+            return self._page(url, entry, from_cache=True)
+
+        headers = {}
+        if entry is not None:
+            if entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        self._count("requests")
+        response = self.session.get(url, headers=headers, timeout=timeout)
+
+        if response.status_code == 304 and entry is not None:
+            self._count("not_modified")
+            self.cache.touch(url, time.time() + freshness_lifetime(response.headers))
+            return self._page(url, entry, from_cache=True)
+
+        self._count("downloads")
+        self._count("bytes_downloaded", len(response.content))
+        entry = {
+            "final_url": response.url,
+            "status": response.status_code,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "content_type": response.headers.get("Content-Type", ""),
+            "encoding": response.encoding or response.apparent_encoding,
+            "body": response.content,
+            "fresh_until": time.time() + freshness_lifetime(response.headers)
+        }
+        storable = "no-store" not in response.headers.get("Cache-Control", "").lower()
+        if self.cache is not None and response.status_code == 200 and storable:
+            self.cache.put(url, entry)
+        return self._page(url, entry, from_cache=False)
+
+    def get_stats(self):
+        with self._stats_lock:
+            return dict(self.stats)
@@ -0,0 +1,590 @@
+"""
+Embedded SQLite storage with the subset of the PyMongo collection API the app uses.
+
+Each collection is a table of (id, doc) rows holding documents as JSON.
+Dates and ObjectIds are stored as tagged strings that sort in the same order
+as the original values, so filters, sorts and indexes on them work in plain
+SQL through json_extract. Ascending/descending indexes become SQLite
+expression indexes, text indexes are kept as metadata and matched with LIKE,
+and TTL indexes are enforced by purging expired rows on write. Batches of
+writes (insert_many, bulk_write) run in a single transaction.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany
+from pymongo.errors import DuplicateKeyError, BulkWriteError, OperationFailure
+from pymongo.results import InsertOneResult, InsertManyResult, UpdateResult, DeleteResult, BulkWriteResult
+
+# Tags start with a control character no ordinary text begins with (SQLite
+# truncates strings at NUL, so that one cannot be used)
+_TAG = "\x01"
+_DATE_TAG = _TAG + "date:"
+_OID_TAG = _TAG + "oid:"
+
+DUPLICATE_KEY_ERROR = 11000
+INDEX_OPTIONS_CONFLICT = 85
+
+# Seconds between TTL purges of a collection
+TTL_PURGE_INTERVAL = 60
+
+def encode_value(value):
+    """Convert a document value into JSON-safe data that keeps its sort order."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return _DATE_TAG + value.isoformat(timespec="microseconds")
+    if isinstance(value, ObjectId):
+        return _OID_TAG + str(value)
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    return value
+
+def decode_value(value):
+    if isinstance(value, str) and value.startswith(_TAG):
+        if value.startswith(_DATE_TAG):
+            return datetime.fromisoformat(value[len(_DATE_TAG):])
+        if value.startswith(_OID_TAG):
+            return ObjectId(value[len(_OID_TAG):])
+        return value
+    if isinstance(value, dict):
+        return {key: decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def _field_sql(field):
+    """SQL expression reading field (dotted paths allowed) from the doc column."""
+    if field == "_id":
+        return "id"
+    path = "$" + "".join("." + _quote(part) for part in field.split("."))
+    return "json_extract(doc, '" + path.replace("'", "''") + "')"
+
+def _normalize_keys(keys, direction=ASCENDING):
+    if isinstance(keys, str):
+        return [(keys, direction)]
+    return [tuple(key) for key in keys]
+
+def _get_path(document, field):
+    value = document
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def _set_path(document, field, value):
+    parts = field.split(".")
+    for part in parts[:-1]:
+        document = document.setdefault(part, {})
+    document[parts[-1]] = value
+
+def _unset_path(document, field):
+    parts = field.split(".")
+    for part in parts[:-1]:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return
+    document.pop(parts[-1], None)
+
+def apply_update(document, update, inserting=False):
+    """Apply MongoDB update operators to document in place."""
+    for operator, fields in update.items():
+        if operator == "$setOnInsert" and not inserting:
+            continue
+        for field, value in fields.items():
+            if operator in ("$set", "$setOnInsert"):
+                _set_path(document, field, value)
+            elif operator == "$unset":
+                _unset_path(document, field)
+            elif operator == "$inc":
+                _set_path(document, field, (_get_path(document, field) or 0) + value)
+            elif operator in ("$push", "$addToSet"):
+                values = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                current = _get_path(document, field)
+                current = list(current) if isinstance(current, list) else []
+                for item in values:
+                    if operator == "$push" or item not in current:
+                        current.append(item)
+                _set_path(document, field, current)
+            else:
+                raise OperationFailure(f"Unsupported update operator {operator}")
+
+def _projected(document, projection, score=None):
+    if not projection:
+        return document
+    included = {field for field, value in projection.items() if value and not isinstance(value, dict)}
+    excluded = {field for field, value in projection.items() if not value and not isinstance(value, dict)}
+    if included:
+        result = {}
+        if "_id" not in excluded:
+            result["_id"] = document.get("_id")
+        for field in included:
+            value = _get_path(document, field)
+            if value is not None or field in document:
+                _set_path(result, field, value)
+    else:
+        result = {key: value for key, value in document.items() if key not in excluded}
+    for field, value in projection.items():
+        if isinstance(value, dict) and value.get("$meta") == "textScore":
+            result[field] = score or 0.0
+    return result
+
+class LocalCursor:
+    """Lazy query result supporting sort, skip and limit chaining."""
+
+    def __init__(self, collection, query, projection):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort = []
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=ASCENDING):
+        self._sort = _normalize_keys(key_or_list, direction)
+        return self
+
+    def skip(self, count):
+        self._skip = count
+        return self
+
+    def limit(self, count):
+        self._limit = count
+        return self
+
+    def __iter__(self):
+        return iter(self._collection._execute(self._query, self._projection, self._sort, self._skip, self._limit))
+
+class LocalCollection:
+    """One SQLite table behaving like a PyMongo collection."""
+
+    def __init__(self, database, name):
+        self.database = database
+        self.name = name
+        self._table = _quote("c_" + name)
+        self._conn = database._conn
+        self._lock = database._lock
+        self._last_purge = 0.0
+        with self._lock:
+            self._conn.execute(f"CREATE TABLE IF NOT EXISTS {self._table} (id TEXT PRIMARY KEY, doc TEXT NOT NULL)")
+
+    # Query compilation
+
+    def _text_index(self):
+        for spec in self._index_specs().values():
+            if any(direction == "text" for _, direction in spec["key"]):
+                return spec
+        return None
+
+    def _compile(self, query, params):
+        clauses = []
+        for field, condition in query.items():
+            if field in ("$and", "$or", "$nor"):
+                parts = [self._compile(sub, params) for sub in condition] or ["1"]
+                joined = " AND ".join(parts) if field == "$and" else " OR ".join(parts)
+                clauses.append(f"NOT ({joined})" if field == "$nor" else f"({joined})")
+            elif field == "$text":
+                clauses.append(self._compile_text(condition["$search"], params))
+            elif isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition):
+                for operator, value in condition.items():
+                    clauses.append(self._compile_operator(field, operator, value, params))
+            else:
+                clauses.append(self._compile_operator(field, "$eq", condition, params))
+        return " AND ".join(clauses) if clauses else "1"
+
+    def _compile_operator(self, field, operator, value, params):
+        column = _field_sql(field)
+        array_match = f"EXISTS (SELECT 1 FROM json_each(doc, '$.{field}') WHERE json_each.value {{}})" if field != "_id" else None
+        if operator == "$eq":
+            if value is None:
+                return f"{column} IS NULL"
+            if isinstance(value, (dict, list)):
+                params.append(json.dumps(encode_value(value)))
+                return f"{column} = json(?)"
+            params.append(encode_value(value))
+            if not array_match:
+                return f"{column} = ?"
+            # Equality on an array field matches any of its elements
+            params.append(encode_value(value))
+            return f"({column} = ? OR (json_type(doc, '$.{field}') = 'array' AND {array_match.format('= ?')}))"
+        if operator == "$ne":
+            clause = self._compile_operator(field, "$eq", value, params)
+            return f"NOT ({clause})" if value is None else f"NOT COALESCE(({clause}), 0)"
+        if operator in ("$lt", "$lte", "$gt", "$gte"):
+            params.append(encode_value(value))
+            return f"{column} {dict(lt='<', lte='<=', gt='>', gte='>=')[operator[1:]]} ?"
+        if operator in ("$in", "$nin"):
+            values = [encode_value(item) for item in value]
+            if not values:
+                return "0" if operator == "$in" else "1"
+            marks = ", ".join("?" for _ in values)
+            params.extend(values)
+            clause = f"{column} IN ({marks})"
+            if array_match:
+                params.extend(values)
+                clause = f"({clause} OR (json_type(doc, '$.{field}') = 'array' AND {array_match.format('IN (' + marks + ')')}))"
+            return clause if operator == "$in" else f"NOT COALESCE({clause}, 0)"
+        if operator == "$exists":
+            return f"{column} IS {'NOT ' if value else ''}NULL" if field == "_id" else \
+                f"json_type(doc, '$.{field}') IS {'NOT ' if value else ''}NULL"
+        raise OperationFailure(f"Unsupported query operator {operator}")
+
+    def _compile_text(self, search, params):
+        spec = self._text_index()
+        if spec is None:
+            raise OperationFailure("text index required for $text query", code=27)
+        terms = [term.lower() for term in search.split() if term]
+        if not terms:
+            return "0"
+        clauses = []
+        for field, _ in spec["key"]:
+            for term in terms:
+                params.append(f"%{term}%")
+                clauses.append(f"lower({_field_sql(field)}) LIKE ?")
+        return "(" + " OR ".join(clauses) + ")"
+
+    def _text_score(self, document, search):
+        spec = self._text_index()
+        weights = spec.get("weights", {})
+        terms = [term.lower() for term in search.split() if term]
+        score = 0.0
+        for field, _ in spec["key"]:
+            text = str(_get_path(document, field) or "").lower()
+            score += weights.get(field, 1) * sum(text.count(term) for term in terms)
+        return score
+
+    def _execute(self, query, projection, sort, skip, limit):
+        params = []
+        where = self._compile(query, params)
+        search = query.get("$text", {}).get("$search")
+        score_sort = any(isinstance(direction, dict) for _, direction in sort)
+        sql = f"SELECT doc FROM {self._table} WHERE {where}"
+        if sort and not score_sort:
+            sql += " ORDER BY " + ", ".join(
+                f"{_field_sql(field)} {'DESC' if direction == DESCENDING else 'ASC'}" for field, direction in sort
+            )
+        if not score_sort and (limit or skip):
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit or -1, skip])
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        documents = [decode_value(json.loads(row[0])) for row in rows]
+        scores = [self._text_score(document, search) if search else None for document in documents]
+        if score_sort:
+            order = sorted(range(len(documents)), key=lambda i: scores[i], reverse=True)
+            order = order[skip:skip + limit if limit else None]
+            documents, scores = [documents[i] for i in order], [scores[i] for i in order]
+        return [_projected(document, projection, score) for document, score in zip(documents, scores)]
+
+    # Reads
+
+    def find(self, filter=None, projection=None):
+        return LocalCursor(self, filter, projection)
+
+    def find_one(self, filter=None, projection=None, sort=None):
+        cursor = self.find(filter, projection).limit(1)
+        if sort:
+            cursor.sort(sort)
+        return next(iter(cursor), None)
+
+    def count_documents(self, filter=None):
+        params = []
+        where = self._compile(filter or {}, params)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self._table} WHERE {where}", params).fetchone()[0]
+
+    def estimated_document_count(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    # Writes (callers hold the lock and a transaction)
+
+    def _insert(self, document):
+        document.setdefault("_id", ObjectId())
+        encoded = encode_value(document)
+        try:
+            self._conn.execute(
+                f"INSERT INTO {self._table} (id, doc) VALUES (?, ?)",
+                (encoded["_id"], json.dumps(encoded, ensure_ascii=False))
+            )
+        except sqlite3.IntegrityError:
+            raise DuplicateKeyError(f"duplicate key: {document['_id']}", DUPLICATE_KEY_ERROR)
+        return document["_id"]
+
+    def _write(self, document):
+        encoded = encode_value(document)
+        self._conn.execute(
+            f"UPDATE {self._table} SET doc = ? WHERE id = ?",
+            (json.dumps(encoded, ensure_ascii=False), encoded["_id"])
+        )
+
+    def _matching(self, filter, limit=0, sort=None):
+        params = []
+        sql = f"SELECT doc FROM {self._table} WHERE {self._compile(filter or {}, params)}"
+        if sort:
+            sql += " ORDER BY " + ", ".join(
+                f"{_field_sql(field)} {'DESC' if direction == DESCENDING else 'ASC'}" for field, direction in sort
+            )
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return [decode_value(json.loads(row[0])) for row in self._conn.execute(sql, params).fetchall()]
+
+    def _upsert_document(self, filter):
+        """New document seeded with the equality conditions of filter."""
+        document = {}
+        for field, condition in filter.items():
+            if not field.startswith("$") and not (isinstance(condition, dict) and any(k.startswith("$") for k in condition)):
+                _set_path(document, field, condition)
+        return document
+
+    def _update(self, filter, update, upsert, many, replace=False):
+        documents = self._matching(filter, limit=0 if many else 1)
+        for document in documents:
+            if replace:
+                document = dict(update, _id=document["_id"])
+            else:
+                apply_update(document, update)
+            self._write(document)
+        upserted_id = None
+        if not documents and upsert:
+            document = self._upsert_document(filter)
+            if replace:
+                document.update(update)
+            else:
+                apply_update(document, update, inserting=True)
+            upserted_id = self._insert(document)
+        raw = {"n": len(documents) or (1 if upserted_id is not None else 0), "nModified": len(documents)}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return raw
+
+    def _delete(self, filter, many):
+        params = []
+        where = self._compile(filter or {}, params)
+        if not many:
+            where = f"id IN (SELECT id FROM {self._table} WHERE {where} LIMIT 1)"
+        return self._conn.execute(f"DELETE FROM {self._table} WHERE {where}", params).rowcount
+
+    def _purge_expired(self):
+        """Delete documents past the expiry of a TTL index."""
+        now = time.monotonic()
+        if now - self._last_purge < TTL_PURGE_INTERVAL:
+            return
+        self._last_purge = now
+        for spec in self._index_specs().values():
+            if "expireAfterSeconds" in spec and len(spec["key"]) == 1:
+                field = spec["key"][0][0]
+                cutoff = datetime.utcnow() - timedelta(seconds=spec["expireAfterSeconds"])
+                self._conn.execute(f"DELETE FROM {self._table} WHERE {_field_sql(field)} < ?", (encode_value(cutoff),))
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work()
+                self._purge_expired()
+                self._conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def insert_one(self, document):
+        return InsertOneResult(self._transaction(lambda: self._insert(document)), True)
+
+    def insert_many(self, documents, ordered=True):
+        documents = list(documents)
+
+        def work():
+            inserted, errors = [], []
+            for index, document in enumerate(documents):
+                try:
+                    inserted.append(self._insert(document))
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)})
+                    if ordered:
+                        break
+            return inserted, errors
+
+        inserted, errors = self._transaction(work)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": [], "nInserted": len(inserted)})
+        return InsertManyResult(inserted, True)
+
+    def update_one(self, filter, update, upsert=False):
+        return UpdateResult(self._transaction(lambda: self._update(filter, update, upsert, many=False)), True)
+
+    def update_many(self, filter, update, upsert=False):
+        return UpdateResult(self._transaction(lambda: self._update(filter, update, upsert, many=True)), True)
+
+    def replace_one(self, filter, replacement, upsert=False):
+        return UpdateResult(
+            self._transaction(lambda: self._update(filter, replacement, upsert, many=False, replace=True)), True
+        )
+
+    def find_one_and_update(self, filter, update, projection=None, sort=None, upsert=False):
+        """Update the first match and return it as it was before the update."""
+        def work():
+            documents = self._matching(filter, limit=1, sort=_normalize_keys(sort) if sort else None)
+            if documents:
+                updated = dict(documents[0])
+                apply_update(updated, update)
+                self._write(updated)
+                return documents[0]
+            if upsert:
+                self._update(filter, update, True, many=False)
+            return None
+
+        document = self._transaction(work)
+        return _projected(document, projection) if document is not None else None
+
+    def delete_one(self, filter):
+        return DeleteResult({"n": self._transaction(lambda: self._delete(filter, many=False))}, True)
+
+    def delete_many(self, filter):
+        return DeleteResult({"n": self._transaction(lambda: self._delete(filter, many=True))}, True)
+
+    def bulk_write(self, requests, ordered=True):
+        """Apply InsertOne/UpdateOne/... requests in one transaction."""
+        def work():
+            counts = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []}
+            errors = []
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        counts["nInserted"] += 1
+                    elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                        raw = self._update(
+                            request._filter, request._doc, request._upsert,
+                            many=isinstance(request, UpdateMany), replace=isinstance(request, ReplaceOne)
+                        )
+                        counts["nMatched"] += raw["nModified"]
+                        counts["nModified"] += raw["nModified"]
+                        if "upserted" in raw:
+                            counts["nUpserted"] += 1
+                            counts["upserted"].append({"index": index, "_id": raw["upserted"]})
+                    elif isinstance(request, (DeleteOne, DeleteMany)):
+                        counts["nRemoved"] += self._delete(request._filter, many=isinstance(request, DeleteMany))
+                    else:
+                        raise OperationFailure(f"Unsupported bulk request {request!r}")
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)})
+                    if ordered:
+                        break
+            return counts, errors
+
+        counts, errors = self._transaction(work)
+        if errors:
+            raise BulkWriteError(dict(counts, writeErrors=errors, writeConcernErrors=[]))
+        return BulkWriteResult(counts, True)
+
+    # Indexes
+
+    def _index_specs(self):
+        rows = self._conn.execute(
+            "SELECT name, spec FROM _indexes WHERE collection = ?", (self.name,)
+        ).fetchall()
+        specs = {}
+        for name, spec in rows:
+            spec = json.loads(spec)
+            spec["key"] = [tuple(key) for key in spec["key"]]
+            specs[name] = spec
+        return specs
+
+    def create_index(self, keys, name=None, unique=False, **options):
+        keys = _normalize_keys(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        spec = {"key": [list(key) for key in keys]}
+        if unique:
+            spec["unique"] = True
+        spec.update({key: value for key, value in options.items()
+                     if key in ("expireAfterSeconds", "weights", "sparse", "default_language")})
+        with self._lock:
+            existing = self._index_specs()
+            current = existing.get(name)
+            if current is not None:
+                current["key"] = [list(key) for key in current["key"]]
+                if current != spec:
+                    raise OperationFailure(f"Index {name} already exists with different options", code=INDEX_OPTIONS_CONFLICT)
+                return name
+            if any(direction == "text" for _, direction in keys) and self._text_index() is not None:
+                raise OperationFailure("only one text index per collection is allowed", code=INDEX_OPTIONS_CONFLICT)
+            if not any(direction == "text" for _, direction in keys):
+                columns = ", ".join(
+                    f"{_field_sql(field)} {'DESC' if direction == DESCENDING else 'ASC'}" for field, direction in keys
+                )
+                self._conn.execute(
+                    f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {_quote(self.name + '__' + name)}"
+                    f" ON {self._table} ({columns})"
+                )
+            self._conn.execute(
+                "INSERT INTO _indexes (collection, name, spec) VALUES (?, ?, ?)", (self.name, name, json.dumps(spec))
+            )
+        return name
+
+    def drop_index(self, name):
+        with self._lock:
+            self._conn.execute(f"DROP INDEX IF EXISTS {_quote(self.name + '__' + name)}")
+            self._conn.execute("DELETE FROM _indexes WHERE collection = ? AND name = ?", (self.name, name))
+
+    def index_information(self):
+        with self._lock:
+            specs = self._index_specs()
+        information = {"_id_": {"key": [("_id", 1)]}}
+        information.update(specs)
+        return information
+
+class LocalDatabase:
+    """A set of collections in one SQLite file."""
+
+    def __init__(self, path):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS _indexes (collection TEXT, name TEXT, spec TEXT, PRIMARY KEY (collection, name))"
+        )
+        self._collections = {}
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = LocalCollection(self, name)
+            return self._collections[name]
+
+    get_collection = __getitem__
+
+    def command(self, name, *args, **kwargs):
+        if name == "ping":
+            with self._lock:
+                self._conn.execute("SELECT 1")
+            return {"ok": 1.0}
+        raise OperationFailure(f"Unsupported command {name}")
+
+class LocalClient:
+    """Client-shaped wrapper so DatabaseManager can treat both backends alike."""
+
+    def __init__(self, path):
+        self._database = LocalDatabase(path)
+        self.admin = self._database
+
+    def __getitem__(self, name):
+        return self._database
+
+    def close(self):
+        with self._database._lock:
+            self._database._conn.close()
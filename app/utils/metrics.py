@@ -0,0 +1,286 @@
+"""
+Process-wide latency, token and cost metrics.
+
+Timings are kept per series (a metric name plus labels such as model and
+purpose): a running count and sum, and a window of the most recent samples
+from which p50/p95/p99 are computed. Counters accumulate tokens, documents
+and estimated dollars. Everything is in memory and per process; the
+Performance page reads it directly, /metrics on the API service and the
+optional textfile exporter render it in the Prometheus text format.
+"""
+import os
+import time
+import atexit
+import threading
+from collections import deque
+from contextlib import contextmanager
+from app.config.settings import (
+    METRICS_ENABLED,
+    METRICS_WINDOW,
+    METRICS_EXPORT_PATH,
+    METRICS_EXPORT_INTERVAL,
+    PERPLEXITY_PRICING,
+    PERPLEXITY_DEFAULT_PRICING
+)
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+METRIC_HELP = {
+    "mclg_completion_seconds": ("summary", "Duration of model completions, including cache hits and retries"),
+    "mclg_completion_ttft_seconds": ("summary", "Time to the first streamed token of a completion"),
+    "mclg_completion_tokens_total": ("counter", "Tokens used by model completions (cache hits excluded)"),
+    "mclg_completion_cost_dollars_total": ("counter", "Estimated cost of model completions in dollars"),
+    "mclg_fetch_seconds": ("summary", "Duration of page fetches by outcome"),
+    "mclg_parse_seconds": ("summary", "Duration of HTML extraction by engine"),
+    "mclg_db_write_seconds": ("summary", "Duration of batched database writes per collection"),
+    "mclg_db_documents_total": ("counter", "Documents written to the database per collection"),
+    "mclg_single_flight_total": ("counter", "Coalesced model calls by role (leader, follower, other_process)"),
+    "mclg_route_total": ("counter", "Model routing decisions by purpose, chosen model and reason")
+}
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def estimate_cost(model, usage, requests=1):
+    """Estimated dollars for a completion from the configured price list."""
+    price = PERPLEXITY_PRICING.get(model, PERPLEXITY_DEFAULT_PRICING)
+    return (
+        usage.get("prompt_tokens", 0) * price["input"] / 1e6
+        + usage.get("completion_tokens", 0) * price["output"] / 1e6
+        + requests * price["request"]
+    )
+
+class Series:
+    """Count, sum and a window of recent samples of one timed series."""
+
+    def __init__(self, window):
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=window)
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+
+class Metrics:
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Metrics, cls).__new__(cls)
+            cls._instance.initialize_metrics()
+        return cls._instance
+
+    def initialize_metrics(self, enabled=METRICS_ENABLED, window=METRICS_WINDOW):
+        self.enabled = enabled
+        self.window = window
+        self._series = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+        if enabled and METRICS_EXPORT_PATH:
+            self.start_exporter(METRICS_EXPORT_PATH, METRICS_EXPORT_INTERVAL)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name, value, **labels):
+        """Record one sample (usually seconds) of a timed series."""
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Series(self.window)
+            series.add(value)
+
+    def increment(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """
+        Time the body of a with block into a series.
+
+        Yields the labels dict, so the body can fill in labels known only at
+        the end (an outcome or status).
+        """
+        started = time.perf_counter()
+        try:
+            yield labels
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def record_completion(self, model, purpose, seconds, result, ttft=None, cached=False):
+        """Record the latency, tokens and estimated cost of one completion."""
+        status = "error" if "error" in result else "ok"
+        labels = {"model": model, "purpose": purpose or "none"}
+        self.observe("mclg_completion_seconds", seconds, cached=str(cached).lower(), status=status, **labels)
+        if status == "error":
+            return
+        if ttft is not None:
+            self.observe("mclg_completion_ttft_seconds", ttft, cached=str(cached).lower(), **labels)
+        if cached:
+            return
+        usage = result.get("usage") or {}
+        self.increment("mclg_completion_tokens_total", usage.get("prompt_tokens", 0), type="prompt", **labels)
+        self.increment("mclg_completion_tokens_total", usage.get("completion_tokens", 0), type="completion", **labels)
+        self.increment("mclg_completion_cost_dollars_total", estimate_cost(model, usage), **labels)
+
+    def snapshot(self):
+        """
+        Current values: {"series": [{"name", "labels", "count", "sum", "p50",
+        "p95", "p99"}], "counters": [{"name", "labels", "value"}]}.
+        """
+        with self._lock:
+            series = [(key, item.count, item.sum, sorted(item.samples)) for key, item in self._series.items()]
+            counters = list(self._counters.items())
+        return {
+            "series": [
+                dict({"name": name, "labels": dict(labels), "count": count, "sum": total},
+                     **{f"p{round(q * 100)}": percentile(samples, q) for q in QUANTILES})
+                for (name, labels), count, total, samples in sorted(series)
+            ],
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(counters)
+            ]
+        }
+
+    def render_prometheus(self):
+        """The metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described:
+                described.add(name)
+                kind, text = METRIC_HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for item in snapshot["series"]:
+            describe(item["name"])
+            for quantile in QUANTILES:
+                value = item[f"p{round(quantile * 100)}"]
+                lines.append(f"{item['name']}{_labels(item['labels'], quantile=quantile)} {value:.6g}")
+            lines.append(f"{item['name']}_sum{_labels(item['labels'])} {item['sum']:.6g}")
+            lines.append(f"{item['name']}_count{_labels(item['labels'])} {item['count']}")
+        for item in snapshot["counters"]:
+            describe(item["name"])
+            lines.append(f"{item['name']}{_labels(item['labels'])} {item['value']:.6g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Write the metrics file atomically, for the node_exporter textfile collector."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(temporary, path)
+
+    def start_exporter(self, path, interval):
+        """Rewrite path every interval seconds on a daemon thread, and once more at exit."""
+        def run():
+            while True:
+                time.sleep(interval)
+                self._export(path)
+
+        self._exporter = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+        self._exporter.start()
+        atexit.register(self._export, path)
+
+    def _export(self, path):
+        try:
+            self.write_prometheus(path)
+        except OSError as e:
+            print(f"Error writing metrics file: {e}")
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._counters.clear()
+
+def _labels(labels, **extra):
+    items = dict(labels, **{key: str(value) for key, value in extra.items()})
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in items.items()) + "}"
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+class CompletionTimer:
+    """Times one completion call, including the first streamed token."""
+
+    def __init__(self, model, purpose):
+        self.model = model
+        self.purpose = purpose
+        self.started = time.perf_counter()
+        self.first_token = None
+
+    def wrap(self, on_delta):
+        """on_delta wrapped to note when the first token arrives (None stays None)."""
+        if on_delta is None:
+            return None
+
+        def timed(delta):
+            if self.first_token is None:
+                self.first_token = time.perf_counter() - self.started
+            on_delta(delta)
+        return timed
+
+    def finish(self, result, cached=False):
+        Metrics().record_completion(
+            self.model, self.purpose, time.perf_counter() - self.started, result, self.first_token, cached
+        )
+        return result
+
+def completion_rows(snapshot):
+    """
+    One row per model and purpose from a snapshot: calls, cache hits, errors,
+    latency and first-token percentiles, tokens and estimated cost.
+    """
+    rows = {}
+
+    def row(labels):
+        key = (labels["model"], labels["purpose"])
+        if key not in rows:
+            rows[key] = {"model": key[0], "purpose": key[1], "calls": 0, "cached": 0, "errors": 0,
+                         "p50_s": None, "p95_s": None, "p99_s": None, "ttft_p50_s": None,
+                         "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+        return rows[key]
+
+    for item in snapshot["series"]:
+        labels = item["labels"]
+        if item["name"] == "mclg_completion_seconds":
+            entry = row(labels)
+            entry["calls"] += item["count"]
+            if labels.get("status") == "error":
+                entry["errors"] += item["count"]
+            elif labels.get("cached") == "true":
+                entry["cached"] += item["count"]
+            else:
+                entry.update(p50_s=item["p50"], p95_s=item["p95"], p99_s=item["p99"])
+        elif item["name"] == "mclg_completion_ttft_seconds" and labels.get("cached") == "false":
+            row(labels)["ttft_p50_s"] = item["p50"]
+    for item in snapshot["counters"]:
+        labels = item["labels"]
+        if item["name"] == "mclg_completion_tokens_total":
+            row(labels)[f"{labels['type']}_tokens"] += item["value"]
+        elif item["name"] == "mclg_completion_cost_dollars_total":
+            row(labels)["cost_usd"] += item["value"]
+    return list(rows.values())
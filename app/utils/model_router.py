@@ -0,0 +1,205 @@
+"""
+Cost- and latency-aware choice of model for each request.
+
+Every purpose has a route: its configured model followed by faster, cheaper
+fallbacks (MODEL_FALLBACKS). A request starts at the first model its task
+needs (a short page does not need deep research, depth="quick" asks for the
+fastest) and moves along the route past models that cannot take the prompt,
+would exceed the request's latency or cost budget, are saturated, or timed
+out recently. Decisions are kept for inspection and counted in Metrics.
+"""
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from app.utils.metrics import Metrics, estimate_cost
+from app.utils.prompt_packer import prompt_budget
+from app.config.settings import (
+    PERPLEXITY_MODELS,
+    PERPLEXITY_MODEL_CONCURRENCY,
+    PERPLEXITY_DEFAULT_CONCURRENCY,
+    MODEL_FALLBACKS,
+    MODEL_EXPECTED_SECONDS,
+    MODEL_DEFAULT_EXPECTED_SECONDS,
+    ROUTING_ENABLED,
+    ROUTING_DEEP_RESEARCH_MIN_CHARS,
+    ROUTING_LATENCY_BUDGET,
+    ROUTING_COST_BUDGET,
+    ROUTING_TIMEOUT_COOLDOWN,
+    ROUTING_MIN_SAMPLES,
+    ROUTING_HISTORY
+)
+
+DEPTHS = ("quick", "standard", "deep")
+
+# Request fields that override routing (API bodies, batch jobs)
+OVERRIDES = ("model", "depth", "max_seconds", "max_cost")
+
+def routing_options(params, defaults=None):
+    """The routing overrides given in params, on top of defaults."""
+    options = dict(defaults or {})
+    options.update({key: params[key] for key in OVERRIDES if params.get(key) is not None})
+    if options.get("depth") not in (None,) + DEPTHS:
+        raise ValueError(f"Unknown depth: {options['depth']}")
+    return options
+
+def default_routes():
+    """Route per purpose: the configured model, then its fallbacks."""
+    routes = {}
+    for purpose, model in PERPLEXITY_MODELS.items():
+        routes[purpose] = [model] + [m for m in MODEL_FALLBACKS.get(purpose, []) if m != model]
+    return routes
+
+class ModelRouter:
+    """Picks a model from a purpose's route using task features and recent model behaviour."""
+
+    def __init__(self, routes=None, rate_limiter=None, enabled=ROUTING_ENABLED,
+                 latency_budget=ROUTING_LATENCY_BUDGET, cost_budget=ROUTING_COST_BUDGET):
+        self.routes = routes or default_routes()
+        self.rate_limiter = rate_limiter
+        self.enabled = enabled
+        self.latency_budget = latency_budget or None
+        self.cost_budget = cost_budget or None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._latencies = {}
+        self._timed_out_at = {}
+        self._decisions = deque(maxlen=ROUTING_HISTORY)
+
+    def route(self, purpose, prompt_tokens=None, page_chars=None, depth=None, max_seconds=None,
+              max_cost=None, max_tokens=2000, model=None, exclude=()):
+        """
+        Choose the model for one request.
+
+        page_chars is the length of the page being researched, depth one of
+        DEPTHS, max_seconds and max_cost the request's budgets (defaulting to
+        the configured ones) and model an explicit override. Models in exclude
+        (already tried) are passed over. Returns the decision:
+        {"purpose", "model", "reason", "skipped": {model: why}, "features"},
+        where features can be passed back to route the request again.
+        """
+        if purpose not in self.routes:
+            raise ValueError(f"Unknown purpose: {purpose}")
+        candidates = self.routes[purpose]
+        features = {"prompt_tokens": prompt_tokens, "page_chars": page_chars, "depth": depth,
+                    "max_seconds": max_seconds, "max_cost": max_cost, "max_tokens": max_tokens,
+                    "exclude": tuple(exclude)}
+        if model:
+            return self._decide(purpose, model, "override", {}, features)
+        if not self.enabled:
+            return {"purpose": purpose, "model": candidates[0], "reason": "default", "skipped": {}, "features": features}
+
+        start, reason = self._start(purpose, candidates, page_chars, depth)
+        # Prefer faster models after the starting point, then stronger ones before it
+        order = candidates[start:] + candidates[:start][::-1]
+        max_seconds = max_seconds or self.latency_budget
+        max_cost = max_cost or self.cost_budget
+        skipped = {}
+        for candidate in order:
+            if candidate in exclude:
+                skipped[candidate] = "already tried"
+                continue
+            problem = self._problem(candidate, prompt_tokens, max_tokens, max_seconds, max_cost)
+            if problem is None:
+                return self._decide(purpose, candidate, "fallback" if skipped else reason, skipped, features)
+            skipped[candidate] = problem
+        # Nothing fits: the fastest untried model is the least bad choice
+        remaining = [candidate for candidate in candidates if candidate not in exclude] or candidates
+        return self._decide(purpose, remaining[-1], "best effort", skipped, features)
+
+    def _start(self, purpose, candidates, page_chars, depth):
+        """Index of the first model the task needs, and why."""
+        if depth == "quick":
+            return len(candidates) - 1, "quick"
+        if depth == "deep" or len(candidates) == 1:
+            return 0, "default"
+        if purpose == "web" and page_chars is not None and page_chars < ROUTING_DEEP_RESEARCH_MIN_CHARS:
+            return 1, "short page"
+        return 0, "default"
+
+    def _problem(self, model, prompt_tokens, max_tokens, max_seconds, max_cost):
+        """Why model should not take the request, or None."""
+        if prompt_tokens is not None and prompt_tokens > prompt_budget(model):
+            return f"prompt of {prompt_tokens} tokens exceeds its budget"
+        with self._lock:
+            timed_out_at = self._timed_out_at.get(model)
+            in_flight = self._in_flight.get(model, 0)
+        if timed_out_at is not None and time.monotonic() - timed_out_at < ROUTING_TIMEOUT_COOLDOWN:
+            return "timed out recently"
+        if in_flight >= PERPLEXITY_MODEL_CONCURRENCY.get(model, PERPLEXITY_DEFAULT_CONCURRENCY):
+            return f"{in_flight} requests in flight"
+        if self.rate_limiter is not None:
+            stats = self.rate_limiter.get_stats().get(model)
+            if stats and stats["queue_depth"] > 0:
+                return f"{stats['queue_depth']} requests waiting for rate limits"
+        if max_seconds is not None:
+            expected = self.expected_seconds(model)
+            if expected > max_seconds:
+                return f"expected {expected:.0f}s exceeds {max_seconds:.0f}s budget"
+        if max_cost is not None:
+            cost = estimate_cost(model, {"prompt_tokens": prompt_tokens or 0, "completion_tokens": max_tokens})
+            if cost > max_cost:
+                return f"estimated ${cost:.4f} exceeds ${max_cost:.4f} budget"
+        return None
+
+    def _decide(self, purpose, model, reason, skipped, features):
+        decision = {"purpose": purpose, "model": model, "reason": reason, "skipped": skipped, "features": features}
+        with self._lock:
+            self._decisions.append(dict(decision, time=time.time()))
+        Metrics().increment("mclg_route_total", purpose=purpose, model=model, reason=reason)
+        return decision
+
+    def expected_seconds(self, model):
+        """Median of the model's recent completion times, or its configured estimate."""
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) >= ROUTING_MIN_SAMPLES:
+            return samples[len(samples) // 2]
+        return MODEL_EXPECTED_SECONDS.get(model, MODEL_DEFAULT_EXPECTED_SECONDS)
+
+    @contextmanager
+    def track(self, model):
+        """
+        Count a call to model as in flight and record how it went.
+
+        The body stores its result dict in the yielded dict under "result";
+        failed calls do not count towards the model's latency, and timed out
+        ones keep it out of routes for ROUTING_TIMEOUT_COOLDOWN seconds.
+        """
+        outcome = {}
+        started = time.perf_counter()
+        with self._lock:
+            self._in_flight[model] = self._in_flight.get(model, 0) + 1
+        try:
+            yield outcome
+        finally:
+            seconds = time.perf_counter() - started
+            result = outcome.get("result") or {"error": "No result"}
+            with self._lock:
+                self._in_flight[model] -= 1
+                if result.get("timed_out"):
+                    self._timed_out_at[model] = time.monotonic()
+                elif "error" not in result:
+                    self._latencies.setdefault(model, deque(maxlen=ROUTING_HISTORY)).append(seconds)
+
+    def get_stats(self):
+        """Per-model load and latency estimates, and the most recent decisions."""
+        with self._lock:
+            models = {model for route in self.routes.values() for model in route} | set(self._in_flight)
+            in_flight = dict(self._in_flight)
+            timed_out_at = dict(self._timed_out_at)
+            decisions = list(self._decisions)
+        now = time.monotonic()
+        return {
+            "enabled": self.enabled,
+            "routes": self.routes,
+            "models": {
+                model: {
+                    "in_flight": in_flight.get(model, 0),
+                    "expected_seconds": round(self.expected_seconds(model), 2),
+                    "cooling_down": model in timed_out_at and now - timed_out_at[model] < ROUTING_TIMEOUT_COOLDOWN
+                }
+                for model in sorted(models)
+            },
+            "decisions": decisions[::-1]
+        }
@@ -0,0 +1,194 @@
+"""
+Token-budgeted prompt assembly shared by code generation and chat.
+
+A prompt is built from named sections, each with a priority. When the
+sections together exceed the model's budget, the lowest-priority sections
+are shrunk first: truncated to what still fits, or dropped when they cannot
+be cut (a conversation exchange, a retrieved snippet). Required sections are
+never touched. Every prompt comes with a report of the tokens each section
+used, so callers can show and record where the budget went.
+
+Token counts are a local estimate (word pieces and punctuation), close
+enough for budgeting without a tokenizer download or an API call.
+"""
+import re
+from app.config.settings import PROMPT_TOKEN_BUDGETS, PROMPT_DEFAULT_TOKEN_BUDGET
+
+_PIECE = re.compile(r'\w+|[^\w\s]')
+
+# Characters per token inside long words (identifiers, URLs, numbers)
+_WORD_CHARS_PER_TOKEN = 6
+# Fixed overhead of a chat message (role and separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+TRUNCATION_MARKER = "\n[... {} tokens omitted to fit the prompt budget ...]\n"
+
+def estimate_tokens(text):
+    """Approximate token count: one per punctuation mark, one per word plus one per 6 extra letters."""
+    if not text:
+        return 0
+    return sum(1 + (len(piece) - 1) // _WORD_CHARS_PER_TOKEN for piece in _PIECE.findall(text))
+
+def estimate_message_tokens(messages):
+    return sum(estimate_tokens(str(message.get("content", ""))) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+def prompt_budget(model):
+    """Prompt tokens allowed for a model."""
+    return PROMPT_TOKEN_BUDGETS.get(model, PROMPT_DEFAULT_TOKEN_BUDGET)
+
+def truncate_text(text, tokens, keep="head"):
+    """
+    Shorten text to about tokens tokens, cutting at a line break where possible.
+
+    keep="head" keeps the beginning, keep="tail" the end (useful for logs and
+    recent code). The cut is marked in the text.
+    """
+    total = estimate_tokens(text)
+    if total <= tokens:
+        return text
+    marker_tokens = estimate_tokens(TRUNCATION_MARKER.format(total))
+    if tokens <= marker_tokens:
+        return ""
+    target = tokens - marker_tokens
+    characters = max(1, len(text) * target // total)
+    kept = _cut(text, characters, keep)
+    estimate = estimate_tokens(kept)
+    # Tokens are not spread evenly over the characters, so re-cut until it fits
+    while estimate > target and characters > 1:
+        characters = max(1, characters * target // estimate - 1)
+        kept = _cut(text, characters, keep)
+        estimate = estimate_tokens(kept)
+    omitted = total - estimate
+    if keep == "tail":
+        return TRUNCATION_MARKER.format(omitted).lstrip("\n") + kept
+    return kept + TRUNCATION_MARKER.format(omitted).rstrip("\n")
+
+def _cut(text, characters, keep):
+    """The first (or last) characters of text, moved back to a line break when one is close."""
+    if keep == "tail":
+        kept = text[-characters:]
+        newline = kept.find("\n")
+        return kept[newline + 1:] if 0 <= newline < len(kept) // 4 else kept
+    kept = text[:characters]
+    newline = kept.rfind("\n")
+    return kept[:newline] if newline > len(kept) * 3 // 4 else kept
+
+class PromptSection:
+    """
+    One named part of a prompt.
+
+    Higher priority is kept longer. shrink is "truncate" (cut down to what
+    fits, keeping the head or tail) or "drop" (all or nothing); required
+    sections are always kept whole.
+    """
+
+    def __init__(self, name, text, priority=0, required=False, shrink="truncate", keep="head", min_tokens=64,
+                 tokens=None):
+        self.name = name
+        self.text = text or ""
+        self.priority = priority
+        self.required = required
+        self.shrink = shrink
+        self.keep = keep
+        self.min_tokens = min_tokens
+        self.tokens = estimate_tokens(self.text) if tokens is None else tokens
+
+def pack(sections, budget):
+    """
+    Fit sections into budget tokens.
+
+    Returns ({name: text}, report) where dropped sections are left out of the
+    texts and report is {"budget", "total_tokens", "sections": {name:
+    {"tokens", "original_tokens", "action"}}} with action "kept",
+    "truncated" or "dropped".
+    """
+    texts = {section.name: section.text for section in sections}
+    report = {
+        section.name: {"tokens": section.tokens, "original_tokens": section.tokens, "action": "kept"}
+        for section in sections
+    }
+    excess = sum(section.tokens for section in sections) - budget
+
+    # Lowest priority first; among equals, later sections (older history, lower-ranked snippets) go first
+    order = sorted(
+        (section.priority, -position, section) for position, section in enumerate(sections) if not section.required
+    )
+    for _, _, section in order:
+        if excess <= 0:
+            break
+        remaining = section.tokens - excess
+        if section.shrink == "truncate" and remaining >= section.min_tokens:
+            texts[section.name] = truncate_text(section.text, remaining, section.keep)
+            tokens = estimate_tokens(texts[section.name])
+            report[section.name].update(tokens=tokens, action="truncated")
+            excess -= section.tokens - tokens
+        else:
+            del texts[section.name]
+            report[section.name].update(tokens=0, action="dropped")
+            excess -= section.tokens
+
+    total = sum(entry["tokens"] for entry in report.values())
+    return texts, {"budget": budget, "total_tokens": total, "sections": report}
+
+def _exchanges(history):
+    """Split history into exchanges, each a user message and the replies after it."""
+    exchanges = []
+    for message in history:
+        if message["role"] == "user" or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(message)
+    return exchanges
+
+def pack_messages(messages, budget, keep_last=1):
+    """
+    Fit a chat history into budget tokens by dropping the oldest exchanges.
+
+    The system messages and the last keep_last messages are always kept.
+    History is dropped a whole user + assistant exchange at a time, oldest
+    first, so the messages kept are a contiguous run of the newest exchanges
+    starting with a user message and the roles still alternate. Returns
+    (messages, report) in the format of pack, with sections named "system",
+    "history" and "current".
+    """
+    system = [message for message in messages if message["role"] == "system"]
+    conversation = [message for message in messages if message["role"] != "system"]
+    current = conversation[-keep_last:] if keep_last else []
+    history = conversation[:len(conversation) - len(current)]
+
+    exchanges = _exchanges(history)
+    # Replies left without their question (the history was cut mid-exchange) cannot be sent
+    orphaned = exchanges.pop(0) if exchanges and exchanges[0][0]["role"] != "user" else []
+
+    sections = [
+        PromptSection("system", "", required=True, tokens=estimate_message_tokens(system)),
+        PromptSection("current", "", required=True, tokens=estimate_message_tokens(current))
+    ]
+    # Older exchanges have lower priority, so they are always dropped before newer ones
+    turns = [
+        (PromptSection(f"history:{index}", "", priority=-index, shrink="drop",
+                       tokens=estimate_message_tokens(exchange)), exchange)
+        for index, exchange in enumerate(reversed(exchanges))
+    ]
+    texts, report = pack(sections + [section for section, _ in turns], budget)
+
+    kept = [message for section, exchange in reversed(turns) if section.name in texts for message in exchange]
+    history_entries = [report["sections"].pop(section.name) for section, _ in turns]
+    orphaned_tokens = estimate_message_tokens(orphaned)
+    report["sections"]["history"] = {
+        "tokens": sum(entry["tokens"] for entry in history_entries),
+        "original_tokens": sum(entry["original_tokens"] for entry in history_entries) + orphaned_tokens,
+        "action": "truncated" if len(kept) < len(history) else "kept",
+        "messages": len(kept),
+        "dropped_messages": len(history) - len(kept)
+    }
+    return system + kept + current, report
+
+def describe_report(report):
+    """One-line summary of a pack report for display."""
+    parts = []
+    for name, entry in report["sections"].items():
+        part = f"{name} {entry['tokens']}"
+        if entry["action"] != "kept":
+            part += f" ({entry['action']} from {entry['original_tokens']})"
+        parts.append(part)
+    return f"Prompt ~{report['total_tokens']} of {report['budget']} tokens: " + ", ".join(parts)
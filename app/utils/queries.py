@@ -0,0 +1,129 @@
+"""
+Read queries over the stored collections with projections and keyset pagination.
+
+Listings return summaries only ({"items", "next_cursor"}); full documents are
+loaded one at a time with get_document. Pages are ordered newest first on the
+(timestamp, _id) index and continue from an opaque cursor rather than a skip
+count, so every page costs the same however deep the history is.
+"""
+import base64
+from bson import ObjectId, json_util
+from bson.errors import InvalidId
+from app.utils.db_connection import DatabaseManager
+from app.config.settings import COLLECTIONS
+
+# Fields returned by listings, per COLLECTIONS entry
+SUMMARY_FIELDS = {
+    "code": ["task", "model", "timestamp"],
+    "scraping": ["url", "title", "meta_description", "model", "aliases", "timestamp"],
+    "chat": ["user_message", "conversation_id", "model", "timestamp"],
+    "projects": ["project", "kind", "path", "name", "start_line", "end_line", "timestamp"]
+}
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(document):
+    """Opaque cursor pointing just past document in newest-first order."""
+    position = json_util.dumps({"timestamp": document.get("timestamp"), "_id": document["_id"]})
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    position = json_util.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+    return position["timestamp"], position["_id"]
+
+def _collection(collection_key):
+    return DatabaseManager().get_collection(COLLECTIONS[collection_key])
+
+def _projection(collection_key, fields=None):
+    return {field: 1 for field in (fields or SUMMARY_FIELDS[collection_key])}
+
+def _summary(document):
+    """Replace the ObjectId with a string id the UI can hold on to."""
+    summary = dict(document)
+    summary["id"] = str(summary.pop("_id"))
+    return summary
+
+def list_documents(collection_key, limit=DEFAULT_PAGE_SIZE, cursor=None, filter_=None, fields=None):
+    """
+    One newest-first page of summaries from a collection.
+
+    Returns {"items": [...], "next_cursor": str or None}; pass next_cursor
+    back to get the following page.
+    """
+    collection = _collection(collection_key)
+    if collection is None:
+        return {"items": [], "next_cursor": None}
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = filter_ or {}
+    if cursor:
+        timestamp, last_id = decode_cursor(cursor)
+        after_cursor = {"$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": last_id}}
+        ]}
+        query = {"$and": [query, after_cursor]} if query else after_cursor
+
+    # One extra document tells whether another page exists
+    documents = list(
+        collection.find(query, _projection(collection_key, fields))
+        .sort([("timestamp", -1), ("_id", -1)])
+        .limit(limit + 1)
+    )
+    next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+    return {"items": [_summary(document) for document in documents[:limit]], "next_cursor": next_cursor}
+
+def get_document(collection_key, document_id, fields=None):
+    """A single full document (or the given fields of it) by id, or None."""
+    collection = _collection(collection_key)
+    if collection is None:
+        return None
+    try:
+        object_id = ObjectId(document_id)
+    except (InvalidId, TypeError):
+        return None
+    projection = {field: 1 for field in fields} if fields else None
+    document = collection.find_one({"_id": object_id}, projection)
+    return _summary(document) if document else None
+
+def search_documents(collection_key, text, limit=DEFAULT_PAGE_SIZE, fields=None):
+    """Summaries of the documents best matching text in the collection's text index."""
+    collection = _collection(collection_key)
+    if collection is None or not text.strip():
+        return []
+    projection = _projection(collection_key, fields)
+    projection["score"] = {"$meta": "textScore"}
+    documents = (
+        collection.find({"$text": {"$search": text}}, projection)
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(max(1, min(limit, MAX_PAGE_SIZE)))
+    )
+    return [_summary(document) for document in documents]
+
+def list_research(limit=DEFAULT_PAGE_SIZE, cursor=None, url=None):
+    """Research summaries, optionally only those for one URL or its aliases."""
+    filter_ = {"$or": [{"url": url}, {"aliases": url}]} if url else None
+    return list_documents("scraping", limit, cursor, filter_)
+
+def list_generated_code(limit=DEFAULT_PAGE_SIZE, cursor=None, task=None):
+    return list_documents("code", limit, cursor, {"task": task} if task else None)
+
+def list_chat_history(limit=DEFAULT_PAGE_SIZE, cursor=None, conversation_id=None, fields=None):
+    """Chat exchanges (not saved conversation states), optionally of one conversation."""
+    filter_ = {"kind": {"$ne": "conversation"}}
+    if conversation_id:
+        filter_["conversation_id"] = conversation_id
+    return list_documents("chat", limit, cursor, filter_, fields)
+
+def list_conversations(limit=DEFAULT_PAGE_SIZE, cursor=None):
+    """Saved conversations, most recently active first."""
+    return list_documents(
+        "chat", limit, cursor, {"kind": "conversation"}, ["conversation_id", "title", "message_count", "timestamp"]
+    )
+
+def search_research(text, limit=DEFAULT_PAGE_SIZE):
+    return search_documents("scraping", text, limit)
+
+def search_generated_code(text, limit=DEFAULT_PAGE_SIZE):
+    return search_documents("code", text, limit)
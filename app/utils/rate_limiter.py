@@ -0,0 +1,232 @@
+"""
+Client-side rate limiting and retry scheduling for Perplexity API calls.
+"""
+import re
+import time
+import random
+import asyncio
+import threading
+from openai import APIConnectionError, APIStatusError, APITimeoutError
+from app.config.settings import (
+    PERPLEXITY_RATE_LIMITS,
+    PERPLEXITY_DEFAULT_RATE_LIMIT,
+    PERPLEXITY_BACKOFF_BASE,
+    PERPLEXITY_BACKOFF_MAX
+)
+
+# Status codes worth retrying: rate limited, overloaded or transient server errors
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+def parse_duration(value):
+    """Parse header durations such as '20', '1.5s', '6m0s' or '250ms' into seconds."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+def estimate_request_tokens(messages, max_tokens):
+    """Rough token cost of a request used to reserve tokens-per-minute capacity."""
+    characters = sum(len(str(message.get("content", ""))) for message in messages)
+    return characters // 4 + max_tokens
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+    ceiling = min(PERPLEXITY_BACKOFF_MAX, PERPLEXITY_BACKOFF_BASE * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of rejecting callers."""
+
+    def __init__(self, capacity, per_second):
+        self.capacity = float(capacity)
+        self.per_second = float(per_second)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now, rate_factor):
+        refilled = (now - self.updated) * self.per_second * rate_factor
+        self.tokens = min(self.capacity, self.tokens + refilled)
+        self.updated = now
+
+    def reserve(self, amount, now, rate_factor=1.0):
+        """Take amount from the bucket and return how long the caller must wait for it."""
+        self._refill(now, rate_factor)
+        # A request larger than the bucket would never fit, so cap it at a full bucket
+        self.tokens -= min(float(amount), self.capacity)
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / (self.per_second * rate_factor)
+
+    def refund(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+class ModelRateLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one model."""
+
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm, rpm / 60.0)
+        self.tokens = TokenBucket(tpm, tpm / 60.0)
+        # Shrinks when the provider throttles us and recovers on success
+        self.rate_factor = 1.0
+        self.blocked_until = 0.0
+
+    def reserve(self, tokens, now):
+        wait = max(
+            self.requests.reserve(1, now, self.rate_factor),
+            self.tokens.reserve(tokens, now, self.rate_factor)
+        )
+        return max(wait, self.blocked_until - now)
+
+class RateLimiter:
+    """Per-model rate limiter that adapts to the provider's throttling signals."""
+
+    def __init__(self, limits=None, default_limit=None):
+        self.limits = dict(PERPLEXITY_RATE_LIMITS if limits is None else limits)
+        self.default_limit = default_limit or PERPLEXITY_DEFAULT_RATE_LIMIT
+        self._models = {}
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def _model(self, model):
+        limiter = self._models.get(model)
+        if limiter is None:
+            limit = self.limits.get(model, self.default_limit)
+            limiter = ModelRateLimiter(limit["rpm"], limit["tpm"])
+            self._models[model] = limiter
+            self._stats[model] = {
+                "queue_depth": 0,
+                "max_queue_depth": 0,
+                "requests": 0,
+                "waits": 0,
+                "total_wait_seconds": 0.0,
+                "max_wait_seconds": 0.0,
+                "throttled": 0,
+                "retries": 0
+            }
+        return limiter
+
+    def _reserve(self, model, tokens):
+        with self._lock:
+            wait = self._model(model).reserve(tokens, time.monotonic())
+            stats = self._stats[model]
+            stats["requests"] += 1
+            if wait > 0:
+                stats["queue_depth"] += 1
+                stats["max_queue_depth"] = max(stats["max_queue_depth"], stats["queue_depth"])
+        return wait
+
+    def _finish_wait(self, model, wait):
+        with self._lock:
+            stats = self._stats[model]
+            stats["queue_depth"] -= 1
+            stats["waits"] += 1
+            stats["total_wait_seconds"] += wait
+            stats["max_wait_seconds"] = max(stats["max_wait_seconds"], wait)
+
+    def acquire(self, model, tokens):
+        """Block until a request of the given token cost may be sent."""
+        wait = self._reserve(model, tokens)
+        if wait > 0:
+            time.sleep(wait)
+            self._finish_wait(model, wait)
+        return wait
+
+    async def aacquire(self, model, tokens):
+        """Async counterpart of acquire."""
+        wait = self._reserve(model, tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            self._finish_wait(model, wait)
+        return wait
+
+    def record_success(self, model, reserved_tokens, used_tokens=None, headers=None):
+        """Return unused reserved tokens, relax throttling and apply rate-limit headers."""
+        with self._lock:
+            limiter = self._model(model)
+            if used_tokens is not None:
+                limiter.tokens.refund(reserved_tokens - used_tokens)
+            limiter.rate_factor = min(1.0, limiter.rate_factor + 0.05)
+            self._apply_headers(limiter, headers)
+
+    def record_failure(self, model, reserved_tokens):
+        """Return the tokens reserved for a failed attempt; it consumed none upstream."""
+        with self._lock:
+            self._model(model).tokens.refund(reserved_tokens)
+
+    def record_throttle(self, model, retry_after=None, headers=None):
+        """Back off after a 429: halve the send rate and honour Retry-After."""
+        with self._lock:
+            limiter = self._model(model)
+            self._stats[model]["throttled"] += 1
+            limiter.rate_factor = max(0.1, limiter.rate_factor / 2)
+            if retry_after is not None:
+                limiter.blocked_until = max(limiter.blocked_until, time.monotonic() + retry_after)
+            self._apply_headers(limiter, headers)
+
+    def record_retry(self, model):
+        with self._lock:
+            self._model(model)
+            self._stats[model]["retries"] += 1
+
+    def _apply_headers(self, limiter, headers):
+        """Pause the model until its window resets when the provider says none is left."""
+        if not headers:
+            return
+        for kind in ("requests", "tokens"):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            if remaining is None or reset is None:
+                continue
+            try:
+                exhausted = float(remaining) <= 0
+            except ValueError:
+                continue
+            if exhausted:
+                limiter.blocked_until = max(limiter.blocked_until, time.monotonic() + reset)
+
+    def get_stats(self):
+        """Queue depth, wait times and throttling counters per model."""
+        with self._lock:
+            result = {}
+            for model, stats in self._stats.items():
+                snapshot = dict(stats)
+                snapshot["avg_wait_seconds"] = (
+                    stats["total_wait_seconds"] / stats["waits"] if stats["waits"] else 0.0
+                )
+                snapshot["rate_factor"] = self._models[model].rate_factor
+                result[model] = snapshot
+            return result
+
+def retry_after_from(error):
+    """Read the Retry-After delay from an API error's response, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if not headers:
+        return None
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms is not None:
+        return parse_duration(f"{retry_after_ms}ms")
+    return parse_duration(headers.get("retry-after"))
+
+def is_retryable(error):
+    """Whether an API error is transient and worth retrying."""
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES
+    # Timeouts and dropped connections
+    return isinstance(error, APIConnectionError)
+
+def is_timeout(error):
+    """Whether an API error is a request timeout."""
+    return isinstance(error, APITimeoutError)
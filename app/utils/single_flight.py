@@ -0,0 +1,162 @@
+"""
+Single-flight execution of identical in-flight model calls.
+
+The first caller for a key (the leader) makes the call; callers arriving
+with the same key while it runs wait for it and share its result, receiving
+the streamed text on their own thread as it arrives. The call streams only
+when the leader asked for it; followers that want text from a call that did
+not stream get the whole content once it is done.
+
+Across worker processes on one host the leader also holds a file lock named
+after the key. A process that finds the lock taken waits for it and then
+asks recheck() for the result the other process stored (the completion
+cache), making its own call only if there is none. Without fcntl (Windows)
+only calls within one process are coalesced.
+"""
+import os
+import time
+import threading
+from contextlib import contextmanager
+from app.utils.metrics import Metrics
+from app.config.settings import SINGLE_FLIGHT_LOCK_DIR, SINGLE_FLIGHT_WAIT_SECONDS
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Seconds between attempts to take a lock held by another process
+_LOCK_POLL_INTERVAL = 0.05
+
+class _Flight:
+    """An in-flight call: its streamed text so far and, once done, its result."""
+
+    def __init__(self):
+        self.deltas = []
+        self.result = None
+        self.done = False
+        self.changed = threading.Condition()
+
+    def add(self, delta):
+        with self.changed:
+            self.deltas.append(delta)
+            self.changed.notify_all()
+
+    def finish(self, result):
+        with self.changed:
+            self.result = result
+            self.done = True
+            self.changed.notify_all()
+
+    def follow(self, on_delta=None):
+        """Wait for the result, passing the streamed text to on_delta on the calling thread."""
+        position = 0
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.done or len(self.deltas) > position)
+                deltas = self.deltas[position:]
+                done = self.done
+            if on_delta is not None:
+                for delta in deltas:
+                    on_delta(delta)
+                if done and position == 0 and not deltas and "content" in self.result:
+                    # The call did not stream: pass its content in one piece
+                    on_delta(self.result.get("content", ""))
+            position += len(deltas)
+            if done and position >= len(self.deltas):
+                return dict(self.result)
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one."""
+
+    def __init__(self, lock_dir=SINGLE_FLIGHT_LOCK_DIR, wait_seconds=SINGLE_FLIGHT_WAIT_SECONDS):
+        self.lock_dir = lock_dir if fcntl is not None else None
+        self.wait_seconds = wait_seconds
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, function, on_delta=None, recheck=None):
+        """
+        Run function(on_delta) once for all concurrent callers with key.
+
+        function gets a callback for the streamed text when the leader passed
+        on_delta, and None otherwise (so the call need not stream).
+
+        recheck() returns the result another process stored after its call,
+        or None. Returns (result, shared), where shared is False only for the
+        caller whose call actually ran.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            Metrics().increment("mclg_single_flight_total", role="follower")
+            return flight.follow(on_delta), True
+
+        result, shared = {"error": "Coalesced call did not complete"}, False
+        try:
+            result, shared = self._lead(key, flight, function, on_delta, recheck)
+        except Exception as e:
+            print(f"Error in coalesced call: {e}")
+            result = {"error": str(e)}
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.finish(result)
+        Metrics().increment("mclg_single_flight_total", role="other_process" if shared else "leader")
+        return result, shared
+
+    def _lead(self, key, flight, function, on_delta, recheck):
+        def publish(delta):
+            flight.add(delta)
+            if on_delta is not None:
+                on_delta(delta)
+
+        with self._process_lock(key) as waited:
+            if waited and recheck is not None:
+                result = recheck()
+                if result is not None:
+                    publish(result.get("content", ""))
+                    return result, True
+            return function(publish if on_delta is not None else None), False
+
+    @contextmanager
+    def _process_lock(self, key):
+        """Hold the file lock for key; yields whether another process held it first."""
+        if self.lock_dir is None:
+            yield False
+            return
+        os.makedirs(self.lock_dir, exist_ok=True)
+        path = os.path.join(self.lock_dir, f"{key[:40]}.lock")
+        descriptor = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+        locked = waited = False
+        try:
+            deadline = time.monotonic() + self.wait_seconds
+            while True:
+                try:
+                    fcntl.flock(descriptor, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                    break
+                except BlockingIOError:
+                    waited = True
+                    if time.monotonic() >= deadline:
+                        # Give up waiting and make the call; at worst it is made twice
+                        break
+                    time.sleep(_LOCK_POLL_INTERVAL)
+            yield waited
+        finally:
+            if locked:
+                # Removed while still held, so processes already waiting on it
+                # find the stored result and later ones start a fresh lock
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                fcntl.flock(descriptor, fcntl.LOCK_UN)
+            os.close(descriptor)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,30 @@
+"""
+Incremental rendering of streamed model output into a Streamlit placeholder.
+"""
+import time
+
+class StreamRenderer:
+    """Callable that accumulates text deltas and redraws a placeholder."""
+
+    def __init__(self, placeholder, min_interval=0.05, cursor="▌"):
+        self.placeholder = placeholder
+        self.min_interval = min_interval
+        self.cursor = cursor
+        self.parts = []
+        self._last_render = 0.0
+
+    def __call__(self, delta):
+        self.parts.append(delta)
+        # Redrawing on every token floods the websocket, so throttle updates
+        now = time.monotonic()
+        if now - self._last_render >= self.min_interval:
+            self._last_render = now
+            self.placeholder.markdown(self.text + self.cursor)
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def clear(self):
+        """Remove the streamed preview so the final result can replace it."""
+        self.placeholder.empty()
@@ -0,0 +1,61 @@
+"""
+URL normalization helpers shared by the crawler and deduplication.
+"""
+import hashlib
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "mc_cid", "mc_eid", "igshid",
+    "ref", "ref_src", "ref_url", "cmpid", "ncid", "smid", "sr_share", "amp"
+}
+TRACKING_PREFIXES = ("utm_", "ga_", "pk_", "mtm_")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url, base=None):
+    """
+    Return a canonical form of url, or None if it is not an http(s) URL.
+
+    Relative URLs are resolved against base. The scheme and host are
+    lowercased, default ports, fragments and tracking parameters are removed,
+    the remaining query parameters are sorted and AMP path suffixes dropped.
+    """
+    if base:
+        url = urljoin(base, url)
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname.lower()
+    if host.startswith("amp."):
+        host = host[4:]
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+
+    path = parts.path or "/"
+    for suffix in ("/amp/", "/amp"):
+        if path.endswith(suffix):
+            path = path[:-len(suffix)] or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+def url_host(url):
+    """Host part of a URL without a leading www."""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def url_fingerprint(url):
+    """64-bit fingerprint of a normalized URL for compact seen-sets."""
+    return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
@@ -2,14 +2,27 @@
 Web scraping module using Perplexity API with sonar-deep-research.
 """
 import os
-import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-import re
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+from datetime import datetime, timedelta
 from app.utils.api_client import PerplexityClient
+from app.utils.http_fetcher import PageFetcher
+from app.utils.html_extract import extract_page
+from app.utils.citations import parse_citations
 from app.utils.db_connection import DatabaseManager
-from app.config.settings import COLLECTIONS
+from app.utils.dedup import build_dedup_index
+from app.utils.url_utils import normalize_url
+from app.crawler import Crawler
+from app.config.settings import (
+    COLLECTIONS,
+    SCRAPER_FETCH_WORKERS,
+    SCRAPER_BATCH_CONCURRENCY,
+    CRAWL_TOP_K,
+    CACHE_TTL,
+    ROUTING_PAGE_WAIT_SECONDS
+)
+
+# Shared pool for page fetches that overlap with model calls
+_fetch_executor = ThreadPoolExecutor(max_workers=SCRAPER_FETCH_WORKERS, thread_name_prefix="fetch")
 
 class WebScraper:
     def __init__(self):
@@ -19,177 +32,283 @@ class WebScraper:
         self.model = perplexity.get_model("web")  # sonar-deep-research
         
         # Get database collection
-        db_manager = DatabaseManager()
-        self.db = db_manager.get_collection(COLLECTIONS["scraping"])
-    
-    def extract_citations(self, text):
-        """Extract citation information from the response text."""
-        citations = []
-        # Basic regex pattern to find citations like,, etc.
-        citation_pattern = r'$$(\d+)$$'
-        matches = re.findall(citation_pattern, text)
-        
-        # Create unique citation list
-        unique_citations = list(set(matches))
+        self.db_manager = DatabaseManager()
+        self.db = self.db_manager.get_collection(COLLECTIONS["scraping"])
         
-        for citation in unique_citations:
-            # Look for citation details (often at the end of the text)
-            citation_detail_pattern = r'$$' + citation + r'$$(.*?)(?:$$\d+$$|$)'
-            detail_matches = re.findall(citation_detail_pattern, text, re.DOTALL)
+        # Index of researched pages for skipping duplicate research
+        self.dedup = build_dedup_index()
+    
+    def extract_citations(self, text, citations=None, search_results=None):
+        """
+        Extract citation information from the response text.
+
+        citations and search_results are the structured sources returned by
+        the API, used for numbers the report itself does not define.
+        """
+        return parse_citations(text, citations, search_results)
+    
+    def _research_messages(self, url):
+        """Construct prompt for web scraping using sonar-deep-research."""
+        return [
+            {"role": "system", "content": "You are a professional web researcher who provides comprehensive and factual information from websites."},
+            {"role": "user", "content": f"""
+            Please conduct deep research on the content from the website: {url}
+            
+            Provide a comprehensive research report covering:
+            1. A summary of the main content and purpose of the website
+            2. Key topics, themes, and information presented
+            3. Important data points, statistics, or facts
+            4. Sources cited on the page (if any)
+            5. Overall credibility assessment of the information
+            
+            Include appropriate citations for any information you provide.
+            Organize your response with clear headings and structure.
+            """}
+        ]
+    
+    def fetch_metadata(self, url):
+        """Get basic metadata, links and the cleaned article text from the page itself for reference."""
+        try:
+            page = PageFetcher().fetch(url)
+            extracted = extract_page(page['text'])
             
-            if detail_matches:
-                citations.append({
-                    "number": citation,
-                    "details": detail_matches.strip()
-                })
-            else:
-                citations.append({
-                    "number": citation,
-                    "details": "Citation details not found"
-                })
+            title = extracted['title'] or "No title found"
+            meta_description = extracted['meta_description']
+            article_text = extracted['text']
+            
+            # Extract links for reference
+            links = [
+                {'url': href, 'text': text}
+                for href, text in extracted['links'] if href.startswith('http')
+            ][:20]  # Limit to 20 links
+        except Exception as e:
+            title = "Error fetching page metadata"
+            meta_description = f"Error: {str(e)}"
+            links = []
+            article_text = ""
+        
+        return {'title': title, 'meta_description': meta_description, 'links': links, 'article_text': article_text}
+    
+    def _reuse_record(self, url, duplicate):
+        """
+        Copy the stored research of a duplicate page for url, or None if it is
+        not stored or older than the web cache TTL (it is researched again).
+        """
+        if self.db is None:
+            return None
+        try:
+            record = self.db.find_one(
+                {"$or": [{"url": duplicate["url"]}, {"aliases": duplicate["url"]}]},
+                sort=[("timestamp", -1)]
+            )
+        except Exception as e:
+            print(f"Error looking up duplicate research: {e}")
+            return None
+        if record is None:
+            return None
+        max_age = timedelta(seconds=CACHE_TTL["web"])
+        timestamp = record.get('timestamp')
+        if not isinstance(timestamp, datetime) or datetime.utcnow() - timestamp > max_age:
+            return None
         
-        return citations
+        result = {key: value for key, value in record.items() if key not in ("_id", "aliases")}
+        result.update({
+            'url': url,
+            'duplicate_of': record['url'],
+            'duplicate_kind': duplicate["kind"],
+            'cached': True,
+            'timestamp': datetime.utcnow()
+        })
+        return result
+    
+    def _route(self, metadata, pending_metadata, routing):
+        """
+        Pick the research model; short pages do not need deep research.
+
+        The page is usually known already (duplicate detection fetches it);
+        otherwise this waits up to ROUTING_PAGE_WAIT_SECONDS for the fetch,
+        routing without the page length if it takes longer.
+        """
+        routing = dict(routing or {})
+        if metadata is None and ROUTING_PAGE_WAIT_SECONDS > 0 and not routing.get("model") and not routing.get("depth"):
+            try:
+                metadata = pending_metadata.result(timeout=ROUTING_PAGE_WAIT_SECONDS)
+            except TimeoutError:
+                pass
+        if metadata is not None and metadata.get('article_text'):
+            routing.setdefault("page_chars", len(metadata['article_text']))
+        return PerplexityClient().route("web", max_tokens=4000, **routing)
     
-    def scrape_website(self, url):
-        """Scrape website using sonar-deep-research capabilities."""
+    def research(self, url, on_delta=None, use_cache=True, routing=None):
+        """
+        Research a website without saving the result.
+
+        Pages already researched under another URL, or whose text is an exact
+        or near copy of one, reuse the stored research instead of a new model
+        call while it is younger than the web cache TTL (use_cache=False skips
+        this check); an older or missing one is researched again and saved as
+        the original page's new record (marked refreshed). Repeats of the same URL are left to the completion cache,
+        so they are researched again once it expires. Otherwise the page metadata
+        fetch runs in the background while the model call is in flight.
+        routing holds per-request router options (model, depth, max_seconds,
+        max_cost; see ModelRouter.route).
+        """
         try:
             # First, attempt to validate the URL
             if not url.startswith(('http://', 'https://')):
                 url = 'https://' + url
             
-            # Construct prompt for web scraping using sonar-deep-research
-            messages = [
-                {"role": "system", "content": "You are a professional web researcher who provides comprehensive and factual information from websites."},
-                {"role": "user", "content": f"""
-                Please conduct deep research on the content from the website: {url}
-                
-                Provide a comprehensive research report covering:
-                1. A summary of the main content and purpose of the website
-                2. Key topics, themes, and information presented
-                3. Important data points, statistics, or facts
-                4. Sources cited on the page (if any)
-                5. Overall credibility assessment of the information
-                
-                Include appropriate citations for any information you provide.
-                Organize your response with clear headings and structure.
-                """}
-            ]
+            research_url = url
+            metadata = None
+            duplicate = None
+            if self.dedup is not None and use_cache:
+                duplicate = self.dedup.find_url(url)
+                if duplicate is not None and self._same_page(url, duplicate["url"]):
+                    # Asked under the address it was indexed as, the completion cache answers
+                    research_url, duplicate = duplicate["url"], None
+                elif duplicate is None:
+                    # Comparing content needs the page text before the model call
+                    metadata = self.fetch_metadata(url)
+                    duplicate = self.dedup.find_content(metadata['article_text'])
+                if duplicate is not None:
+                    self.dedup.add_alias(url, duplicate["url"])
+                    reused = self._reuse_record(url, duplicate)
+                    if reused is not None:
+                        if on_delta is not None:
+                            on_delta(reused['ai_research'])
+                        return reused
+                    # No fresh record: research the original address again (the completion cache may answer)
+                    research_url = duplicate["url"]
+            
+            pending_metadata = _fetch_executor.submit(self.fetch_metadata, url) if metadata is None else None
+            route = self._route(metadata, pending_metadata, routing)
             
             # Get response from Perplexity
             perplexity = PerplexityClient()
             response = perplexity.generate_completion(
-                model=self.model,  # sonar-deep-research
-                messages=messages,
+                model=route["model"],  # sonar-deep-research unless the page is simple or the model busy
+                messages=self._research_messages(research_url),
                 temperature=0.3,   # Lower temperature for factual reporting
-                max_tokens=4000    # Allow for comprehensive research
+                max_tokens=4000,   # Allow for comprehensive research
+                on_delta=on_delta,
+                purpose="web",
+                use_cache=use_cache,
+                route=route
             )
             
             if "error" in response:
-                return {"error": response["error"]}
+                if pending_metadata is not None:
+                    pending_metadata.cancel()
+                return {"url": url, "error": response["error"]}
             
             content = response["content"]
-            
-            # Extract citations
-            citations = self.extract_citations(content)
-            
-            # Also get basic metadata from the URL for reference
-            try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                }
-                page_response = requests.get(url, headers=headers, timeout=10)
-                soup = BeautifulSoup(page_response.text, 'html.parser')
-                
-                title = soup.title.string if soup.title else "No title found"
-                meta_description = ""
-                description_tag = soup.find("meta", {"name": "description"})
-                if description_tag:
-                    meta_description = description_tag.get("content", "")
-                
-                # Extract links for reference
-                links = []
-                for link in soup.find_all('a', href=True)[:20]:  # Limit to 20 links
-                    href = link['href']
-                    if href.startswith('http'):
-                        links.append({
-                            'url': href,
-                            'text': link.get_text(strip=True)
-                        })
-            except Exception as e:
-                title = "Error fetching page metadata"
-                meta_description = f"Error: {str(e)}"
-                links = []
+            if metadata is None:
+                metadata = pending_metadata.result()
             
             # Prepare result with Perplexity's research and basic metadata
-            result = {
-                'url': url,
-                'title': title,
-                'meta_description': meta_description,
+            result = {'url': url}
+            result.update(metadata)
+            result.update({
                 'ai_research': content,
-                'citations': citations,
-                'links': links,
+                'citations': self.extract_citations(
+                    content, response.get("citations"), response.get("search_results")
+                ),
                 'model': response["model"],
+                'route_reason': route["reason"],
                 'token_usage': response["usage"],
+                'cached': response.get("cached", False),
                 'timestamp': datetime.utcnow()
-            }
-            
-            # Save to database if connection exists
-            if self.db:
-                self.db.insert_one(result)
+            })
+            if duplicate is not None:
+                result.update({'duplicate_of': duplicate["url"], 'duplicate_kind': duplicate["kind"], 'refreshed': True})
             
+            if self.dedup is not None:
+                # Replaces the page's earlier entry, so a changed page is compared by its new text
+                self.dedup.add(research_url, metadata['article_text'])
             return result
             
         except Exception as e:
             print(f"Error scraping website: {e}")
-            return {"error": str(e)}
+            return {"url": url, "error": str(e)}
+    
+    def scrape_website(self, url, on_delta=None, use_cache=True, routing=None):
+        """
+        Scrape website using sonar-deep-research capabilities.
 
-def render_scraping_ui():
-    """Render the web scraping UI in Streamlit."""
-    st.title("AI Web Research")
+        Pass on_delta to receive the research report incrementally as it streams,
+        use_cache=False to ignore a cached report for the same URL, and routing
+        to override the model choice (see research).
+        """
+        result = self.research(url, on_delta=on_delta, use_cache=use_cache, routing=routing)
+        
+        # Save to database in the background if connection exists
+        if "error" not in result and self.db is not None:
+            self._save(result)
+        
+        return result
     
-    url = st.text_input("Enter URL to research", placeholder="https://example.com")
+    def _same_page(self, url, other_url):
+        return (normalize_url(url) or url) == (normalize_url(other_url) or other_url)
     
-    if st.button("Research Website"):
-        if not url:
-            st.error("Please enter a URL")
-            return
-            
-        with st.spinner("Researching website content... This may take a minute."):
-            scraper = WebScraper()
-            result = scraper.scrape_website(url)
-            
-            if "error" in result:
-                st.error(f"Error: {result['error']}")
-            else:
-                st.success("Research completed!")
-                
-                # Display basic metadata
-                st.subheader(f"Research Results: {result['title']}")
-                
-                # Display AI research
-                st.markdown(result['ai_research'])
-                
-                # Display citations if available
-                if result['citations']:
-                    with st.expander("Citations"):
-                        for citation in result['citations']:
-                            st.write(f"[{citation['number']}] {citation['details']}")
-                
-                # Display extracted links
-                with st.expander("Extracted Links"):
-                    for link in result['links']:
-                        st.write(f"[{link['text']}]({link['url']})")
-                
-                # Token usage information
-                with st.expander("API Usage Information"):
-                    st.write(f"Model used: {result['model']}")
-                    st.write(f"Token usage: {result['token_usage']}")
-                
-                # Save to session state for sharing with chat
-                st.session_state.scraping_context = result['ai_research'][:1000]  # Limit length
-                
-                # Add button to discuss with AI
-                if st.button("Discuss with AI Assistant"):
-                    st.session_state.chat_context = f"Web research content: {result['ai_research'][:1000]}"
-                    st.session_state.nav_option = "Chat Assistant"
-                    st.experimental_rerun()
+    def _save(self, result):
+        """Queue a research result for the write-behind writer."""
+        if result.get("refreshed"):
+            # New research of a duplicate's original page becomes that page's record
+            record = {key: value for key, value in result.items()
+                      if key not in ("duplicate_of", "duplicate_kind", "refreshed")}
+            record.update({"url": result["duplicate_of"], "aliases": [result["url"]]})
+            self.db_manager.enqueue_insert(COLLECTIONS["scraping"], record)
+            if "_id" in record:
+                result["_id"] = record["_id"]
+        elif "duplicate_of" in result:
+            if self._same_page(result["url"], result["duplicate_of"]):
+                return
+            # Duplicates only add their address to the existing record
+            self.db_manager.enqueue_update(
+                COLLECTIONS["scraping"], {"url": result["duplicate_of"]}, {"$addToSet": {"aliases": result["url"]}}
+            )
+        else:
+            self.db_manager.enqueue_insert(COLLECTIONS["scraping"], result)
+    
+    def scrape_many(self, urls, concurrency=SCRAPER_BATCH_CONCURRENCY, use_cache=True, routing=None):
+        """
+        Research several URLs concurrently, yielding each result as it finishes.
+
+        At most `concurrency` URLs are researched at once; URLs that normalize
+        to the same address are researched once. Successful results are queued
+        for the write-behind writer as they finish, which batches the inserts,
+        and duplicates of stored pages only add an alias.
+        """
+        unique_urls = {}
+        for url in urls:
+            url = url.strip()
+            if url:
+                unique_urls.setdefault(normalize_url(url) or url, url)
+        
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="scrape")
+        try:
+            futures = [
+                executor.submit(self.research, url, use_cache=use_cache, routing=routing)
+                for url in unique_urls.values()
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                if "error" not in result and self.db is not None:
+                    self._save(result)
+                yield result
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    def crawl_and_research(self, seeds, keywords=None, top_k=CRAWL_TOP_K, concurrency=SCRAPER_BATCH_CONCURRENCY,
+                           use_cache=True, routing=None, **crawl_options):
+        """
+        Crawl outward from seed pages and deep-research only the top_k most relevant articles.
+
+        Returns the ranked crawl candidates and a generator of research results
+        (see scrape_many).
+        """
+        crawler = Crawler(seeds, keywords, **crawl_options)
+        crawler.crawl()
+        articles = crawler.top_articles(top_k)
+        results = self.scrape_many([article["url"] for article in articles], concurrency, use_cache, routing)
+        return articles, results
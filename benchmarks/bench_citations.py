@@ -0,0 +1,58 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Micro-benchmark of citation parsing on the saved reports in benchmarks/fixtures.
+
+Compares the original per-citation rescanning loop with the single-pass
+parser. Run with: python benchmarks/bench_citations.py [repeats]
+"""
+import json
+import os
+import re
+import sys
+import timeit
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.citations import parse_citations
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def legacy_citations(text):
+    """The original extract_citations loop: one full rescan per unique citation number."""
+    citations = []
+    unique_citations = list(set(re.findall(r'\[(\d+)\]', text)))
+    for citation in unique_citations:
+        citation_detail_pattern = r'\[' + citation + r'\](.*?)(?:\[\d+\]|$)'
+        detail_matches = re.findall(citation_detail_pattern, text, re.DOTALL)
+        if detail_matches:
+            citations.append({"number": citation, "details": detail_matches[0].strip()})
+        else:
+            citations.append({"number": citation, "details": "Citation details not found"})
+    return citations
+
+def best_of(function, repeats):
+    return min(timeit.repeat(function, number=1, repeat=repeats)) * 1000
+
+def main(repeats=20):
+    for name in sorted(name for name in os.listdir(FIXTURES) if name.endswith(".md")):
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            text = f.read()
+        sources = {}
+        sidecar = os.path.join(FIXTURES, name[:-3] + ".json")
+        if os.path.exists(sidecar):
+            with open(sidecar, encoding="utf-8") as f:
+                sources = json.load(f)
+
+        legacy = best_of(lambda: legacy_citations(text), repeats)
+        # Regex compilation is part of the legacy cost; clear the cache between runs
+        uncached = best_of(lambda: (re.purge(), legacy_citations(text)), repeats)
+        single_pass = best_of(lambda: parse_citations(text, **sources), repeats)
+        print(f"\n{name} ({len(text) / 1024:.0f} KiB, {len(parse_citations(text, **sources))} citations), best of {repeats}, ms")
+        print(f"  {'legacy loop':<28}{legacy:8.2f}")
+        print(f"  {'legacy loop, cold regexes':<28}{uncached:8.2f}")
+        print(f"  {'single pass':<28}{single_pass:8.2f}   {legacy / single_pass:6.1f}x")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
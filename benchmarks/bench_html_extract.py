@@ -0,0 +1,56 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Micro-benchmark of HTML extraction on the saved pages in benchmarks/fixtures.
+
+Compares the original BeautifulSoup html.parser metadata path with every
+extraction engine, for metadata only (title and description, which can stop
+at </head>), metadata plus the first 20 links, and full article text.
+
+Run with: python benchmarks/bench_html_extract.py [repeats]
+"""
+import os
+import sys
+import timeit
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bs4 import BeautifulSoup
+from app.utils.html_extract import extract_page, ENGINES
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+SCENARIOS = {
+    "metadata": {"fields": ("title", "meta_description")},
+    "metadata+links": {"fields": ("title", "meta_description", "links"), "max_links": 20},
+    "article text": {"fields": ("title", "meta_description", "links", "text")}
+}
+
+def legacy_metadata(html):
+    """The original WebScraper path: a full html.parser soup for three fields."""
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.title.string if soup.title else "No title found"
+    description_tag = soup.find("meta", {"name": "description"})
+    meta_description = description_tag.get("content", "") if description_tag else ""
+    links = [link['href'] for link in soup.find_all('a', href=True)[:20]]
+    return title, meta_description, links
+
+def best_of(function, repeats):
+    return min(timeit.repeat(function, number=1, repeat=repeats)) * 1000
+
+def main(repeats=20):
+    for name in sorted(name for name in os.listdir(FIXTURES) if name.endswith(".html")):
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            html = f.read()
+        print(f"\n{name} ({len(html) / 1024:.0f} KiB), best of {repeats}, ms")
+        baseline = best_of(lambda: legacy_metadata(html), repeats)
+        print(f"  {'legacy bs4 html.parser':<32}{baseline:8.2f}")
+        for scenario, options in SCENARIOS.items():
+            for engine in ENGINES:
+                elapsed = best_of(lambda: extract_page(html, engine=engine, **options), repeats)
+                label = f"{engine} {scenario}"
+                print(f"  {label:<32}{elapsed:8.2f}   {baseline / elapsed:6.1f}x")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,205 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+End-to-end benchmark of research, code generation and chat, fully offline.
+
+The real WebScraper, CodeGenerator and ChatAssistant run against the local
+mock API (benchmarks/mock_perplexity.py), fetch the recorded pages in
+benchmarks/fixtures from it, and write through the write-behind queue into
+an in-memory SQLite store standing in for MongoDB. The completion cache,
+page cache, duplicate detection and client-side rate limits are switched
+off so every request does the full work.
+
+For every operation and concurrency level it reports throughput, latency
+percentiles and time to first token, and writes them as JSON. Passing an
+earlier result file with --compare flags throughput drops and p95 latency
+increases beyond --tolerance and exits with status 1, for use in CI.
+
+Run with: python benchmarks/bench_pipeline.py --profile realistic --output results.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from openai import OpenAI, DefaultHttpxClient
+from mock_perplexity import MockPerplexityServer, PROFILES
+from app.web_scraping import WebScraper
+from app.code_generation import CodeGenerator
+from app.chat_integration import ChatAssistant
+from app.utils.api_client import PerplexityClient
+from app.utils.chat_memory import ConversationMemory
+from app.utils.db_connection import DatabaseManager
+from app.utils.http_fetcher import PageFetcher
+from app.utils.local_storage import LocalClient
+from app.utils.metrics import Metrics, percentile
+from app.utils.rate_limiter import RateLimiter
+from app.config.settings import COLLECTIONS, DB_NAME
+
+OPERATIONS = ("scrape", "codegen", "chat")
+
+EXISTING_CODE = '''
+def load_rows(path):
+    with open(path) as f:
+        return [line.rstrip("\\n").split(",") for line in f]
+'''
+
+def configure(base_url, keep_rate_limits=False):
+    """Point the shared clients at the mock API and an in-memory store."""
+    perplexity = PerplexityClient()
+    perplexity.client = OpenAI(
+        api_key="benchmark", base_url=base_url, max_retries=0,
+        http_client=DefaultHttpxClient(limits=perplexity._connection_limits())
+    )
+    perplexity.cache = None
+    if not keep_rate_limits:
+        perplexity.rate_limiter = RateLimiter(limits={}, default_limit={"rpm": 10 ** 6, "tpm": 10 ** 9})
+
+    database = DatabaseManager()
+    database.storage_backend = "sqlite"
+    database._client = LocalClient(":memory:")
+    database._db = database._client[DB_NAME]
+    database.ensure_indexes()
+
+    PageFetcher().cache = None
+
+def operations(base_url):
+    """name -> function(i, on_delta) returning True on success."""
+    scraper = WebScraper()
+    scraper.dedup = None
+    pages = ("news_article.html", "search_listing.html")
+
+    def scrape(i, on_delta):
+        result = scraper.scrape_website(f"{base_url}/pages/{pages[i % len(pages)]}?n={i}", on_delta=on_delta)
+        return "error" not in result
+
+    def codegen(i, on_delta):
+        result = CodeGenerator().generate_code(
+            "Benchmark project: a CSV reporting tool", EXISTING_CODE, f"Task {i}: add a function that sums column {i}",
+            on_delta=on_delta
+        )
+        return not result.startswith("Error:")
+
+    def chat(i, on_delta):
+        result = ChatAssistant(ConversationMemory()).process_message(f"Question {i}: how do I parse CSV files?", on_delta=on_delta)
+        return not result.startswith("Error:")
+
+    return {"scrape": scrape, "codegen": codegen, "chat": chat}
+
+def run_scenario(operation, concurrency, requests, stream=True):
+    """Run requests calls of operation with concurrency workers and summarize them."""
+    Metrics().reset()
+
+    def call(i):
+        started = time.perf_counter()
+        ok = operation(i, (lambda delta: None) if stream else None)
+        return ok, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(call, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds for _, seconds in outcomes)
+    # Time to first token as measured by the client's own instrumentation
+    first_token = next(
+        (item["p50"] for item in Metrics().snapshot()["series"] if item["name"] == "mclg_completion_ttft_seconds"), None
+    )
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for ok, _ in outcomes if not ok),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 3),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "ttft_p50_ms": round(first_token * 1000, 1) if first_token is not None else None
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline, tolerance):
+    """Regressions of results against baseline: lower throughput or higher p95 beyond tolerance."""
+    previous = {(item["operation"], item["concurrency"]): item for item in baseline["results"]}
+    regressions = []
+    for item in results["results"]:
+        before = previous.get((item["operation"], item["concurrency"]))
+        if before is None:
+            continue
+        if item["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{item['operation']} x{item['concurrency']}: throughput "
+                               f"{before['throughput_rps']} -> {item['throughput_rps']} req/s")
+        if item["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{item['operation']} x{item['concurrency']}: p95 "
+                               f"{before['p95_ms']} -> {item['p95_ms']} ms")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1], formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profile", default="realistic", choices=sorted(PROFILES))
+    parser.add_argument("--operations", default=",".join(OPERATIONS))
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=24, help="Requests per operation and level")
+    parser.add_argument("--no-stream", action="store_true", help="Request whole completions instead of streams")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Apply the configured client-side rate limits")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file")
+    parser.add_argument("--compare", help="Earlier JSON results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.concurrency.split(",")]
+    names = [name.strip() for name in args.operations.split(",")]
+    results = {
+        "meta": {"profile": args.profile, "settings": PROFILES[args.profile], "stream": not args.no_stream,
+                 "commit": git_commit(), "python": platform.python_version(), "timestamp": time.time()},
+        "results": []
+    }
+    with MockPerplexityServer(args.profile, seed=args.seed) as server:
+        configure(server.base_url, args.keep_rate_limits)
+        available = operations(server.base_url)
+        print(f"{args.profile} profile, {args.requests} requests per level", file=sys.stderr)
+        for name in names:
+            available[name](-1, None)  # warm up connections and lazy initialization
+            for level in levels:
+                item = dict(operation=name, **run_scenario(available[name], level, args.requests, not args.no_stream))
+                results["results"].append(item)
+                print(f"  {name:8s} x{level:<3d} {item['throughput_rps']:8.2f} req/s  p50 {item['p50_ms']:8.1f} ms"
+                      f"  p95 {item['p95_ms']:8.1f} ms  ttft {item['ttft_p50_ms']} ms  errors {item['errors']}",
+                      file=sys.stderr)
+        results["meta"]["mock_stats"] = dict(server.stats)
+
+    DatabaseManager().flush_writes(timeout=30)
+    db = DatabaseManager().db
+    results["meta"]["stored"] = {key: db[COLLECTIONS[key]].estimated_document_count() for key in ("scraping", "code", "chat")}
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Local OpenAI-compatible stand-in for the Perplexity API, for offline benchmarks.
+
+Serves POST /chat/completions (plain and streamed), GET /models, and the
+recorded HTML pages in benchmarks/fixtures under /pages/<file>, so a whole
+research request runs without the network. A profile sets the time to first
+token, the token rate, the answer length and the share of requests answered
+with 429 or 500 errors; errors are drawn from a seeded generator so runs are
+repeatable.
+
+Run standalone with: python benchmarks/mock_perplexity.py [profile] [port]
+and point the app at it with PERPLEXITY_BASE_URL=http://127.0.0.1:<port>.
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# first_token: seconds before the first token; tokens_per_second: 0 for no delay
+PROFILES = {
+    "instant": {"first_token": 0.0, "tokens_per_second": 0, "completion_tokens": 200, "error_rate": 0.0, "rate_limit_rate": 0.0},
+    "realistic": {"first_token": 0.25, "tokens_per_second": 400, "completion_tokens": 300, "error_rate": 0.0, "rate_limit_rate": 0.0},
+    "deep-research": {"first_token": 2.0, "tokens_per_second": 80, "completion_tokens": 1200, "error_rate": 0.0, "rate_limit_rate": 0.0},
+    "flaky": {"first_token": 0.25, "tokens_per_second": 400, "completion_tokens": 300, "error_rate": 0.05, "rate_limit_rate": 0.1}
+}
+
+# Tokens sent per streamed chunk
+CHUNK_TOKENS = 4
+
+WORDS = ("the", "pipeline", "report", "exports", "source", "data", "analysis", "model", "result", "function",
+         "returns", "value", "page", "content", "summary", "evidence", "market", "figure", "code", "test")
+
+def mock_answer(messages, tokens):
+    """A deterministic answer of about tokens words for the request."""
+    prompt = messages[-1]["content"] if messages else ""
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+    words = [rng.choice(WORDS) for _ in range(max(0, tokens - 12))]
+    body = " ".join(words)
+    return f"## Mock answer\n\n{body} [1].\n\n```python\ndef mock():\n    return 1\n```\n"
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients closing pooled connections at exit are not errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class MockPerplexityServer:
+    """The mock API on a background thread; use as a context manager or call start/stop."""
+
+    def __init__(self, profile="realistic", host="127.0.0.1", port=0, seed=0, **overrides):
+        self.profile = dict(PROFILES[profile] if isinstance(profile, str) else profile, **overrides)
+        self.rng = random.Random(seed)
+        self.stats = {"completions": 0, "streams": 0, "errors": 0, "rate_limited": 0, "pages": 0}
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-perplexity", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _draw_error(self):
+        """None, or the (status, message) of an injected failure."""
+        with self._lock:
+            draw = self.rng.random()
+        if draw < self.profile["rate_limit_rate"]:
+            return 429, "Rate limit exceeded"
+        if draw < self.profile["rate_limit_rate"] + self.profile["error_rate"]:
+            return 500, "Internal server error"
+        return None
+
+    def _handler_class(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, data, headers=None):
+                body = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                path = urlsplit(self.path).path
+                if path.rstrip("/").endswith("/models"):
+                    self._send_json(200, {"object": "list", "data": [{"id": "sonar-pro", "object": "model"}]})
+                    return
+                name = path[len("/pages/"):] if path.startswith("/pages/") else None
+                if not name or name not in os.listdir(FIXTURES) or not name.endswith(".html"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                mock._count("pages")
+                with open(os.path.join(FIXTURES, name), "rb") as f:
+                    body = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not urlsplit(self.path).path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                error = mock._draw_error()
+                if error is not None:
+                    mock._count("rate_limited" if error[0] == 429 else "errors")
+                    headers = {"Retry-After": "0.1"} if error[0] == 429 else None
+                    self._send_json(error[0], {"error": {"message": error[1], "code": error[0]}}, headers)
+                    return
+                if request.get("stream"):
+                    mock._count("streams")
+                    self._stream(request)
+                else:
+                    mock._count("completions")
+                    self._complete(request)
+
+            def _answer(self, request):
+                profile = mock.profile
+                tokens = min(profile["completion_tokens"], request.get("max_tokens") or profile["completion_tokens"])
+                content = mock_answer(request.get("messages", []), tokens)
+                prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in request.get("messages", []))
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": tokens, "total_tokens": prompt_tokens + tokens}
+                return content, usage
+
+            def _base(self, request, kind):
+                return {"id": "mock-" + hashlib.md5(self.path.encode()).hexdigest()[:8], "object": kind,
+                        "created": int(time.time()), "model": request.get("model", "mock"),
+                        "citations": ["https://example.com/source-1"]}
+
+            def _complete(self, request):
+                content, usage = self._answer(request)
+                time.sleep(mock.profile["first_token"] + self._generation_seconds(usage["completion_tokens"]))
+                data = self._base(request, "chat.completion")
+                data["choices"] = [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}]
+                data["usage"] = usage
+                self._send_json(200, data)
+
+            def _generation_seconds(self, tokens):
+                rate = mock.profile["tokens_per_second"]
+                return tokens / rate if rate else 0.0
+
+            def _write_chunk(self, data):
+                payload = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, request):
+                content, usage = self._answer(request)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(mock.profile["first_token"])
+                words = content.split(" ")
+                for start in range(0, len(words), CHUNK_TOKENS):
+                    piece = " ".join(words[start:start + CHUNK_TOKENS])
+                    if start + CHUNK_TOKENS < len(words):
+                        piece += " "
+                    chunk = self._base(request, "chat.completion.chunk")
+                    chunk["choices"] = [{"index": 0, "delta": {"role": "assistant", "content": piece}, "finish_reason": None}]
+                    self._write_chunk(json.dumps(chunk))
+                    time.sleep(self._generation_seconds(CHUNK_TOKENS))
+                final = self._base(request, "chat.completion.chunk")
+                final["choices"] = [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+                final["usage"] = usage
+                self._write_chunk(json.dumps(final))
+                self._write_chunk("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+def main(profile="realistic", port=8900):
+    with MockPerplexityServer(profile, port=int(port)) as server:
+        print(f"Mock Perplexity API ({profile}) at {server.base_url}; pages at {server.base_url}/pages/<fixture>.html")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
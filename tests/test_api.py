@@ -0,0 +1,121 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the background job manager and the HTTP API service.
+"""
+import unittest
+from unittest.mock import patch
+import threading
+import importlib.util
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.jobs import JobManager
+
+HAS_FLASK = importlib.util.find_spec("flask") is not None
+
+class JobManagerTestCase(unittest.TestCase):
+    def setUp(self):
+        JobManager._instance = None
+        self.manager = JobManager()
+        self.addCleanup(setattr, JobManager, "_instance", None)
+        self.addCleanup(self.manager.shutdown)
+        self.release = threading.Event()
+
+    def blocking_handler(self, params, on_delta):
+        on_delta("partial ")
+        self.release.wait(5)
+        on_delta("answer")
+        return {"answer": params["url"]}
+
+class TestJobManager(JobManagerTestCase):
+    def test_identical_in_flight_jobs_are_coalesced(self):
+        calls = []
+        self.manager.register("research", lambda params, on_delta: calls.append(params) or self.blocking_handler(params, on_delta))
+
+        first, coalesced_first = self.manager.submit("research", {"url": "https://a.example"})
+        second, coalesced_second = self.manager.submit("research", {"url": "https://a.example"})
+        other, _ = self.manager.submit("research", {"url": "https://b.example"})
+        self.release.set()
+        for job in (first, other):
+            self.assertTrue(job.wait(5))
+
+        self.assertIs(first, second)
+        self.assertEqual((coalesced_first, coalesced_second), (False, True))
+        self.assertIsNot(first, other)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(first.result, {"answer": "https://a.example"})
+        self.assertEqual(self.manager.get_stats()["coalesced"], 1)
+        # Once finished, the same request runs again
+        again, coalesced = self.manager.submit("research", {"url": "https://a.example"})
+        self.assertFalse(coalesced)
+        self.assertIsNot(again, first)
+
+    def test_stream_yields_deltas_then_done(self):
+        self.manager.register("research", self.blocking_handler)
+        job, _ = self.manager.submit("research", {"url": "https://a.example"})
+        threading.Timer(0.05, self.release.set).start()
+
+        events = list(job.stream(timeout=5))
+
+        self.assertEqual(events, [("delta", "partial "), ("delta", "answer"), ("done", "succeeded")])
+
+    def test_errors_fail_the_job(self):
+        self.manager.register("research", lambda params, on_delta: {"error": "blocked"})
+        self.manager.register("codegen", lambda params, on_delta: 1 / 0)
+
+        failed, _ = self.manager.submit("research", {"url": "x"})
+        crashed, _ = self.manager.submit("codegen", {"task": "x"})
+
+        self.assertTrue(failed.wait(5) and crashed.wait(5))
+        self.assertEqual((failed.status, failed.error), ("failed", "blocked"))
+        self.assertEqual(crashed.status, "failed")
+        self.assertIn("division", crashed.error)
+        with self.assertRaises(ValueError):
+            self.manager.submit("unknown", {})
+
+@unittest.skipUnless(HAS_FLASK, "Flask is not installed")
+class TestApi(JobManagerTestCase):
+    def setUp(self):
+        super().setUp()
+        from app import api
+        patcher = patch.object(api, "_research_job", self.blocking_handler)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = api.create_app(self.manager).test_client()
+
+    def test_submit_poll_and_stream_research(self):
+        first = self.client.post("/api/research", json={"url": "https://a.example"})
+        second = self.client.post("/api/research", json={"url": "https://a.example"})
+        self.release.set()
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.json["job_id"], second.json["job_id"])
+        self.assertTrue(second.json["coalesced"])
+        job = self.client.get(f"/api/jobs/{first.json['job_id']}?wait=5").json
+        self.assertEqual(job["result"], {"answer": "https://a.example"})
+        events = self.client.get(f"/api/jobs/{first.json['job_id']}/events").get_data(as_text=True)
+        self.assertIn("event: delta", events)
+        self.assertIn("event: done", events)
+
+    def test_validation_and_missing_jobs(self):
+        self.assertEqual(self.client.post("/api/research", json={}).status_code, 400)
+        self.assertEqual(self.client.get("/api/jobs/missing").status_code, 404)
+        self.assertIn("jobs", self.client.get("/api/metrics").json)
+
+    def test_malformed_stream_position_is_rejected(self):
+        job_id = self.client.post("/api/research", json={"url": "https://a.example"}).json["job_id"]
+        self.release.set()
+
+        response = self.client.get(f"/api/jobs/{job_id}/events", headers={"Last-Event-ID": "abc"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.json)
+        response = self.client.get(f"/api/jobs/{job_id}/events?from=abc")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("event: done", response.get_data(as_text=True))
+
+if __name__ == '__main__':
+    unittest.main()
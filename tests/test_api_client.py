@@ -0,0 +1,172 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the Perplexity API client.
+"""
+import asyncio
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils import api_client, rate_limiter
+from app.utils.api_client import PerplexityClient
+from app.utils.single_flight import SingleFlight
+
+def raw(parsed, headers=None):
+    """Wrap a parsed response the way with_raw_response returns it."""
+    response = MagicMock()
+    response.parse.return_value = parsed
+    response.headers = headers or {}
+    return response
+
+def make_response(content="ok", model="sonar-pro"):
+    response = MagicMock()
+    response.choices[0].message.content = content
+    response.model = model
+    response.usage.prompt_tokens = 3
+    response.usage.completion_tokens = 5
+    response.usage.total_tokens = 8
+    return response
+
+class TestAsyncCompletions(unittest.TestCase):
+    def setUp(self):
+        PerplexityClient._instance = None
+        cache_patcher = patch('app.utils.api_client.build_completion_cache', return_value=None)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+        patcher = patch('app.utils.api_client.OpenAI')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PerplexityClient, '_instance', None)
+
+    @patch('app.utils.api_client.AsyncOpenAI')
+    def test_gather_completions_preserves_order(self, mock_async_openai):
+        async def create(model, messages, temperature, max_tokens, stream):
+            await asyncio.sleep(0.01 if messages[0]["content"] == "first" else 0)
+            return raw(make_response(content=messages[0]["content"], model=model))
+
+        mock_async_openai.return_value.chat.completions.with_raw_response.create = create
+
+        batch = [
+            {"model": "sonar-pro", "messages": [{"role": "user", "content": "first"}]},
+            {"model": "sonar-pro", "messages": [{"role": "user", "content": "second"}]}
+        ]
+        results = asyncio.run(PerplexityClient().gather_completions(batch))
+
+        self.assertEqual([r["content"] for r in results], ["first", "second"])
+        self.assertEqual(results[0]["usage"]["total_tokens"], 8)
+        # One pooled async client is shared by the whole batch
+        mock_async_openai.assert_called_once()
+
+    @patch('app.utils.api_client.AsyncOpenAI')
+    def test_model_concurrency_limit(self, mock_async_openai):
+        in_flight = {"now": 0, "peak": 0}
+
+        async def create(model, messages, temperature, max_tokens, stream):
+            in_flight["now"] += 1
+            in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+            await asyncio.sleep(0.01)
+            in_flight["now"] -= 1
+            return raw(make_response(model=model))
+
+        mock_async_openai.return_value.chat.completions.with_raw_response.create = create
+
+        batch = [
+            {"model": "sonar-deep-research", "messages": [{"role": "user", "content": str(i)}]}
+            for i in range(12)
+        ]
+        unlimited = {"sonar-deep-research": {"rpm": 10000, "tpm": 10 ** 9}}
+        with patch.dict(api_client.PERPLEXITY_MODEL_CONCURRENCY, {"sonar-deep-research": 3}), \
+                patch.dict(rate_limiter.PERPLEXITY_RATE_LIMITS, unlimited):
+            results = asyncio.run(PerplexityClient().gather_completions(batch))
+
+        self.assertEqual(len(results), 12)
+        self.assertEqual(in_flight["peak"], 3)
+
+    @patch('app.utils.api_client.AsyncOpenAI')
+    def test_errors_are_returned_not_raised(self, mock_async_openai):
+        async def create(**kwargs):
+            raise RuntimeError("boom")
+
+        mock_async_openai.return_value.chat.completions.with_raw_response.create = create
+
+        result = asyncio.run(PerplexityClient().agenerate_completion(
+            model="sonar-pro", messages=[{"role": "user", "content": "hi"}]
+        ))
+        self.assertEqual(result, {"error": "boom"})
+
+def make_chunk(delta=None, usage=None, model="sonar-pro"):
+    chunk = MagicMock()
+    chunk.model = model
+    chunk.usage = usage
+    if delta is None:
+        chunk.choices = []
+    else:
+        chunk.choices[0].delta.content = delta
+    return chunk
+
+class TestStreamingCompletions(unittest.TestCase):
+    def setUp(self):
+        PerplexityClient._instance = None
+        cache_patcher = patch('app.utils.api_client.build_completion_cache', return_value=None)
+        cache_patcher.start()
+        self.addCleanup(cache_patcher.stop)
+        patcher = patch('app.utils.api_client.OpenAI')
+        self.mock_openai = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PerplexityClient, '_instance', None)
+        # In-process coalescing only, so no lock files are written under DATA_DIR
+        PerplexityClient().single_flight = SingleFlight(lock_dir=None)
+
+    def test_stream_yields_deltas_then_final_record(self):
+        usage = MagicMock(prompt_tokens=4, completion_tokens=2, total_tokens=6)
+        self.create = self.mock_openai.return_value.chat.completions.with_raw_response.create
+        self.create.return_value = raw(iter([
+            make_chunk("Hel"), make_chunk("lo"), make_chunk(usage=usage)
+        ]))
+
+        events = list(PerplexityClient().stream_completion(
+            model="sonar-pro", messages=[{"role": "user", "content": "hi"}]
+        ))
+
+        self.assertEqual(events[:2], [{"delta": "Hel"}, {"delta": "lo"}])
+        self.assertEqual(events[-1]["content"], "Hello")
+        self.assertEqual(events[-1]["usage"]["total_tokens"], 6)
+
+    def test_generate_completion_with_on_delta_streams(self):
+        self.create = self.mock_openai.return_value.chat.completions.with_raw_response.create
+        self.create.return_value = raw(iter([make_chunk("a"), make_chunk("b")]))
+        received = []
+
+        result = PerplexityClient().generate_completion(
+            model="sonar-pro",
+            messages=[{"role": "user", "content": "hi"}],
+            on_delta=received.append
+        )
+
+        self.assertEqual(received, ["a", "b"])
+        self.assertEqual(result["content"], "ab")
+        kwargs = self.create.call_args.kwargs
+        self.assertTrue(kwargs["stream"])
+
+    def test_structured_sources_are_passed_through(self):
+        self.create = self.mock_openai.return_value.chat.completions.with_raw_response.create
+        chunk = make_chunk("a")
+        chunk.citations = ["https://example.com/1"]
+        chunk.search_results = [{"title": "One", "url": "https://example.com/1"}]
+        self.create.return_value = raw(iter([chunk]))
+
+        events = list(PerplexityClient().stream_completion(
+            model="sonar-pro", messages=[{"role": "user", "content": "hi"}]
+        ))
+
+        self.assertEqual(events[-1]["citations"], ["https://example.com/1"])
+        self.assertEqual(events[-1]["search_results"][0]["title"], "One")
+        self.assertNotIn("citations", PerplexityClient()._format_response(make_response()))
+
+if __name__ == '__main__':
+    unittest.main()
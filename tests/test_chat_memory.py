@@ -0,0 +1,96 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for conversation memory compaction and persistence.
+"""
+import unittest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.chat_memory import ConversationMemory
+from app.utils.local_storage import LocalClient
+
+def fake_summarizer(summary, messages):
+    return (summary + " | " if summary else "") + ", ".join(message["content"] for message in messages)
+
+class TestConversationMemory(unittest.TestCase):
+    def setUp(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+        patcher = patch('app.utils.chat_memory.DatabaseManager')
+        self.db_manager = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def memory(self, summarizer=fake_summarizer):
+        return ConversationMemory(recent_turns=2, compact_turns=2, summarizer=summarizer, executor=self.executor)
+
+    def test_prompt_size_stays_bounded(self):
+        memory = self.memory()
+        for turn in range(30):
+            memory.add_exchange(f"q{turn}", f"a{turn}")
+            memory.wait(timeout=5)
+
+        messages = memory.prompt_messages("next")
+        # system + at most (recent + compact) turns + the new message
+        self.assertLessEqual(len(messages), 1 + 2 * (2 + 2) + 1)
+        self.assertEqual(messages[-2]["content"], "a29")
+        self.assertIn("q0", messages[0]["content"])
+        self.assertEqual(memory.summarized_count + len(memory.messages), 60)
+
+    def test_summarization_runs_after_the_response_without_blocking(self):
+        release = threading.Event()
+
+        def slow_summarizer(summary, messages):
+            release.wait(5)
+            return "summary"
+
+        memory = self.memory(slow_summarizer)
+        for turn in range(4):
+            memory.add_exchange(f"q{turn}", f"a{turn}")
+
+        # The exchange was recorded and the prompt is available while summarizing
+        self.assertEqual(len(memory.prompt_messages()), 1 + 8)
+        release.set()
+        memory.wait(timeout=5)
+        self.assertEqual(memory.summary, "summary")
+        self.assertEqual([m["content"] for m in memory.messages], ["q2", "a2", "q3", "a3"])
+
+    def test_failed_summary_keeps_messages(self):
+        memory = self.memory(lambda summary, messages: None)
+        for turn in range(4):
+            memory.add_exchange(f"q{turn}", f"a{turn}")
+        memory.wait(timeout=5)
+        self.assertEqual(len(memory.messages), 8)
+        self.assertEqual(memory.summary, "")
+
+    def test_save_and_restore(self):
+        client = LocalClient(":memory:")
+        self.addCleanup(client.close)
+        collection = client["db"]["chat_history"]
+        self.db_manager.get_collection.return_value = collection
+        self.db_manager.enqueue_update.side_effect = (
+            lambda name, filter_, update, upsert=False: collection.update_one(filter_, update, upsert=upsert)
+        )
+
+        memory = self.memory()
+        memory.set_context("project X")
+        for turn in range(4):
+            memory.add_exchange(f"q{turn}", f"a{turn}")
+        memory.wait(timeout=5)
+        memory.save()
+
+        restored = ConversationMemory.load(memory.conversation_id)
+        self.assertEqual(restored.summary, memory.summary)
+        self.assertEqual(restored.messages, memory.messages)
+        self.assertEqual(restored.prompt_messages("next"), memory.prompt_messages("next"))
+        self.assertEqual(collection.count_documents({"kind": "conversation"}), 1)
+        self.assertIsNone(ConversationMemory.load("missing"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the citation parser.
+"""
+import json
+import unittest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.citations import parse_citations, MISSING_DETAILS
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fixtures')
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+REPORT = """# Oil exports
+Exports rose in March[1][2] while payments lagged [3, 4]. See the ministry data [5](https://gov.example/5).
+
+Sources say talks continue.
+
+1. This numbered list is part of the report
+2. So is this one
+
+## Sources
+1. Reuters - https://reuters.example/a
+2. AP https://ap.example/b
+[4] Ministry statement https://gov.example/c
+"""
+
+class TestParseCitations(unittest.TestCase):
+    def test_inline_markers_and_reference_section(self):
+        citations = {c["number"]: c for c in parse_citations(REPORT)}
+
+        self.assertEqual(list(citations), ["1", "2", "3", "4", "5"])
+        self.assertEqual(citations["1"]["details"], "Reuters - https://reuters.example/a")
+        self.assertEqual(citations["2"]["url"], "https://ap.example/b")
+        self.assertEqual(citations["3"]["details"], MISSING_DETAILS)
+        self.assertEqual(citations["4"]["url"], "https://gov.example/c")
+        self.assertEqual(citations["5"]["url"], "https://gov.example/5")
+
+    def test_structured_sources_fill_missing_details(self):
+        search_results = [{"title": f"Result {n}", "url": f"https://example.com/{n}", "date": "2024-05-01"} for n in range(1, 6)]
+        citations = {c["number"]: c for c in parse_citations(REPORT, search_results=search_results)}
+
+        # Definitions in the report win; the API fills the gaps
+        self.assertEqual(citations["1"]["url"], "https://reuters.example/a")
+        self.assertEqual(citations["3"]["details"], "Result 3 - https://example.com/3 (2024-05-01)")
+
+        citations = parse_citations("Only inline [2].", citations=["https://a.example", "https://b.example"])
+        self.assertEqual(citations, [{"number": "2", "details": "https://b.example", "url": "https://b.example"}])
+
+    def test_report_with_sources_fixture(self):
+        citations = parse_citations(load_fixture("report_with_sources.md"))
+        self.assertEqual(len(citations), 42)
+        self.assertTrue(all(c["url"].startswith("https://") for c in citations))
+        # Numbered lists in the body are not mistaken for references
+        self.assertTrue(citations[0]["url"].endswith("/news/2024/1"))
+
+    def test_report_with_api_sources_fixture(self):
+        sources = json.loads(load_fixture("report_api_sources.json"))
+        citations = parse_citations(load_fixture("report_api_sources.md"), **sources)
+        self.assertEqual(len(citations), 42)
+        self.assertFalse([c for c in citations if c["details"] == MISSING_DETAILS])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the headless batch command line interface.
+"""
+import unittest
+from unittest.mock import patch
+import subprocess
+import tempfile
+import json
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.cli import main, read_jobs
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+class TestBatchCli(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name, lines=()):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as f:
+            f.write("\n".join(lines))
+        return path
+
+    def results(self, path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_read_jobs_accepts_urls_and_json(self):
+        path = self.path("jobs.txt", ["# comment", "https://a.example", "", '{"url": "https://b.example"}', "{bad"])
+        jobs = list(read_jobs(path, "url"))
+
+        self.assertEqual(jobs[0], (2, {"url": "https://a.example"}))
+        self.assertEqual(jobs[1], (4, {"url": "https://b.example"}))
+        self.assertIn("error", jobs[2][1])
+
+    @patch('app.utils.db_connection.DatabaseManager')
+    @patch('app.web_scraping.WebScraper')
+    def test_batch_scrape_writes_jsonl(self, mock_scraper, mock_db):
+        mock_scraper.return_value.scrape_many.side_effect = lambda urls, concurrency, use_cache, routing: (
+            {"url": url, "ai_research": "report"} if "ok" in url else {"url": url, "error": "failed"} for url in urls
+        )
+        source = self.path("urls.txt", ["https://ok.example/a", "https://ok.example/a", "https://bad.example"])
+        output = os.path.join(self.directory.name, "out.jsonl")
+
+        with patch('sys.stderr'):
+            status = main(["batch", "scrape", source, "--workers", "3", "--output", output, "--refresh", "--depth", "quick"])
+
+        self.assertEqual(status, 1)
+        mock_scraper.return_value.scrape_many.assert_called_once_with(
+            ["https://ok.example/a", "https://bad.example"], concurrency=3, use_cache=False, routing={"depth": "quick"}
+        )
+        self.assertEqual([result["url"] for result in self.results(output)], ["https://ok.example/a", "https://bad.example"])
+        mock_db.return_value.flush_writes.assert_called_once()
+
+    @patch('app.utils.db_connection.DatabaseManager')
+    @patch('app.code_generation.CodeGenerator')
+    def test_batch_codegen_runs_tasks(self, mock_generator, mock_db):
+        mock_generator.return_value.generate_code.side_effect = lambda **job: f"```python\n# {job['task']}\n```"
+        mock_generator.return_value.last_prompt_report = None
+        source = self.path("tasks.jsonl", ['{"task": "parse csv", "project": "demo"}', '{"project_context": "no task"}'])
+        output = os.path.join(self.directory.name, "out.jsonl")
+
+        with patch('sys.stderr'):
+            status = main(["batch", "codegen", source, "-w", "2", "-o", output])
+
+        results = sorted(self.results(output), key=lambda result: result["line"])
+        self.assertEqual(status, 1)
+        self.assertEqual(results[0]["code"], "# parse csv\n")
+        self.assertEqual(results[1]["error"], "Missing task")
+        self.assertTrue(mock_generator.return_value.generate_code.call_args.kwargs["retrieve"])
+
+    def test_core_modules_import_without_streamlit(self):
+        code = ("import sys, app.web_scraping, app.code_generation, app.chat_integration, app.cli; "
+                "print('streamlit' in sys.modules)")
+        output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), "False")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,7 @@ Idea founded by Gabriele Iacopo Langellotto
 Unit tests for the code generation module.
 """
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 import sys
 import os
 
@@ -14,13 +14,22 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app.code_generation import CodeGenerator
 
 class TestCodeGeneration(unittest.TestCase):
-    @patch('app.code_generation.OpenAI')
-    @patch('app.code_generation.LLMChain')
-    def test_generate_code(self, mock_llm_chain, mock_openai):
+    @patch('app.code_generation.DatabaseManager')
+    @patch('app.code_generation.PerplexityClient')
+    def test_generate_code(self, mock_client, mock_db_manager):
         # Setup mocks
-        mock_chain = MagicMock()
-        mock_chain.run.return_value = "def hello_world():\n    print('Hello, World!')"
-        mock_llm_chain.return_value = mock_chain
+        mock_perplexity = mock_client.return_value
+        mock_perplexity.get_model.return_value = "sonar-reasoning-pro"
+        mock_perplexity.route.return_value = {"model": "sonar-reasoning-pro", "reason": "default"}
+        # The database manager assigns the id when the record is queued
+        mock_db_manager.return_value.enqueue_insert.side_effect = lambda name, document: bool(
+            document.setdefault("_id", "record-id")
+        )
+        mock_perplexity.generate_completion.return_value = {
+            "content": "```python\ndef hello_world():\n    print('Hello, World!')\n```",
+            "model": "sonar-reasoning-pro",
+            "usage": {"prompt_tokens": 10, "completion_tokens": 12, "total_tokens": 22}
+        }
         
         # Create CodeGenerator instance with mocked dependencies
         code_gen = CodeGenerator()
@@ -36,8 +45,17 @@ class TestCodeGeneration(unittest.TestCase):
         self.assertIsNotNone(result)
         self.assertIn("def hello_world", result)
         
-        # Verify that the LLMChain's run method was called with the expected parameters
-        mock_chain.run.assert_called_once()
+        # Verify that the model was called once with the task in the prompt
+        mock_perplexity.generate_completion.assert_called_once()
+        kwargs = mock_perplexity.generate_completion.call_args.kwargs
+        self.assertEqual(kwargs["purpose"], "code")
+        self.assertIn("Write a hello world function", kwargs["messages"][1]["content"])
+        
+        # The result is queued for the database
+        record = mock_db_manager.return_value.enqueue_insert.call_args.args[1]
+        self.assertEqual(record["generated_code"], result)
+        self.assertEqual(record["model"], "sonar-reasoning-pro")
+        self.assertEqual(code_gen.last_record_id, "record-id")
 
 if __name__ == '__main__':
     unittest.main()
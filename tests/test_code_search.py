@@ -0,0 +1,86 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the local code search index.
+"""
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils import code_search
+from app.utils.code_search import ChunkIndex, CodeSearch, tokenize_code, retrieve_context, format_context
+from app.utils.local_storage import LocalClient
+
+CHUNKS = [
+    {"path": "app/citations.py", "name": "parse_citations", "kind": "function",
+     "content": "def parse_citations(text):\n    return [line for line in text.splitlines() if '[' in line]"},
+    {"path": "app/cache.py", "name": "CompletionCache", "kind": "class",
+     "content": "class CompletionCache:\n    def get(self, key):\n        return self.store.get(key)"},
+    {"path": "app/crawler.py", "name": "Frontier.push", "kind": "method",
+     "content": "def push(self, url, score):\n    heapq.heappush(self.heap, (-score, url))"},
+]
+
+def chunks():
+    return [dict(chunk, _id=str(i), project="demo", start_line=1, end_line=2) for i, chunk in enumerate(CHUNKS)]
+
+class TestChunkIndex(unittest.TestCase):
+    def test_tokenize_splits_identifiers(self):
+        self.assertEqual(tokenize_code("parseCitations(raw_text)"),
+                         ["parsecitations", "parse", "citations", "raw_text", "raw", "text"])
+
+    def test_bm25_ranks_matching_chunk_first(self):
+        index = ChunkIndex(chunks())
+        self.assertEqual(index.search("completion cache lookup", k=2)[0][0], 1)
+        self.assertEqual(index.search("citations", k=1)[0][0], 0)
+        self.assertEqual(index.search("nothing matches", k=3), [])
+
+    def test_pure_python_scoring_matches_numpy(self):
+        expected = ChunkIndex(chunks()).search("push url score heap", k=3)
+        with patch.object(code_search, 'np', None):
+            fallback = ChunkIndex(chunks()).search("push url score heap", k=3)
+        self.assertEqual([position for position, _ in fallback], [position for position, _ in expected])
+        self.assertAlmostEqual(fallback[0][1], expected[0][1], places=4)
+
+    def test_vector_indexes_are_fused_with_bm25(self):
+        for vector in ("flat", "ivf"):
+            index = ChunkIndex(chunks(), vector=vector)
+            self.assertEqual(index.search("CompletionCache get key", k=1)[0][0], 1)
+
+class TestCodeSearch(unittest.TestCase):
+    def setUp(self):
+        CodeSearch._instance = None
+        self.addCleanup(setattr, CodeSearch, '_instance', None)
+        client = LocalClient(":memory:")
+        self.addCleanup(client.close)
+        self.collection = client["db"]["project_descriptions"]
+        self.collection.insert_many(chunks())
+        self.collection.insert_one({"project": "demo", "kind": "project", "timestamp": datetime(2024, 1, 1)})
+        self.collection.insert_one({"project": "demo", "kind": "file", "path": "app/cache.py",
+                                    "name": "app/cache.py"})
+        patcher = patch('app.utils.code_search.DatabaseManager')
+        patcher.start().return_value.get_collection.return_value = self.collection
+        self.addCleanup(patcher.stop)
+
+    def test_retrieve_context_loads_content_of_top_chunks(self):
+        results = retrieve_context("cache get", k=1, project="demo")
+
+        self.assertEqual(results[0]["path"], "app/cache.py")
+        self.assertIn("class CompletionCache", results[0]["content"])
+        self.assertIn("# app/cache.py:1-2 (CompletionCache)", format_context(results))
+
+    @patch('app.utils.code_search.CODE_SEARCH_REFRESH_SECONDS', 0)
+    def test_index_is_rebuilt_after_reingestion(self):
+        search = CodeSearch()
+        first = search.get_index("demo")
+        self.assertIs(search.get_index("demo"), first)
+
+        self.collection.update_one({"kind": "project"}, {"$set": {"timestamp": datetime(2024, 1, 2)}})
+        self.assertIsNot(search.get_index("demo"), first)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the completion cache.
+"""
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+import time
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.api_client import PerplexityClient
+from app.utils.single_flight import SingleFlight
+from app.utils.completion_cache import CompletionCache, SQLiteCacheBackend, make_cache_key
+
+MESSAGES = [{"role": "user", "content": "Write a hello world function"}]
+
+class TestCompletionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = CompletionCache(
+            SQLiteCacheBackend(":memory:", max_entries=2),
+            ttls={"code": 60, "chat": 0}
+        )
+
+    def test_key_depends_on_sampling_params(self):
+        key = make_cache_key("sonar-pro", MESSAGES, 0.3, 100)
+        self.assertEqual(key, make_cache_key("sonar-pro", [dict(MESSAGES[0])], 0.3, 100))
+        self.assertNotEqual(key, make_cache_key("sonar-pro", MESSAGES, 0.7, 100))
+        self.assertNotEqual(key, make_cache_key("sonar-reasoning-pro", MESSAGES, 0.3, 100))
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(self.cache.get("k", "code"))
+        self.cache.set("k", {"content": "cached"}, "code")
+        self.assertEqual(self.cache.get("k", "code"), {"content": "cached"})
+
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["stores"]), (1, 1, 1))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+
+    def test_zero_ttl_purpose_and_bypass_skip_lookup(self):
+        self.cache.set("k", {"content": "chat"}, "chat")
+        self.assertIsNone(self.cache.get("k", "chat"))
+
+        self.cache.set("k", {"content": "code"}, "code")
+        self.assertIsNone(self.cache.get("k", "code", bypass=True))
+        self.assertEqual(self.cache.get_stats()["bypassed"], 2)
+
+    def test_errors_are_not_cached(self):
+        self.cache.set("k", {"error": "rate limited"}, "code")
+        self.assertIsNone(self.cache.get("k", "code"))
+
+    def test_expired_entries_are_dropped(self):
+        self.cache.ttls["code"] = 0.01
+        self.cache.set("k", {"content": "old"}, "code")
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get("k", "code"))
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.cache.set("a", {"content": "a"}, "code")
+        time.sleep(0.001)
+        self.cache.set("b", {"content": "b"}, "code")
+        time.sleep(0.001)
+        self.cache.get("a", "code")
+        time.sleep(0.001)
+        self.cache.set("c", {"content": "c"}, "code")
+
+        self.assertEqual(len(self.cache.backend), 2)
+        self.assertIsNone(self.cache.get("b", "code"))
+        self.assertIsNotNone(self.cache.get("a", "code"))
+
+class TestCachedCompletions(unittest.TestCase):
+    def setUp(self):
+        PerplexityClient._instance = None
+        self.cache = CompletionCache(SQLiteCacheBackend(":memory:", 10), ttls={"code": 60})
+        patchers = [
+            patch('app.utils.api_client.build_completion_cache', return_value=self.cache),
+            patch('app.utils.api_client.OpenAI')
+        ]
+        self.mock_openai = [p.start() for p in patchers][1]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PerplexityClient, '_instance', None)
+        # In-process coalescing only, so no lock files are written under DATA_DIR
+        PerplexityClient().single_flight = SingleFlight(lock_dir=None)
+
+        response = MagicMock()
+        response.choices[0].message.content = "def hello(): pass"
+        response.model = "sonar-reasoning-pro"
+        response.usage.prompt_tokens = 1
+        response.usage.completion_tokens = 1
+        response.usage.total_tokens = 2
+        self.create = self.mock_openai.return_value.chat.completions.with_raw_response.create
+        self.create.return_value.parse.return_value = response
+        self.create.return_value.headers = {}
+
+    def test_repeated_request_is_served_from_cache(self):
+        client = PerplexityClient()
+        first = client.generate_completion("sonar-reasoning-pro", MESSAGES, temperature=0.3)
+        second = client.generate_completion("sonar-reasoning-pro", MESSAGES, temperature=0.3)
+
+        self.assertEqual(first["content"], second["content"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(self.create.call_count, 1)
+
+    def test_use_cache_false_calls_api(self):
+        client = PerplexityClient()
+        client.generate_completion("sonar-reasoning-pro", MESSAGES)
+        result = client.generate_completion("sonar-reasoning-pro", MESSAGES, use_cache=False)
+
+        self.assertNotIn("cached", result)
+        self.assertEqual(self.create.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
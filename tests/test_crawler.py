@@ -0,0 +1,99 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for URL normalization and the frontier-based crawler.
+"""
+import unittest
+from datetime import datetime
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.crawler import Crawler, Frontier, LinkScorer
+from app.utils.url_utils import normalize_url
+
+SITE = {
+    "https://news.example.com/": """
+        <html><head><title>Front page</title></head><body>
+        <a href="/news/2024/iraq-oil-exports-rise-in-kurdistan">Iraq oil exports rise in Kurdistan</a>
+        <a href="/news/2019/football-results-from-the-weekend">Football results from the weekend</a>
+        <a href="/tag/oil">Oil</a>
+        <a href="/login">Sign in</a>
+        <a href="https://other.example.org/news/oil-exports-deal">Oil exports deal</a>
+        <a href="/news/2024/iraq-oil-exports-rise-in-kurdistan?utm_source=home#comments">Comments</a>
+        </body></html>""",
+    "https://news.example.com/news/2024/iraq-oil-exports-rise-in-kurdistan": """
+        <html><head><title>Iraq oil exports rise</title></head><body>
+        <a href="/news/2024/pipeline-talks-resume-for-oil-exports">Pipeline talks resume for oil exports</a>
+        </body></html>"""
+}
+
+class FakeFetcher:
+    def __init__(self):
+        self.fetched = []
+
+    def fetch(self, url):
+        self.fetched.append(url)
+        html = SITE.get(url, "<html><head><title>Other</title></head><body></body></html>")
+        return {"url": url, "status": 200, "content_type": "text/html", "text": html}
+
+class TestNormalizeUrl(unittest.TestCase):
+    def test_tracking_parameters_and_fragments_are_removed(self):
+        self.assertEqual(
+            normalize_url("HTTPS://News.Example.com:443/story/?utm_source=x&b=2&a=1#top"),
+            "https://news.example.com/story?a=1&b=2"
+        )
+
+    def test_amp_variants_collapse(self):
+        self.assertEqual(normalize_url("https://amp.example.com/story/amp/"), "https://example.com/story")
+
+    def test_relative_and_non_http_links(self):
+        self.assertEqual(normalize_url("../b", base="https://example.com/a/c"), "https://example.com/b")
+        self.assertIsNone(normalize_url("mailto:desk@example.com"))
+        self.assertIsNone(normalize_url("javascript:void(0)"))
+
+class TestLinkScorer(unittest.TestCase):
+    def test_relevant_recent_article_outranks_navigation(self):
+        scorer = LinkScorer(["oil", "exports"], now=datetime(2024, 6, 1))
+        article = scorer.score("Iraq oil exports rise", "https://x.com/news/2024/iraq-oil-exports-rise", 1)
+        old = scorer.score("Oil exports in 2015", "https://x.com/news/2015/oil-exports-in-history", 1)
+        tag = scorer.score("Oil", "https://x.com/tag/oil", 1)
+        self.assertGreater(article, old)
+        self.assertGreater(old, tag)
+
+class TestFrontier(unittest.TestCase):
+    def test_duplicates_depth_and_domain_budget(self):
+        frontier = Frontier(max_depth=1, max_pages_per_domain=1)
+        self.assertTrue(frontier.push("https://a.com/1", 1.0, 1))
+        self.assertFalse(frontier.push("https://a.com/1", 5.0, 1))
+        self.assertFalse(frontier.push("https://a.com/deep", 5.0, 2))
+        frontier.push("https://a.com/2", 2.0, 1)
+        frontier.push("https://b.com/1", 0.5, 1)
+
+        self.assertEqual(frontier.pop()["url"], "https://a.com/2")
+        self.assertEqual(frontier.pop()["url"], "https://b.com/1")
+        self.assertIsNone(frontier.pop())
+
+class TestCrawler(unittest.TestCase):
+    def test_crawl_ranks_relevant_articles(self):
+        fetcher = FakeFetcher()
+        crawler = Crawler(["https://news.example.com/"], ["oil", "exports"],
+                          max_pages=10, max_depth=2, workers=2, fetcher=fetcher)
+        crawler.crawl()
+        top = crawler.top_articles(2)
+
+        self.assertEqual(top[0]["url"], "https://news.example.com/news/2024/iraq-oil-exports-rise-in-kurdistan")
+        self.assertEqual(top[1]["url"], "https://news.example.com/news/2024/pipeline-talks-resume-for-oil-exports")
+        # Off-site links are skipped and the tracking-parameter duplicate is fetched once
+        self.assertNotIn("https://other.example.org/news/oil-exports-deal", fetcher.fetched)
+        self.assertEqual(len(fetcher.fetched), len(set(fetcher.fetched)))
+
+    def test_page_budget_is_respected(self):
+        fetcher = FakeFetcher()
+        Crawler(["https://news.example.com/"], ["oil"], max_pages=2, workers=4, fetcher=fetcher).crawl()
+        self.assertEqual(len(fetcher.fetched), 2)
+
+if __name__ == '__main__':
+    unittest.main()
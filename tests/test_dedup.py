@@ -0,0 +1,161 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for duplicate detection of scraped pages.
+"""
+import random
+from datetime import datetime
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.dedup import DedupIndex, normalize_text, simhash, hamming_distance
+from app.web_scraping import WebScraper
+
+def article(seed, words=400):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return " ".join(rng.choice(vocabulary) for _ in range(words))
+
+class TestDedupIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = DedupIndex(":memory:")
+        self.text = article(1)
+        self.index.add("https://news.example.com/story", self.text)
+
+    def test_exact_copy_with_different_markup(self):
+        copy = self.text.upper().replace(" ", "  ,\n")
+        match = self.index.find_content(copy)
+        self.assertEqual(match, {"url": "https://news.example.com/story", "kind": "exact", "distance": 0})
+
+    def test_near_copy(self):
+        words = self.text.split()
+        edited = " ".join(words[:200] + ["syndicated"] + words[200:-3])
+        self.assertLessEqual(hamming_distance(simhash(normalize_text(edited)), simhash(normalize_text(self.text))), 3)
+        match = self.index.find_content(edited)
+        self.assertEqual(match["kind"], "near")
+        self.assertEqual(match["url"], "https://news.example.com/story")
+
+    def test_different_and_short_pages_do_not_match(self):
+        self.assertIsNone(self.index.find_content(article(2)))
+        self.index.add("https://news.example.com/empty", "")
+        self.assertIsNone(self.index.find_content(""))
+
+    def test_url_variants_and_aliases(self):
+        match = self.index.find_url("https://NEWS.example.com/story/?utm_source=feed")
+        self.assertEqual(match["url"], "https://news.example.com/story")
+        self.assertIsNone(self.index.find_url("https://mirror.example.org/story"))
+
+        self.index.add_alias("https://mirror.example.org/story", "https://news.example.com/story")
+        self.assertEqual(self.index.find_url("https://mirror.example.org/story")["url"], "https://news.example.com/story")
+
+    def test_readding_a_url_replaces_its_entry(self):
+        self.index.add_alias("https://mirror.example.org/story", "https://news.example.com/story")
+        changed = article(4)
+        self.index.add("https://news.example.com/story", changed)
+
+        count = self.index._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+        self.assertEqual(count, 1)
+        self.assertIsNone(self.index.find_content(self.text))
+        self.assertEqual(self.index.find_content(changed)["url"], "https://news.example.com/story")
+        self.assertEqual(self.index.find_url("https://mirror.example.org/story")["url"], "https://news.example.com/story")
+
+class TestScraperDeduplication(unittest.TestCase):
+    def setUp(self):
+        patchers = [
+            patch('app.web_scraping.PerplexityClient'),
+            patch('app.web_scraping.DatabaseManager'),
+            patch('app.web_scraping.build_dedup_index', side_effect=lambda: DedupIndex(":memory:"))
+        ]
+        self.mock_client = patchers[0].start()
+        self.mock_db_manager = patchers[1].start()
+        patchers[2].start()
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.mock_client.return_value.get_model.return_value = "sonar-deep-research"
+        self.mock_client.return_value.generate_completion.return_value = {
+            "content": "Report", "model": "sonar-deep-research", "usage": {"total_tokens": 1}
+        }
+        self.text = article(3)
+
+    def metadata(self, url):
+        return {"title": "Story", "meta_description": "", "links": [], "article_text": self.text}
+
+    def test_syndicated_copy_reuses_stored_research(self):
+        scraper = WebScraper()
+        scraper.db = MagicMock()
+        with patch.object(WebScraper, 'fetch_metadata', side_effect=self.metadata):
+            original = scraper.scrape_website("https://news.example.com/story")
+            scraper.db.find_one.return_value = dict(original, _id="abc")
+            copy = scraper.scrape_website("https://partner.example.org/syndicated/story")
+
+        generate = self.mock_client.return_value.generate_completion
+        self.assertEqual(generate.call_count, 1)
+        self.assertEqual(copy["duplicate_of"], "https://news.example.com/story")
+        self.assertEqual(copy["ai_research"], "Report")
+        self.assertNotIn("_id", copy)
+        db_manager = self.mock_db_manager.return_value
+        db_manager.enqueue_insert.assert_called_once()
+        db_manager.enqueue_update.assert_called_once_with(
+            "scraped_data",
+            {"url": "https://news.example.com/story"},
+            {"$addToSet": {"aliases": "https://partner.example.org/syndicated/story"}}
+        )
+
+    def test_same_url_is_left_to_the_completion_cache(self):
+        scraper = WebScraper()
+        scraper.db = MagicMock()
+        with patch.object(WebScraper, 'fetch_metadata', side_effect=self.metadata):
+            original = scraper.research("https://news.example.com/story")
+            scraper.db.find_one.return_value = original
+            again = scraper.research("https://news.example.com/story?utm_campaign=x")
+
+        generate = self.mock_client.return_value.generate_completion
+        self.assertEqual(generate.call_count, 2)
+        # Asked under the indexed address, so both calls share a completion cache key
+        self.assertEqual(generate.call_args_list[0].kwargs["messages"], generate.call_args_list[1].kwargs["messages"])
+        self.assertNotIn("duplicate_of", again)
+        scraper.db.find_one.assert_not_called()
+        self.assertEqual(scraper.dedup._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0], 1)
+
+    def test_stale_research_is_refreshed_once_for_the_original(self):
+        stored = []
+
+        def find_one(query, sort=None):
+            url = query["$or"][0]["url"]
+            matches = [record for record in stored if record["url"] == url or url in record.get("aliases", [])]
+            return max(matches, key=lambda record: record["timestamp"]) if matches else None
+
+        scraper = WebScraper()
+        scraper.db = MagicMock()
+        scraper.db.find_one.side_effect = find_one
+        self.mock_db_manager.return_value.enqueue_insert.side_effect = lambda name, record: stored.append(record)
+        with patch.object(WebScraper, 'fetch_metadata', side_effect=self.metadata):
+            scraper.research("https://news.example.com/story")
+            stored.append({"url": "https://news.example.com/story", "ai_research": "Old", "timestamp": datetime(2020, 1, 1)})
+            first = scraper.scrape_website("https://partner.example.org/syndicated/story")
+            second = scraper.scrape_website("https://partner.example.org/syndicated/story")
+
+        self.assertEqual(self.mock_client.return_value.generate_completion.call_count, 2)
+        self.assertTrue(first["refreshed"])
+        self.assertEqual(len(stored), 2)
+        self.assertEqual(stored[1]["url"], "https://news.example.com/story")
+        self.assertEqual(stored[1]["aliases"], ["https://partner.example.org/syndicated/story"])
+        self.assertEqual((second["ai_research"], second["cached"]), ("Report", True))
+        self.mock_db_manager.return_value.enqueue_update.assert_called_once()
+
+    def test_refresh_ignores_duplicates(self):
+        scraper = WebScraper()
+        scraper.db = MagicMock()
+        with patch.object(WebScraper, 'fetch_metadata', side_effect=self.metadata):
+            scraper.research("https://news.example.com/story")
+            result = scraper.research("https://news.example.com/story", use_cache=False)
+        self.assertNotIn("duplicate_of", result)
+        self.assertEqual(self.mock_client.return_value.generate_completion.call_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
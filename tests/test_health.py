@@ -0,0 +1,83 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for lazy client initialization and background health probes.
+"""
+import threading
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.health import HealthProbe
+from app.utils.api_client import PerplexityClient
+from app.utils.db_connection import DatabaseManager
+
+class TestHealthProbe(unittest.TestCase):
+    def test_status_does_not_wait_for_check(self):
+        release = threading.Event()
+
+        def slow_check():
+            release.wait(5)
+            return "Connected"
+
+        probe = HealthProbe("test", slow_check, interval=60)
+        self.assertEqual(probe.status()["state"], "unknown")
+
+        release.set()
+        status = probe.wait(5)
+        self.assertEqual(status["state"], "ok")
+        self.assertEqual(status["detail"], "Connected")
+
+    def test_failed_check_is_reported(self):
+        def failing_check():
+            raise ConnectionError("unreachable")
+
+        probe = HealthProbe("test", failing_check, interval=60)
+        probe.refresh()
+        status = probe.wait(5)
+        self.assertEqual(status["state"], "error")
+        self.assertEqual(status["detail"], "unreachable")
+
+    def test_fresh_result_is_not_rechecked(self):
+        calls = []
+        probe = HealthProbe("test", lambda: calls.append(1), interval=60)
+        probe.refresh()
+        probe.wait(5)
+        probe.status()
+        probe.wait(5)
+        self.assertEqual(len(calls), 1)
+
+class TestLazyInitialization(unittest.TestCase):
+    def setUp(self):
+        PerplexityClient._instance = None
+        DatabaseManager._instance = None
+        self.addCleanup(setattr, PerplexityClient, '_instance', None)
+        self.addCleanup(setattr, DatabaseManager, '_instance', None)
+
+    @patch('app.utils.api_client.build_completion_cache', return_value=None)
+    @patch('app.utils.api_client.OpenAI')
+    def test_perplexity_client_connects_on_first_use(self, mock_openai, _):
+        client = PerplexityClient()
+        mock_openai.assert_not_called()
+
+        client.get_client()
+        client.get_client()
+        mock_openai.assert_called_once()
+        mock_openai.return_value.models.list.assert_not_called()
+
+    @patch('app.utils.db_connection.MONGODB_URI', "mongodb://localhost:27017")
+    @patch('app.utils.db_connection.MongoClient')
+    def test_database_manager_connects_on_first_use(self, mock_mongo):
+        manager = DatabaseManager()
+        mock_mongo.assert_not_called()
+
+        self.assertIsNotNone(manager.get_collection("generated_code"))
+        mock_mongo.assert_called_once()
+        mock_mongo.return_value.admin.command.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
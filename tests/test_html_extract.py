@@ -0,0 +1,79 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the HTML extraction engines.
+"""
+import unittest
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.html_extract import extract_page, ExtractionCollector, ENGINES
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fixtures')
+
+PAGE = """<html><head><title>Oil &amp; gas</title>
+<meta name="description" content="Exports resumed.">
+<script>var tpl = "<a href='/fake'>fake</a>";</script></head>
+<body><header><nav><a href="/">Home</a> <a href="/news">News</a></nav></header>
+<main><article><h1>Exports resume</h1><p class="byline">By Staff</p>
+<p>Crude exports through the northern pipeline resumed on Friday after talks.</p>
+<ul><li><a href="/news/related-story">A related story that only lists other links</a></li></ul>
+</article></main>
+<footer><p>Copyright 2024 Example News, all rights reserved worldwide.</p></footer></body></html>"""
+
+class CountingCollector(ExtractionCollector):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events = 0
+
+    def start(self, tag, attrib):
+        self.events += 1
+        super().start(tag, attrib)
+
+class TestExtractPage(unittest.TestCase):
+    def test_engines_agree(self):
+        expected = {
+            "title": "Oil & gas",
+            "meta_description": "Exports resumed.",
+            "links": [("/", "Home"), ("/news", "News"), ("/news/related-story", "A related story that only lists other links")],
+            "text": "Exports resume\n\nCrude exports through the northern pipeline resumed on Friday after talks."
+        }
+        for engine in ENGINES:
+            with self.subTest(engine=engine):
+                self.assertEqual(extract_page(PAGE, engine=engine), expected)
+
+    def test_engines_agree_on_fixtures(self):
+        for name in (name for name in os.listdir(FIXTURES) if name.endswith(".html")):
+            with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+                html = f.read()
+            results = [extract_page(html, engine=engine) for engine in ENGINES]
+            self.assertTrue(results[0]["text"])
+            for result in results[1:]:
+                self.assertEqual(result, results[0], name)
+
+    def test_metadata_parse_stops_at_head(self):
+        html = PAGE.replace("</body>", "<p>filler</p>" * 500 + "</body>")
+        for engine in ("stdlib", "lxml"):
+            if engine not in ENGINES:
+                continue
+            with self.subTest(engine=engine):
+                collector = CountingCollector(("title", "meta_description"))
+                ENGINES[engine](html, collector)
+                self.assertEqual(collector.result(), {"title": "Oil & gas", "meta_description": "Exports resumed."})
+                self.assertLess(collector.events, 10)
+
+    def test_max_links(self):
+        result = extract_page(PAGE, fields=("links",), max_links=2)
+        self.assertEqual([href for href, _ in result["links"]], ["/", "/news"])
+
+    def test_missing_fields(self):
+        self.assertEqual(
+            extract_page("<p>no head</p>", fields=("title", "meta_description")),
+            {"title": "", "meta_description": ""}
+        )
+
+if __name__ == '__main__':
+    unittest.main()
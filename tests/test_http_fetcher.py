@@ -0,0 +1,99 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the pooled page fetcher and its revalidating cache.
+"""
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.http_fetcher import PageFetcher, freshness_lifetime
+
+PAGE = b"<html><head><title>News</title></head><body>" + b"<p>Oil output rose.</p>" * 200 + b"</body></html>"
+
+class NewsHandler(BaseHTTPRequestHandler):
+    bodies_sent = 0
+
+    def do_GET(self):
+        if self.path == "/fresh":
+            self.send_response(200)
+            self.send_header("Cache-Control", "max-age=600")
+        elif self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        else:
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(PAGE)))
+        self.end_headers()
+        self.wfile.write(PAGE)
+        NewsHandler.bodies_sent += 1
+
+    def log_message(self, *args):
+        pass
+
+class TestPageFetcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), NewsHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        NewsHandler.bodies_sent = 0
+        PageFetcher._instance = None
+        patcher = patch('app.utils.http_fetcher.FETCH_CACHE_PATH', ":memory:")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PageFetcher, '_instance', None)
+
+    def test_unchanged_page_is_revalidated_without_body(self):
+        fetcher = PageFetcher()
+        first = fetcher.fetch(self.base_url + "/news")
+        second = fetcher.fetch(self.base_url + "/news")
+
+        self.assertFalse(first["from_cache"])
+        self.assertTrue(second["from_cache"])
+        self.assertEqual(second["text"], PAGE.decode())
+        self.assertEqual(NewsHandler.bodies_sent, 1)
+        self.assertEqual(fetcher.get_stats()["not_modified"], 1)
+
+    def test_fresh_page_is_served_without_request(self):
+        fetcher = PageFetcher()
+        fetcher.fetch(self.base_url + "/fresh")
+        page = fetcher.fetch(self.base_url + "/fresh")
+
+        self.assertTrue(page["from_cache"])
+        self.assertEqual(fetcher.get_stats()["requests"], 1)
+
+    def test_use_cache_false_downloads_again(self):
+        fetcher = PageFetcher()
+        fetcher.fetch(self.base_url + "/news")
+        fetcher.fetch(self.base_url + "/news", use_cache=False)
+        self.assertEqual(NewsHandler.bodies_sent, 2)
+
+    def test_bodies_are_compressed_at_rest(self):
+        fetcher = PageFetcher()
+        fetcher.fetch(self.base_url + "/news")
+        stored = fetcher.cache._conn.execute("SELECT length(body) FROM pages").fetchone()[0]
+        self.assertLess(stored, len(PAGE) / 10)
+
+    def test_freshness_lifetime(self):
+        self.assertEqual(freshness_lifetime({"Cache-Control": "public, max-age=120"}), 120)
+        self.assertEqual(freshness_lifetime({"Cache-Control": "no-cache, max-age=120"}), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for incremental repository ingestion.
+"""
+import unittest
+from unittest.mock import patch
+import subprocess
+import tempfile
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.ingestion import RepositoryIngester, chunk_file, hash_blob, list_files
+from app.utils.local_storage import LocalClient
+
+MODULE = '''"""Module docstring."""
+import os
+
+LIMIT = 3
+
+@decorator
+def first(a):
+    return a
+
+class Widget:
+    def run(self):
+        return 1
+'''
+
+def git(root, *args):
+    subprocess.run(["git", "-C", root, "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                   capture_output=True, check=True)
+
+def write(root, path, text):
+    os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+    with open(os.path.join(root, path), "w") as f:
+        f.write(text)
+
+class TestChunking(unittest.TestCase):
+    def test_python_files_are_chunked_along_the_syntax_tree(self):
+        chunks = chunk_file("module.py", MODULE)
+
+        self.assertEqual([(c["kind"], c["name"]) for c in chunks],
+                         [("module", ""), ("function", "first"), ("class", "Widget")])
+        self.assertTrue(chunks[1]["content"].startswith("@decorator"))
+        self.assertEqual((chunks[2]["start_line"], chunks[2]["end_line"]), (10, 12))
+
+    def test_large_classes_split_into_methods_and_long_text_into_blocks(self):
+        methods = "".join(f"    def m{i}(self):\n        return {i}\n\n" for i in range(10))
+        chunks = chunk_file("big.py", "class Big:\n    x = 1\n\n" + methods, max_lines=10)
+        self.assertEqual(chunks[0]["name"], "Big")
+        self.assertEqual([c["name"] for c in chunks[1:3]], ["Big.m0", "Big.m1"])
+
+        text_chunks = chunk_file("notes.txt", "\n".join(f"line {i}" for i in range(25)), max_lines=10)
+        self.assertEqual([(c["start_line"], c["end_line"]) for c in text_chunks], [(1, 10), (11, 20), (21, 25)])
+
+    def test_invalid_python_falls_back_to_blocks(self):
+        self.assertEqual(chunk_file("broken.py", "def (:\n  pass")[0]["kind"], "block")
+
+class TestRepositoryIngester(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = directory.name
+        write(self.root, "pkg/module.py", MODULE)
+        write(self.root, "README.md", "# Project\n\nSome notes.\n")
+        write(self.root, "image.png", "not ingested")
+        git(self.root, "init", "-q")
+        git(self.root, "add", ".")
+        git(self.root, "commit", "-q", "-m", "initial")
+
+        client = LocalClient(":memory:")
+        self.addCleanup(client.close)
+        self.collection = client["db"]["project_descriptions"]
+        patcher = patch('app.ingestion.DatabaseManager')
+        patcher.start().return_value.get_collection.return_value = self.collection
+        self.addCleanup(patcher.stop)
+
+    def test_list_files_uses_git_blob_hashes(self):
+        files = list_files(self.root)
+        self.assertEqual(set(files), {"pkg/module.py", "README.md"})
+        self.assertEqual(files["pkg/module.py"], hash_blob(MODULE.encode()))
+
+        write(self.root, "pkg/module.py", MODULE + "\nEXTRA = 1\n")
+        self.assertEqual(list_files(self.root)["pkg/module.py"], hash_blob((MODULE + "\nEXTRA = 1\n").encode()))
+
+    def test_reingest_processes_only_changed_and_deleted_files(self):
+        first = RepositoryIngester(self.root, project="demo").ingest()
+        self.assertEqual((first["changed"], first["unchanged"]), (2, 0))
+        self.assertEqual(self.collection.count_documents({"project": "demo", "kind": "function"}), 1)
+
+        write(self.root, "pkg/module.py", MODULE + "\ndef second():\n    return 2\n")
+        os.remove(os.path.join(self.root, "README.md"))
+        git(self.root, "add", "-A")
+        git(self.root, "commit", "-q", "-m", "change")
+
+        with patch('app.ingestion.chunk_file', wraps=chunk_file) as chunker:
+            second = RepositoryIngester(self.root, project="demo").ingest()
+        self.assertEqual((second["changed"], second["deleted"], second["unchanged"]), (1, 1, 0))
+        chunker.assert_called_once()
+        self.assertEqual(self.collection.count_documents({"project": "demo", "kind": "function"}), 2)
+        self.assertEqual(self.collection.count_documents({"project": "demo", "path": "README.md"}), 0)
+
+        third = RepositoryIngester(self.root, project="demo").ingest()
+        self.assertEqual((third["changed"], third["unchanged"]), (0, 1))
+        project = self.collection.find_one({"project": "demo", "kind": "project"})
+        self.assertEqual(project["files"], 1)
+
+    @patch('app.ingestion.PerplexityClient')
+    def test_summaries_are_requested_for_changed_files_only(self, mock_client):
+        perplexity = mock_client.return_value
+        perplexity.generate_completion.return_value = {"content": "Summary"}
+
+        RepositoryIngester(self.root, project="demo", summarize=True).ingest()
+        # Two files and the project overview
+        self.assertEqual(perplexity.generate_completion.call_count, 3)
+
+        perplexity.generate_completion.reset_mock()
+        RepositoryIngester(self.root, project="demo", summarize=True).ingest()
+        perplexity.generate_completion.assert_not_called()
+        self.assertEqual(self.collection.find_one({"kind": "project"})["summary"], "Summary")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the embedded SQLite storage backend.
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from app.utils import queries
+from app.utils.local_storage import LocalClient
+from app.utils.db_connection import DatabaseManager, WriteBehindQueue
+from app.config.settings import COLLECTIONS
+
+class TestLocalCollection(unittest.TestCase):
+    def setUp(self):
+        self.client = LocalClient(":memory:")
+        self.addCleanup(self.client.close)
+        self.collection = self.client["db"]["pages"]
+
+    def test_insert_and_find_round_trip_types(self):
+        timestamp = datetime(2024, 5, 1, 12, 30, 0, 1234)
+        inserted = self.collection.insert_one({"url": "https://a.com", "timestamp": timestamp, "tags": ["x"]})
+
+        document = self.collection.find_one({"_id": inserted.inserted_id})
+        self.assertIsInstance(document["_id"], ObjectId)
+        self.assertEqual(document["timestamp"], timestamp)
+        self.assertEqual(document["tags"], ["x"])
+        with self.assertRaises(DuplicateKeyError):
+            self.collection.insert_one({"_id": inserted.inserted_id})
+
+    def test_query_operators(self):
+        self.collection.insert_many([{"n": n, "kind": "even" if n % 2 == 0 else "odd"} for n in range(10)])
+
+        self.assertEqual(self.collection.count_documents({"n": {"$gte": 3, "$lt": 6}}), 3)
+        self.assertEqual(self.collection.count_documents({"n": {"$in": [1, 2, 42]}}), 2)
+        self.assertEqual(self.collection.count_documents({"kind": {"$ne": "even"}}), 5)
+        self.assertEqual(self.collection.count_documents({"$or": [{"n": 0}, {"n": 9}]}), 2)
+        self.assertEqual(self.collection.count_documents({"missing": {"$exists": False}}), 10)
+        self.assertEqual(self.collection.count_documents({"$and": [{}, {"kind": "odd"}]}), 5)
+
+    def test_equality_matches_array_elements(self):
+        self.collection.insert_one({"url": "https://a.com", "aliases": ["https://b.com", "https://c.com"]})
+        self.collection.insert_one({"url": "https://b.com"})
+
+        matches = list(self.collection.find({"$or": [{"url": "https://b.com"}, {"aliases": "https://b.com"}]}))
+        self.assertEqual(len(matches), 2)
+        self.assertEqual(self.collection.count_documents({"aliases": {"$in": ["https://c.com"]}}), 1)
+
+    def test_sort_skip_limit_and_projection(self):
+        self.collection.insert_many([{"n": n, "body": "x" * n} for n in range(5)])
+
+        documents = list(self.collection.find({}, {"n": 1}).sort([("n", -1)]).skip(1).limit(2))
+        self.assertEqual([document["n"] for document in documents], [3, 2])
+        self.assertNotIn("body", documents[0])
+        self.assertIn("_id", documents[0])
+
+    def test_updates_and_upsert(self):
+        self.collection.insert_one({"_id": "a", "count": 1, "aliases": ["x"]})
+
+        self.collection.update_one({"_id": "a"}, {"$inc": {"count": 2}, "$addToSet": {"aliases": "x"}})
+        self.collection.update_one({"_id": "a"}, {"$addToSet": {"aliases": "y"}, "$unset": {"missing": ""}})
+        result = self.collection.update_one({"_id": "b"}, {"$set": {"count": 5}}, upsert=True)
+
+        self.assertEqual(self.collection.find_one({"_id": "a"}), {"_id": "a", "count": 3, "aliases": ["x", "y"]})
+        self.assertEqual(result.upserted_id, "b")
+        self.assertEqual(self.collection.find_one({"_id": "b"})["count"], 5)
+
+    def test_find_one_and_update_returns_previous_document(self):
+        self.collection.replace_one({"_id": "k"}, {"value": 1}, upsert=True)
+
+        before = self.collection.find_one_and_update({"_id": "k", "value": {"$gt": 0}}, {"$set": {"value": 2}})
+
+        self.assertEqual(before["value"], 1)
+        self.assertEqual(self.collection.find_one({"_id": "k"})["value"], 2)
+        self.assertIsNone(self.collection.find_one_and_update({"_id": "k", "value": {"$gt": 5}}, {"$set": {"value": 3}}))
+
+    def test_delete(self):
+        self.collection.insert_many([{"_id": str(n)} for n in range(4)])
+
+        self.assertEqual(self.collection.delete_many({"_id": {"$in": ["0", "1"]}}).deleted_count, 2)
+        self.assertEqual(self.collection.delete_one({}).deleted_count, 1)
+        self.assertEqual(self.collection.estimated_document_count(), 1)
+
+    def test_bulk_write_is_atomic_per_batch_and_reports_duplicates(self):
+        self.collection.insert_one({"_id": "dup"})
+
+        with self.assertRaises(BulkWriteError) as error:
+            self.collection.bulk_write([
+                InsertOne({"_id": "new"}),
+                InsertOne({"_id": "dup"}),
+                UpdateOne({"_id": "new"}, {"$set": {"seen": True}}, upsert=True)
+            ], ordered=False)
+
+        self.assertEqual([e["code"] for e in error.exception.details["writeErrors"]], [11000])
+        self.assertTrue(self.collection.find_one({"_id": "new"})["seen"])
+
+    def test_indexes_are_idempotent_and_conflicts_raise(self):
+        self.collection.create_index([("timestamp", -1), ("_id", -1)], name="timestamp_id")
+        self.collection.create_index([("timestamp", -1), ("_id", -1)], name="timestamp_id")
+
+        with self.assertRaises(OperationFailure) as error:
+            self.collection.create_index([("timestamp", 1)], name="timestamp_id", expireAfterSeconds=60)
+        self.assertEqual(error.exception.code, 85)
+
+        self.collection.drop_index("timestamp_id")
+        self.assertEqual(list(self.collection.index_information()), ["_id_"])
+
+    def test_text_search_scores_with_weights(self):
+        self.collection.create_index([("title", "text"), ("body", "text")], name="text",
+                                     weights={"title": 5, "body": 1})
+        self.collection.insert_many([
+            {"title": "Other", "body": "python python"},
+            {"title": "Python tips", "body": "none"},
+            {"title": "Rust", "body": "none"}
+        ])
+
+        documents = list(
+            self.collection.find({"$text": {"$search": "python"}}, {"title": 1, "score": {"$meta": "textScore"}})
+            .sort([("score", {"$meta": "textScore"})])
+        )
+        self.assertEqual([document["title"] for document in documents], ["Python tips", "Other"])
+        self.assertEqual(documents[0]["score"], 5)
+
+    def test_ttl_index_purges_expired_documents(self):
+        self.collection.create_index([("timestamp", 1)], name="timestamp_ttl", expireAfterSeconds=3600)
+        self.collection.insert_many([
+            {"timestamp": datetime.utcnow() - timedelta(hours=2)},
+            {"timestamp": datetime.utcnow()}
+        ])
+
+        self.assertEqual(self.collection.estimated_document_count(), 1)
+
+class TestLocalStorageBackend(unittest.TestCase):
+    def setUp(self):
+        DatabaseManager._instance = None
+        self.addCleanup(setattr, DatabaseManager, '_instance', None)
+        self.client = LocalClient(":memory:")
+        for target, value in (('STORAGE_BACKEND', "sqlite"), ('LocalClient', lambda path: self.client)):
+            patcher = patch(f'app.utils.db_connection.{target}', value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_auto_uses_mongo_only_with_uri(self):
+        with patch('app.utils.db_connection.STORAGE_BACKEND', "auto"), \
+                patch('app.utils.db_connection.MONGODB_URI', None):
+            self.assertEqual(DatabaseManager._resolve_backend(), "sqlite")
+        with patch('app.utils.db_connection.STORAGE_BACKEND', "auto"), \
+                patch('app.utils.db_connection.MONGODB_URI', "mongodb://localhost:27017"):
+            self.assertEqual(DatabaseManager._resolve_backend(), "mongo")
+
+    def test_indexes_and_paginated_queries_run_on_sqlite(self):
+        manager = DatabaseManager()
+        self.assertTrue(manager.ensure_indexes())
+        self.assertIn("url_timestamp", manager.get_collection(COLLECTIONS["scraping"]).index_information())
+
+        start = datetime(2024, 1, 1)
+        writer = WriteBehindQueue(lambda: manager.db, flush_interval=0.01)
+        self.addCleanup(writer.close)
+        for i in range(5):
+            writer.put(COLLECTIONS["scraping"], ("insert", {
+                "url": f"https://example.com/{i}", "timestamp": start - timedelta(minutes=i), "ai_research": "text"
+            }))
+        self.assertTrue(writer.flush(timeout=5))
+
+        with patch('app.utils.queries.DatabaseManager', return_value=manager):
+            first = queries.list_research(limit=3)
+            second = queries.list_research(limit=3, cursor=first["next_cursor"])
+
+        self.assertEqual([item["url"] for item in first["items"] + second["items"]],
+                         [f"https://example.com/{i}" for i in range(5)])
+        self.assertIsNone(second["next_cursor"])
+        self.assertNotIn("ai_research", first["items"][0])
+
+    def test_queued_insert_can_be_read_back_by_its_id(self):
+        manager = DatabaseManager()
+        document = {"task": "parse csv", "generated_code": "code", "timestamp": datetime(2024, 1, 1)}
+
+        self.assertTrue(manager.enqueue_insert(COLLECTIONS["code"], document))
+        document_id = str(document["_id"])
+        self.assertTrue(manager.flush_writes(timeout=5))
+
+        with patch('app.utils.queries.DatabaseManager', return_value=manager):
+            stored = queries.get_document("code", document_id, fields=["generated_code"])
+        self.assertEqual(stored, {"id": document_id, "generated_code": "code"})
+
+if __name__ == '__main__':
+    unittest.main()
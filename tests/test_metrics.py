@@ -0,0 +1,93 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for latency, token and cost metrics.
+"""
+import unittest
+from unittest.mock import patch, MagicMock
+import tempfile
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.metrics import Metrics, CompletionTimer, completion_rows, estimate_cost, percentile
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        Metrics._instance = None
+        self.metrics = Metrics()
+        self.addCleanup(setattr, Metrics, "_instance", None)
+
+    def test_percentiles_over_recent_samples(self):
+        for value in range(1, 101):
+            self.metrics.observe("mclg_fetch_seconds", value / 100, outcome="download")
+
+        series = self.metrics.snapshot()["series"][0]
+
+        self.assertEqual(series["count"], 100)
+        self.assertEqual((series["p50"], series["p95"], series["p99"]), (0.5, 0.95, 0.99))
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_timer_records_label_set_in_body(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.timer("mclg_db_write_seconds", collection="chat", status="error"):
+                raise ValueError("boom")
+        with self.metrics.timer("mclg_db_write_seconds", collection="chat", status="error") as labels:
+            labels["status"] = "ok"
+
+        statuses = {item["labels"]["status"]: item["count"] for item in self.metrics.snapshot()["series"]}
+        self.assertEqual(statuses, {"error": 1, "ok": 1})
+
+    def test_completion_tokens_cost_and_ttft(self):
+        usage = {"prompt_tokens": 1000, "completion_tokens": 500, "total_tokens": 1500}
+        timer = CompletionTimer("sonar-pro", "chat")
+        deltas = []
+        timer.wrap(deltas.append)("hi")
+        timer.finish({"content": "hi", "usage": usage})
+        CompletionTimer("sonar-pro", "chat").finish({"content": "hi", "usage": usage}, cached=True)
+        CompletionTimer("sonar-pro", "chat").finish({"error": "down"})
+
+        row, = completion_rows(self.metrics.snapshot())
+
+        self.assertEqual(deltas, ["hi"])
+        self.assertEqual((row["calls"], row["cached"], row["errors"]), (3, 1, 1))
+        self.assertEqual((row["prompt_tokens"], row["completion_tokens"]), (1000, 500))
+        self.assertAlmostEqual(row["cost_usd"], estimate_cost("sonar-pro", usage))
+        self.assertIsNotNone(row["ttft_p50_s"])
+
+    def test_prometheus_text_and_file_export(self):
+        self.metrics.observe("mclg_completion_seconds", 1.5, model="sonar-pro", purpose="chat", cached="false", status="ok")
+        self.metrics.increment("mclg_completion_tokens_total", 10, model="sonar-pro", purpose="chat", type="prompt")
+
+        text = self.metrics.render_prometheus()
+
+        self.assertIn("# TYPE mclg_completion_seconds summary", text)
+        self.assertIn('mclg_completion_seconds{cached="false",model="sonar-pro",purpose="chat",status="ok",quantile="0.95"} 1.5', text)
+        self.assertIn('mclg_completion_seconds_count{cached="false",model="sonar-pro",purpose="chat",status="ok"} 1', text)
+        self.assertIn('mclg_completion_tokens_total{model="sonar-pro",purpose="chat",type="prompt"} 10', text)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics", "mclg.prom")
+            self.metrics.write_prometheus(path)
+            with open(path) as f:
+                self.assertEqual(f.read(), text)
+
+    @patch('app.utils.api_client.build_completion_cache', return_value=None)
+    def test_generate_completion_is_instrumented(self, mock_cache):
+        from app.utils.api_client import PerplexityClient
+        from app.utils.single_flight import SingleFlight
+        PerplexityClient._instance = None
+        self.addCleanup(setattr, PerplexityClient, "_instance", None)
+        client = PerplexityClient()
+        client.single_flight = SingleFlight(lock_dir=None)
+        result = {"content": "x", "model": "sonar-pro", "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5}}
+
+        with patch.object(client, "_complete", MagicMock(return_value=result)):
+            client.generate_completion("sonar-pro", [{"role": "user", "content": "q"}])
+
+        row, = completion_rows(self.metrics.snapshot())
+        self.assertEqual((row["model"], row["purpose"], row["calls"], row["prompt_tokens"]), ("sonar-pro", "chat", 1, 3))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for cost- and latency-aware model routing.
+"""
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from openai import APITimeoutError
+from app.utils.model_router import ModelRouter, routing_options
+from app.utils.api_client import PerplexityClient
+from app.utils.single_flight import SingleFlight
+from app.utils.metrics import Metrics
+
+ROUTES = {
+    "web": ["sonar-deep-research", "sonar-reasoning-pro", "sonar-pro"],
+    "code": ["sonar-reasoning-pro", "sonar-pro"],
+    "chat": ["sonar-pro", "sonar"]
+}
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        Metrics._instance = None
+        self.addCleanup(setattr, Metrics, "_instance", None)
+        self.router = ModelRouter(routes=ROUTES, enabled=True, latency_budget=0, cost_budget=0)
+
+    def test_short_pages_skip_deep_research(self):
+        self.assertEqual(self.router.route("web", page_chars=3000)["model"], "sonar-reasoning-pro")
+        self.assertEqual(self.router.route("web", page_chars=50000)["model"], "sonar-deep-research")
+        self.assertEqual(self.router.route("web")["model"], "sonar-deep-research")
+        self.assertEqual(self.router.route("web", page_chars=3000, depth="deep")["model"], "sonar-deep-research")
+        self.assertEqual(self.router.route("web", depth="quick")["model"], "sonar-pro")
+
+    def test_override_and_unknown_purpose(self):
+        decision = self.router.route("web", page_chars=50000, model="sonar-pro")
+        self.assertEqual((decision["model"], decision["reason"]), ("sonar-pro", "override"))
+        with self.assertRaises(ValueError):
+            self.router.route("translation")
+
+    def test_long_prompt_moves_to_a_model_that_fits(self):
+        decision = self.router.route("code", prompt_tokens=20000, depth="quick")
+
+        self.assertEqual(decision["model"], "sonar-reasoning-pro")
+        self.assertIn("sonar-pro", decision["skipped"])
+
+    def test_budgets_rule_out_slow_and_expensive_models(self):
+        self.assertEqual(self.router.route("web", max_seconds=60)["model"], "sonar-reasoning-pro")
+        decision = self.router.route("web", max_seconds=1)
+        self.assertEqual((decision["model"], decision["reason"]), ("sonar-pro", "best effort"))
+        self.assertEqual(self.router.route("chat", max_cost=0.0055, max_tokens=100)["model"], "sonar")
+
+    def test_busy_and_timed_out_models_are_passed_over(self):
+        with patch.dict('app.utils.model_router.PERPLEXITY_MODEL_CONCURRENCY', {"sonar-deep-research": 1}):
+            with self.router.track("sonar-deep-research") as outcome:
+                decision = self.router.route("web")
+                outcome["result"] = {"content": "report"}
+        self.assertEqual((decision["model"], decision["reason"]), ("sonar-reasoning-pro", "fallback"))
+
+        with self.router.track("sonar-deep-research") as outcome:
+            outcome["result"] = {"error": "Request timed out.", "timed_out": True}
+        self.assertEqual(self.router.route("web")["model"], "sonar-reasoning-pro")
+        self.assertTrue(self.router.get_stats()["models"]["sonar-deep-research"]["cooling_down"])
+
+    def test_decisions_are_recorded(self):
+        self.router.route("web", page_chars=100)
+
+        self.assertEqual(self.router.get_stats()["decisions"][0]["reason"], "short page")
+        counters = Metrics().snapshot()["counters"]
+        self.assertEqual(counters[0]["labels"], {"model": "sonar-reasoning-pro", "purpose": "web", "reason": "short page"})
+
+    def test_routing_options(self):
+        self.assertEqual(routing_options({"depth": "quick", "url": "x"}, {"max_cost": 1}), {"max_cost": 1, "depth": "quick"})
+        with self.assertRaises(ValueError):
+            routing_options({"depth": "thorough"})
+
+class TestTimeoutFallback(unittest.TestCase):
+    def setUp(self):
+        PerplexityClient._instance = None
+        Metrics._instance = None
+        patchers = [
+            patch('app.utils.api_client.build_completion_cache', return_value=None),
+            patch('app.utils.api_client.OpenAI')
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PerplexityClient, '_instance', None)
+        self.addCleanup(setattr, Metrics, '_instance', None)
+        self.client = PerplexityClient()
+        self.client.single_flight = SingleFlight(lock_dir=None)
+        self.client.router = ModelRouter(routes=ROUTES, enabled=True, latency_budget=0, cost_budget=0)
+        self.called = []
+
+        def complete(model, messages, temperature, max_tokens, on_delta, retry_timeouts=True):
+            self.called.append(model)
+            if model == "sonar-deep-research":
+                return {"error": "Request timed out.", "timed_out": True}
+            return {"content": "report", "model": model, "usage": {}}
+        self.client._complete = complete
+
+    def test_timed_out_call_is_retried_on_the_next_model(self):
+        route = self.client.route("web", page_chars=50000)
+        result = self.client.generate_completion(route["model"], [{"role": "user", "content": "hi"}],
+                                                 temperature=0.3, purpose="web", route=route)
+
+        self.assertEqual(self.called, ["sonar-deep-research", "sonar-reasoning-pro"])
+        self.assertEqual(result["model"], "sonar-reasoning-pro")
+
+    def test_overridden_model_is_not_replaced(self):
+        route = self.client.route("web", model="sonar-deep-research")
+        result = self.client.generate_completion(route["model"], [{"role": "user", "content": "hi"}],
+                                                 temperature=0.3, purpose="web", route=route)
+
+        self.assertEqual(self.called, ["sonar-deep-research"])
+        self.assertTrue(result["timed_out"])
+
+class TestTimeoutRetries(unittest.TestCase):
+    """Timeouts raised by the SDK, through _create and its retry loop."""
+
+    def setUp(self):
+        PerplexityClient._instance = None
+        Metrics._instance = None
+        patchers = [
+            patch('app.utils.api_client.build_completion_cache', return_value=None),
+            patch('app.utils.api_client.OpenAI'),
+            patch('app.utils.api_client.time.sleep')
+        ]
+        self.mock_openai = [patcher.start() for patcher in patchers][1]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PerplexityClient, '_instance', None)
+        self.addCleanup(setattr, Metrics, '_instance', None)
+        self.client = PerplexityClient()
+        self.client.single_flight = SingleFlight(lock_dir=None)
+        self.client.router = ModelRouter(routes=ROUTES, enabled=True, latency_budget=0, cost_budget=0)
+        self.create = self.mock_openai.return_value.chat.completions.with_raw_response.create
+        request = httpx.Request("POST", "https://api.perplexity.ai/chat/completions")
+        self.create.side_effect = APITimeoutError(request=request)
+
+    def called_models(self):
+        return [call.kwargs["model"] for call in self.create.call_args_list]
+
+    def test_routed_request_tries_each_model_once(self):
+        route = self.client.route("web", page_chars=50000)
+        result = self.client.generate_completion(route["model"], [{"role": "user", "content": "hi"}],
+                                                 temperature=0.3, purpose="web", route=route)
+
+        self.assertEqual(self.called_models(), ROUTES["web"])
+        self.assertTrue(result["timed_out"])
+
+    def test_routed_request_answers_from_the_fallback(self):
+        response = MagicMock()
+        response.choices[0].message.content = "report"
+        response.model = "sonar-reasoning-pro"
+        response.usage.prompt_tokens = response.usage.completion_tokens = response.usage.total_tokens = 1
+        raw = MagicMock(headers={})
+        raw.parse.return_value = response
+        self.create.side_effect = [self.create.side_effect, raw]
+
+        route = self.client.route("web", page_chars=50000)
+        result = self.client.generate_completion(route["model"], [{"role": "user", "content": "hi"}],
+                                                 temperature=0.3, purpose="web", route=route)
+
+        self.assertEqual(self.called_models(), ["sonar-deep-research", "sonar-reasoning-pro"])
+        self.assertEqual(result["content"], "report")
+
+    @patch('app.utils.api_client.PERPLEXITY_MAX_RETRIES', 2)
+    def test_unrouted_and_overridden_requests_still_retry(self):
+        self.client.generate_completion("sonar-pro", [{"role": "user", "content": "hi"}], temperature=0.3)
+        self.assertEqual(self.create.call_count, 3)
+
+        route = self.client.route("web", model="sonar-deep-research")
+        self.client.generate_completion(route["model"], [{"role": "user", "content": "hello"}],
+                                        temperature=0.3, purpose="web", route=route)
+        self.assertEqual(self.create.call_count, 6)
+
+if __name__ == '__main__':
+    unittest.main()
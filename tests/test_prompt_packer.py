@@ -0,0 +1,121 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for token-budgeted prompt assembly.
+"""
+import unittest
+from unittest.mock import patch
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.prompt_packer import (
+    PromptSection,
+    estimate_tokens,
+    pack,
+    pack_messages,
+    truncate_text,
+    describe_report
+)
+
+def words(count, word="alpha"):
+    return " ".join([word] * count)
+
+class TestPromptPacker(unittest.TestCase):
+    def test_estimate_counts_words_punctuation_and_long_identifiers(self):
+        self.assertEqual(estimate_tokens(""), 0)
+        self.assertEqual(estimate_tokens("hello, world"), 3)
+        self.assertEqual(estimate_tokens("a_very_long_identifier_name"), 5)
+
+    def test_truncate_keeps_head_or_tail_and_marks_cut(self):
+        text = "\n".join(f"line {i}" for i in range(200))
+
+        head = truncate_text(text, 100)
+        tail = truncate_text(text, 100, keep="tail")
+
+        self.assertTrue(head.startswith("line 0"))
+        self.assertIn("tokens omitted", head)
+        self.assertTrue(tail.endswith("line 199"))
+        self.assertLess(estimate_tokens(head), 130)
+
+    def test_everything_fits_untouched(self):
+        texts, report = pack([PromptSection("a", "one two"), PromptSection("b", "three")], budget=100)
+
+        self.assertEqual(texts, {"a": "one two", "b": "three"})
+        self.assertEqual(report["total_tokens"], 3)
+        self.assertEqual(report["sections"]["a"]["action"], "kept")
+
+    def test_lowest_priority_shrinks_first_and_required_is_kept(self):
+        sections = [
+            PromptSection("task", words(50), required=True),
+            PromptSection("context", words(300), priority=3),
+            PromptSection("snippet:0", words(100), priority=1, shrink="drop"),
+            PromptSection("snippet:1", words(100), priority=1, shrink="drop"),
+            PromptSection("code", words(300), priority=2)
+        ]
+
+        texts, report = pack(sections, budget=500)
+
+        self.assertEqual(texts["task"], words(50))
+        self.assertNotIn("snippet:1", texts)
+        self.assertNotIn("snippet:0", texts)
+        self.assertEqual(report["sections"]["code"]["action"], "truncated")
+        self.assertEqual(report["sections"]["context"]["action"], "kept")
+        self.assertLessEqual(report["total_tokens"], 500)
+
+    def test_pack_messages_drops_oldest_turns(self):
+        messages = [{"role": "system", "content": "system prompt"}]
+        for turn in range(10):
+            messages.append({"role": "user", "content": words(40, f"question{turn}")})
+            messages.append({"role": "assistant", "content": words(40, f"answer{turn}")})
+        messages.append({"role": "user", "content": "latest question"})
+
+        packed, report = pack_messages(messages, budget=300)
+
+        self.assertEqual(packed[0]["role"], "system")
+        self.assertEqual(packed[-1]["content"], "latest question")
+        self.assertEqual(packed[-2]["content"], words(40, "answer9"))
+        self.assertNotIn(messages[1], packed)
+        self.assertEqual(report["sections"]["history"]["dropped_messages"], 20 - report["sections"]["history"]["messages"])
+        self.assertLessEqual(report["total_tokens"], 300)
+        self.assertIn("history", describe_report(report))
+
+    def test_pack_messages_keeps_roles_alternating(self):
+        messages = [
+            {"role": "system", "content": "system prompt"},
+            {"role": "assistant", "content": "reply left from a cut exchange"},
+            {"role": "user", "content": words(10, "question0")},
+            {"role": "assistant", "content": words(10, "answer0")},
+            {"role": "user", "content": words(150, "question1")},
+            {"role": "assistant", "content": words(10, "answer1")},
+            {"role": "user", "content": "latest question"}
+        ]
+
+        for budget in (30, 60, 120, 200, 300):
+            packed, report = pack_messages(messages, budget=budget)
+            roles = [message["role"] for message in packed[1:]]
+            self.assertEqual(roles[0], "user")
+            self.assertTrue(all(a != b for a, b in zip(roles, roles[1:])), (budget, roles))
+            self.assertNotIn(messages[1], packed)
+            # Only the newest exchanges are kept
+            if messages[2] in packed:
+                self.assertIn(messages[4], packed)
+
+class TestPackedPrompts(unittest.TestCase):
+    @patch('app.code_generation.PerplexityClient')
+    @patch('app.code_generation.DatabaseManager')
+    def test_code_generator_reports_sections_and_truncates_existing_code(self, mock_db, mock_client):
+        from app.code_generation import CodeGenerator
+        mock_client.return_value.get_model.return_value = "sonar-reasoning-pro"
+
+        with patch('app.code_generation.prompt_budget', return_value=400):
+            messages, report = CodeGenerator().build_messages("context", words(2000), "write a parser")
+
+        self.assertIn("write a parser", messages[1]["content"])
+        self.assertEqual(report["sections"]["existing_code"]["action"], "truncated")
+        self.assertLessEqual(report["total_tokens"], 400)
+
+if __name__ == '__main__':
+    unittest.main()
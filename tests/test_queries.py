@@ -0,0 +1,99 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for index management and the paginated query layer.
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from app.utils import queries
+from app.utils.db_connection import DatabaseManager
+
+def documents(count):
+    start = datetime(2024, 1, 1)
+    return [
+        {"_id": ObjectId(), "url": f"https://example.com/{i}", "timestamp": start - timedelta(minutes=i)}
+        for i in range(count)
+    ]
+
+class TestQueries(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('app.utils.queries.DatabaseManager')
+        self.collection = patcher.start().return_value.get_collection.return_value
+        self.addCleanup(patcher.stop)
+        self.cursor = self.collection.find.return_value.sort.return_value.limit
+
+    def test_cursor_round_trip(self):
+        document = documents(1)[0]
+        self.assertEqual(queries.decode_cursor(queries.encode_cursor(document)), (document["timestamp"], document["_id"]))
+
+    def test_first_page_uses_projection_and_fetches_one_extra(self):
+        page_documents = documents(3)
+        self.cursor.return_value = iter(page_documents)
+
+        page = queries.list_research(limit=2)
+
+        query, projection = self.collection.find.call_args[0]
+        self.assertEqual(query, {})
+        self.assertNotIn("ai_research", projection)
+        self.collection.find.return_value.sort.assert_called_once_with([("timestamp", -1), ("_id", -1)])
+        self.cursor.assert_called_once_with(3)
+        self.assertEqual([item["id"] for item in page["items"]], [str(d["_id"]) for d in page_documents[:2]])
+        self.assertEqual(queries.decode_cursor(page["next_cursor"])[1], page_documents[1]["_id"])
+
+    def test_next_page_continues_after_cursor(self):
+        last = documents(1)[0]
+        self.cursor.return_value = iter([])
+
+        page = queries.list_research(cursor=queries.encode_cursor(last), url="https://example.com/0")
+
+        query = self.collection.find.call_args[0][0]
+        self.assertEqual(query["$and"][0], {"$or": [{"url": "https://example.com/0"}, {"aliases": "https://example.com/0"}]})
+        self.assertEqual(query["$and"][1]["$or"][1], {"timestamp": last["timestamp"], "_id": {"$lt": last["_id"]}})
+        self.assertEqual(page, {"items": [], "next_cursor": None})
+
+    def test_invalid_document_id(self):
+        self.assertIsNone(queries.get_document("scraping", "not-an-id"))
+        self.collection.find_one.assert_not_called()
+
+class TestEnsureIndexes(unittest.TestCase):
+    def setUp(self):
+        DatabaseManager._instance = None
+        self.addCleanup(setattr, DatabaseManager, '_instance', None)
+
+    def test_indexes_are_created_and_conflicts_rebuilt(self):
+        db = MagicMock()
+        collection = db.__getitem__.return_value
+        conflict = OperationFailure("IndexOptionsConflict", code=85)
+        calls = []
+
+        def create_index(keys, **options):
+            calls.append(options["name"])
+            if options["name"] == "timestamp_ttl" and calls.count("timestamp_ttl") == 1:
+                raise conflict
+
+        collection.create_index.side_effect = create_index
+        collection.index_information.return_value = {
+            "_id_": {"key": [("_id", 1)]},
+            "timestamp_ttl": {"key": [("timestamp", 1)], "expireAfterSeconds": 60}
+        }
+
+        manager = DatabaseManager()
+        with patch.object(DatabaseManager, 'db', db):
+            self.assertTrue(manager.ensure_indexes())
+
+        collection.drop_index.assert_called_once_with("timestamp_ttl")
+        self.assertEqual(calls.count("timestamp_ttl"), 2)
+        self.assertIn("url_timestamp", calls)
+        self.assertIn("research_text", calls)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the Perplexity rate limiter and retry scheduling.
+"""
+import unittest
+from unittest.mock import patch, MagicMock
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from openai import RateLimitError, BadRequestError
+from app.utils.api_client import PerplexityClient
+from app.utils.single_flight import SingleFlight
+from app.utils.rate_limiter import RateLimiter, TokenBucket, parse_duration, backoff_delay
+
+def api_error(error_class, status, headers=None):
+    request = httpx.Request("POST", "https://api.perplexity.ai/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return error_class("error", response=response, body=None)
+
+class TestRateLimiter(unittest.TestCase):
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("20"), 20.0)
+        self.assertEqual(parse_duration("1.5s"), 1.5)
+        self.assertEqual(parse_duration("6m0s"), 360.0)
+        self.assertAlmostEqual(parse_duration("250ms"), 0.25)
+        self.assertIsNone(parse_duration("soon"))
+
+    def test_bucket_reserves_future_capacity(self):
+        bucket = TokenBucket(capacity=2, per_second=1)
+        now = bucket.updated
+        self.assertEqual(bucket.reserve(1, now), 0.0)
+        self.assertEqual(bucket.reserve(1, now), 0.0)
+        self.assertAlmostEqual(bucket.reserve(1, now), 1.0)
+        self.assertAlmostEqual(bucket.reserve(1, now), 2.0)
+
+    def test_requests_per_minute_are_enforced(self):
+        limiter = RateLimiter(limits={"m": {"rpm": 60, "tpm": 10 ** 9}})
+        with patch('app.utils.rate_limiter.time.sleep') as sleep:
+            for _ in range(62):
+                limiter.acquire("m", 10)
+
+        self.assertEqual(sleep.call_count, 2)
+        stats = limiter.get_stats()["m"]
+        self.assertEqual(stats["waits"], 2)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreater(stats["max_wait_seconds"], 0)
+
+    def test_tokens_per_minute_are_enforced(self):
+        limiter = RateLimiter(limits={"m": {"rpm": 1000, "tpm": 6000}})
+        with patch('app.utils.rate_limiter.time.sleep') as sleep:
+            limiter.acquire("m", 6000)
+            limiter.acquire("m", 3000)
+        self.assertAlmostEqual(sleep.call_args[0][0], 30.0, places=1)
+
+    def test_throttle_honours_retry_after_and_slows_rate(self):
+        limiter = RateLimiter(limits={"m": {"rpm": 1000, "tpm": 10 ** 9}})
+        limiter.record_throttle("m", retry_after=5)
+        with patch('app.utils.rate_limiter.time.sleep') as sleep:
+            limiter.acquire("m", 1)
+        self.assertGreater(sleep.call_args[0][0], 4.9)
+        self.assertEqual(limiter.get_stats()["m"]["rate_factor"], 0.5)
+
+    def test_exhausted_rate_limit_headers_pause_model(self):
+        limiter = RateLimiter(limits={"m": {"rpm": 1000, "tpm": 10 ** 9}})
+        limiter.record_success("m", 10, 10, headers={
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "2s"
+        })
+        with patch('app.utils.rate_limiter.time.sleep') as sleep:
+            limiter.acquire("m", 1)
+        self.assertGreater(sleep.call_args[0][0], 1.9)
+
+    def test_backoff_never_undercuts_retry_after(self):
+        for attempt in range(5):
+            self.assertGreaterEqual(backoff_delay(attempt, retry_after=3), 3)
+
+class TestRetries(unittest.TestCase):
+    def setUp(self):
+        PerplexityClient._instance = None
+        patchers = [
+            patch('app.utils.api_client.build_completion_cache', return_value=None),
+            patch('app.utils.api_client.OpenAI'),
+            patch('app.utils.api_client.time.sleep')
+        ]
+        _, self.mock_openai, self.sleep = [p.start() for p in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PerplexityClient, '_instance', None)
+        # In-process coalescing only, so no lock files are written under DATA_DIR
+        PerplexityClient().single_flight = SingleFlight(lock_dir=None)
+        self.create = self.mock_openai.return_value.chat.completions.with_raw_response.create
+
+    def make_raw(self):
+        response = MagicMock()
+        response.choices[0].message.content = "done"
+        response.model = "sonar-pro"
+        response.usage.prompt_tokens = 1
+        response.usage.completion_tokens = 1
+        response.usage.total_tokens = 2
+        raw = MagicMock()
+        raw.parse.return_value = response
+        raw.headers = {}
+        return raw
+
+    def test_rate_limited_request_is_retried(self):
+        self.create.side_effect = [
+            api_error(RateLimitError, 429, {"retry-after": "2"}),
+            self.make_raw()
+        ]
+        client = PerplexityClient()
+        result = client.generate_completion("sonar-pro", [{"role": "user", "content": "hi"}])
+
+        self.assertEqual(result["content"], "done")
+        self.assertEqual(self.create.call_count, 2)
+        self.assertGreaterEqual(self.sleep.call_args_list[0][0][0], 2)
+        stats = client.get_rate_limit_stats()["sonar-pro"]
+        self.assertEqual((stats["throttled"], stats["retries"]), (1, 1))
+
+    @patch('app.utils.api_client.PERPLEXITY_MAX_RETRIES', 2)
+    def test_failed_attempts_return_their_reserved_tokens(self):
+        self.create.side_effect = api_error(RateLimitError, 429)
+        client = PerplexityClient()
+        client.rate_limiter = RateLimiter(limits={"sonar-pro": {"rpm": 1000, "tpm": 10 ** 6}})
+        client.generate_completion("sonar-pro", [{"role": "user", "content": "hi"}], max_tokens=100000)
+
+        self.assertEqual(self.create.call_count, 3)
+        self.assertAlmostEqual(client.rate_limiter._models["sonar-pro"].tokens.tokens, 10 ** 6, delta=1000)
+
+    def test_client_errors_are_not_retried(self):
+        self.create.side_effect = api_error(BadRequestError, 400)
+        result = PerplexityClient().generate_completion("sonar-pro", [{"role": "user", "content": "hi"}])
+
+        self.assertIn("error", result)
+        self.assertEqual(self.create.call_count, 1)
+
+    @patch('app.utils.api_client.PERPLEXITY_MAX_RETRIES', 2)
+    def test_gives_up_after_max_retries(self):
+        self.create.side_effect = api_error(RateLimitError, 429)
+        result = PerplexityClient().generate_completion("sonar-pro", [{"role": "user", "content": "hi"}])
+
+        self.assertIn("error", result)
+        self.assertEqual(self.create.call_count, 3)
+
+if __name__ == '__main__':
+    unittest.main()
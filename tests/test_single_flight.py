@@ -0,0 +1,189 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for single-flight coalescing of identical model calls.
+"""
+import unittest
+from unittest.mock import patch, MagicMock
+import threading
+import tempfile
+import fcntl
+import time
+import sys
+import os
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.single_flight import SingleFlight
+from app.utils.api_client import PerplexityClient
+from app.utils.metrics import Metrics
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        Metrics._instance = None
+        self.addCleanup(setattr, Metrics, "_instance", None)
+        self.flight = SingleFlight(lock_dir=None)
+
+    def run_concurrently(self, count, function, on_delta=None):
+        results = [None] * count
+
+        def call(i):
+            results[i] = self.flight.run("key", function, on_delta)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_concurrent_calls_share_one_call_and_its_stream(self):
+        calls = []
+        started = threading.Event()
+
+        def function(on_delta):
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            on_delta("Hello ")
+            on_delta("world")
+            return {"content": "Hello world"}
+
+        received = []
+        results = self.run_concurrently(4, function, lambda delta: received.append(delta))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], [{"content": "Hello world"}] * 4)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True])
+        self.assertEqual("".join(received).count("Hello world"), 4)
+        self.assertEqual(self.flight.in_flight(), 0)
+
+    def test_call_streams_only_when_the_leader_asks(self):
+        received = []
+        started = threading.Event()
+        streamed = []
+
+        def function(on_delta):
+            streamed.append(on_delta is not None)
+            started.set()
+            time.sleep(0.2)
+            return {"content": "whole answer"}
+
+        leader = threading.Thread(target=lambda: self.flight.run("key", function))
+        leader.start()
+        started.wait(5)
+        result, shared = self.flight.run("key", function, lambda delta: received.append(delta))
+        leader.join(5)
+
+        self.assertEqual(streamed, [False])
+        self.assertTrue(shared)
+        self.assertEqual(received, ["whole answer"])
+
+    def test_error_is_shared_and_next_call_runs_again(self):
+        def function(on_delta):
+            time.sleep(0.1)
+            raise RuntimeError("upstream down")
+
+        results = self.run_concurrently(3, function)
+
+        self.assertTrue(all(result == {"error": "upstream down"} for result, _ in results))
+        result, shared = self.flight.run("key", lambda on_delta: {"content": "ok"})
+        self.assertEqual((result, shared), ({"content": "ok"}, False))
+
+    def test_other_process_result_is_rechecked_after_its_lock(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        lock_dir = directory.name
+        flight = SingleFlight(lock_dir=lock_dir, wait_seconds=5)
+        # Another process holding the lock for the same key
+        descriptor = os.open(os.path.join(lock_dir, "key.lock"), os.O_CREAT | os.O_RDWR)
+        fcntl.flock(descriptor, fcntl.LOCK_EX)
+        stored = {}
+
+        def release():
+            time.sleep(0.2)
+            stored["key"] = {"content": "from the other process"}
+            fcntl.flock(descriptor, fcntl.LOCK_UN)
+            os.close(descriptor)
+
+        threading.Thread(target=release).start()
+        result, shared = flight.run("key", lambda on_delta: {"content": "own call"}, recheck=lambda: stored.get("key"))
+
+        self.assertEqual(result, {"content": "from the other process"})
+        self.assertTrue(shared)
+        self.assertEqual(os.listdir(lock_dir), [])
+
+class TestCoalescedCompletions(unittest.TestCase):
+    def setUp(self):
+        PerplexityClient._instance = None
+        Metrics._instance = None
+        patchers = [
+            patch('app.utils.api_client.build_completion_cache', return_value=None),
+            patch('app.utils.api_client.OpenAI')
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(setattr, PerplexityClient, '_instance', None)
+        self.addCleanup(setattr, Metrics, '_instance', None)
+        self.client = PerplexityClient()
+        self.client.single_flight = SingleFlight(lock_dir=None)
+        self.calls = []
+
+        def complete(model, messages, temperature, max_tokens, on_delta, retry_timeouts=True):
+            self.calls.append(temperature)
+            time.sleep(0.2)
+            return {"content": "answer", "usage": {"prompt_tokens": 1, "completion_tokens": 1}}
+        self.client._complete = complete
+
+    def generate_concurrently(self, temperature):
+        messages = [{"role": "user", "content": "same question"}]
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.client.generate_completion("sonar-pro", messages, temperature=temperature)
+            ))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_identical_low_temperature_calls_are_coalesced(self):
+        results = self.generate_concurrently(0.2)
+
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sum(1 for result in results if result.get("coalesced")), 2)
+        self.assertTrue(all(result["content"] == "answer" for result in results))
+
+    def test_coalesced_calls_without_on_delta_do_not_stream(self):
+        del self.client._complete
+        response = MagicMock()
+        response.choices[0].message.content = "answer"
+        response.model = "sonar-pro"
+        response.usage.prompt_tokens = response.usage.completion_tokens = response.usage.total_tokens = 1
+        raw = MagicMock(headers={})
+        raw.parse.return_value = response
+        create = self.client.get_client().chat.completions.with_raw_response.create
+
+        def slow_create(**kwargs):
+            time.sleep(0.2)
+            return raw
+        create.side_effect = slow_create
+
+        results = self.generate_concurrently(0.2)
+
+        self.assertEqual(create.call_count, 1)
+        self.assertFalse(create.call_args.kwargs["stream"])
+        self.assertTrue(all(result["content"] == "answer" for result in results))
+
+    def test_high_temperature_calls_are_not_coalesced(self):
+        self.generate_concurrently(0.9)
+
+        self.assertEqual(len(self.calls), 3)
+
+if __name__ == '__main__':
+    unittest.main()
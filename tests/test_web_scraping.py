@@ -6,6 +6,7 @@ import unittest
 from unittest.mock import patch, MagicMock
 import sys
 import os
+import threading
 
 # Add the parent directory to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -13,50 +14,109 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 from app.web_scraping import WebScraper
 
 class TestWebScraping(unittest.TestCase):
-    @patch('app.web_scraping.requests.get')
-    @patch('app.web_scraping.BeautifulSoup')
-    @patch('app.web_scraping.LLMChain')
-    def test_scrape_website(self, mock_llm_chain, mock_bs, mock_requests_get):
+    @patch('app.web_scraping.build_dedup_index', return_value=None)
+    @patch('app.web_scraping.DatabaseManager')
+    @patch('app.web_scraping.PerplexityClient')
+    @patch('app.web_scraping.PageFetcher')
+    def test_scrape_website(self, mock_fetcher, mock_client, mock_db_manager, mock_dedup):
         # Setup mocks
-        mock_response = MagicMock()
-        mock_response.text = "<html><body><p>Test content</p><a href='https://example.com'>Link</a></body></html>"
-        mock_requests_get.return_value = mock_response
+        html = ("<html><head><title>Test page</title></head><body><p>Test content</p>"
+                "<a href='https://example.com/more'>Link</a></body></html>")
+        mock_fetcher.return_value.fetch.return_value = {"text": html}
         
-        mock_soup = MagicMock()
-        mock_body = MagicMock()
-        mock_body.get_text.return_value = "Test content"
-        mock_soup.find.return_value = mock_body
-        
-        mock_link = MagicMock()
-        mock_link.__getitem__.return_value = "https://example.com"
-        mock_link.get_text.return_value = "Link"
-        mock_soup.find_all.return_value = [mock_link]
-        
-        mock_bs.return_value = mock_soup
-        
-        mock_chain = MagicMock()
-        mock_chain.run.return_value = "Summary of test content"
-        mock_llm_chain.return_value = mock_chain
+        mock_perplexity = mock_client.return_value
+        mock_perplexity.get_model.return_value = "sonar-deep-research"
+        mock_perplexity.generate_completion.return_value = {
+            "content": "Summary of test content",
+            "model": "sonar-deep-research",
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}
+        }
         
         # Create WebScraper instance
         scraper = WebScraper()
         
-        # Mock the database insertion
+        # Mock the database collection
         scraper.db = MagicMock()
         
         # Call the scrape_website method
         result = scraper.scrape_website("https://example.com")
         
         # Assertions
-        self.assertIn("summary", result)
-        self.assertEqual(result["summary"], "Summary of test content")
-        self.assertIn("links", result)
+        self.assertIn("ai_research", result)
+        self.assertEqual(result["ai_research"], "Summary of test content")
+        self.assertEqual(result["title"], "Test page")
+        self.assertEqual(result["links"], [{"url": "https://example.com/more", "text": "Link"}])
         
-        # Verify requests.get was called with the correct URL
-        mock_requests_get.assert_called_once_with(
-            "https://example.com", 
-            headers={'User-Agent': 'Mozilla/5.0'}
-        )
+        # Verify the page was fetched and the result queued for saving
+        mock_fetcher.return_value.fetch.assert_called_once_with("https://example.com")
+        mock_db_manager.return_value.enqueue_insert.assert_called_once()
+
+class TestScrapeMany(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('app.web_scraping.PerplexityClient')
+        self.mock_client = patcher.start()
+        self.addCleanup(patcher.stop)
+        db_patcher = patch('app.web_scraping.DatabaseManager')
+        self.mock_db_manager = db_patcher.start()
+        self.addCleanup(db_patcher.stop)
+        dedup_patcher = patch('app.web_scraping.build_dedup_index', return_value=None)
+        dedup_patcher.start()
+        self.addCleanup(dedup_patcher.stop)
+
+        self.mock_client.return_value.get_model.return_value = "sonar-deep-research"
+        self.generate = self.mock_client.return_value.generate_completion
+
+    def metadata(self, url):
+        return {"title": url, "meta_description": "", "links": []}
+
+    def report(self, model):
+        return {"content": "Report", "model": model, "usage": {"total_tokens": 1}}
+
+    def test_metadata_fetch_overlaps_model_call(self):
+        # Each side waits for the other to start: run one after the other, the first times out
+        model_called = threading.Event()
+        fetch_started = threading.Event()
+        overlapped = []
+
+        def generate_completion(model, messages, **kwargs):
+            model_called.set()
+            overlapped.append(fetch_started.wait(5))
+            return self.report(model)
+
+        def fetch_metadata(url):
+            fetch_started.set()
+            overlapped.append(model_called.wait(5))
+            return self.metadata(url)
+
+        self.generate.side_effect = generate_completion
+        scraper = WebScraper()
+        with patch.object(WebScraper, 'fetch_metadata', side_effect=fetch_metadata):
+            result = scraper.research("https://example.com")
+
+        self.assertEqual(result["title"], "https://example.com")
+        self.assertEqual(overlapped, [True, True])
+
+    def test_results_are_yielded_and_queued_for_saving(self):
+        # All six model calls must be in flight at once to pass the barrier
+        barrier = threading.Barrier(6, timeout=5)
+
+        def generate_completion(model, messages, **kwargs):
+            barrier.wait()
+            return self.report(model)
+
+        self.generate.side_effect = generate_completion
+        scraper = WebScraper()
+        scraper.db = MagicMock()
+        urls = [f"https://example.com/{i}" for i in range(6)] + ["https://example.com/0"]
+
+        with patch.object(WebScraper, 'fetch_metadata', side_effect=self.metadata):
+            results = list(scraper.scrape_many(urls, concurrency=6))
+
+        self.assertEqual(sorted(r["url"] for r in results), sorted(set(urls)))
+        self.assertFalse(any("error" in r for r in results))
+        enqueue_insert = self.mock_db_manager.return_value.enqueue_insert
+        self.assertEqual(enqueue_insert.call_count, 6)
+        scraper.db.insert_one.assert_not_called()
 
 if __name__ == '__main__':
     unittest.main()
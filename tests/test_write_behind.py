@@ -0,0 +1,117 @@
+"""
+Idea founded by Gabriele Iacopo Langellotto
+
+Unit tests for the write-behind MongoDB writer.
+"""
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+import sys
+
+# Add the parent directory to sys.path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pymongo import InsertOne, UpdateOne
+from app.utils.db_connection import WriteBehindQueue
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+        self.fail = False
+        self.open = threading.Event()
+        self.open.set()
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            collection = MagicMock()
+            collection.bulk_write.side_effect = self._bulk_write
+            self.collections[name] = collection
+        return self.collections[name]
+
+    def _bulk_write(self, requests, ordered=True):
+        self.open.wait(5)
+        if self.fail:
+            raise ConnectionError("cluster unreachable")
+
+    def requests(self, name):
+        return [request for call in self[name].bulk_write.call_args_list for request in call[0][0]]
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDatabase()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.spill_path = os.path.join(directory.name, "pending.jsonl")
+
+    def make_writer(self, **options):
+        options.setdefault("flush_interval", 60)
+        options.setdefault("retry_interval", 0)
+        writer = WriteBehindQueue(lambda: self.db, spill_path=self.spill_path, **options)
+        self.addCleanup(writer.close, 1)
+        return writer
+
+    def test_writes_are_batched_per_collection(self):
+        writer = self.make_writer(batch_size=100)
+        for i in range(5):
+            writer.put("scraped_data", ("insert", {"n": i}))
+        writer.put("scraped_data", ("update", {"url": "a"}, {"$addToSet": {"aliases": "b"}}, False))
+        writer.put("chat_history", ("insert", {"n": 0}))
+        self.assertTrue(writer.flush(5))
+
+        self.assertEqual(self.db["scraped_data"].bulk_write.call_count, 1)
+        requests = self.db.requests("scraped_data")
+        self.assertEqual([type(r) for r in requests], [InsertOne] * 5 + [UpdateOne])
+        self.assertEqual(len(self.db.requests("chat_history")), 1)
+        self.assertEqual(writer.get_stats()["written"], 7)
+
+    def test_batch_size_triggers_flush(self):
+        writer = self.make_writer(batch_size=3)
+        documents = [{"n": i} for i in range(3)]
+        for document in documents:
+            writer.put("generated_code", ("insert", document))
+        for _ in range(100):
+            if self.db["generated_code"].bulk_write.called:
+                break
+            writer._thread.join(0.01)
+        self.assertEqual(len(self.db.requests("generated_code")), 3)
+        # Callers' documents are not modified
+        self.assertNotIn("_id", documents[0])
+
+    def test_failed_batches_are_spilled_and_replayed(self):
+        writer = self.make_writer()
+        self.db.fail = True
+        writer.put("scraped_data", ("insert", {"n": 1}))
+        writer.flush(5)
+        self.assertTrue(os.path.exists(self.spill_path))
+        self.assertEqual(writer.get_stats()["spilled"], 1)
+        failed_id = self.db.requests("scraped_data")[0]._doc["_id"]
+
+        self.db.fail = False
+        writer.put("scraped_data", ("insert", {"n": 2}))
+        writer.flush(5)
+
+        self.assertFalse(os.path.exists(self.spill_path))
+        replayed = [r._doc for r in self.db.requests("scraped_data")[1:]]
+        self.assertEqual(sorted(d["n"] for d in replayed), [1, 2])
+        self.assertIn(failed_id, [d["_id"] for d in replayed])
+
+    def test_full_buffer_spills_instead_of_blocking(self):
+        writer = self.make_writer(batch_size=1, max_pending=1, put_timeout=0.05)
+        self.db.open.clear()
+        # The first write occupies the writer thread, the second fills the buffer
+        writer.put("scraped_data", ("insert", {"n": 0}))
+        while writer.get_stats()["pending"]:
+            writer._thread.join(0.01)
+        writer.put("scraped_data", ("insert", {"n": 1}))
+        writer.put("scraped_data", ("insert", {"n": 2}))
+
+        self.assertEqual(writer.get_stats()["spilled"], 1)
+        self.db.open.set()
+        writer.flush(5)
+        written = sorted(r._doc["n"] for r in self.db.requests("scraped_data"))
+        self.assertEqual(written, [0, 1, 2])
+
+if __name__ == '__main__':
+    unittest.main()